@@ -0,0 +1,59 @@
+# coding: utf-8
+"""Compares the JSON codecs installed, on realistic Tastypie pages.
+
+Usage: python -m benchmarks.bench_codecs [--page-size N] [--repeat N] [--json]
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from forest import jsoncodecs
+
+from .fixtures import make_page, make_page_bytes
+
+
+def bench_codec(codec, page, payload, repeat, number):
+    decode = min(timeit.repeat(lambda: codec.loads(payload),
+                               repeat=repeat, number=number)) / number
+    encode = min(timeit.repeat(lambda: codec.dumps(page),
+                               repeat=repeat, number=number)) / number
+
+    return {'codec': codec.name,
+            'decode_secs': decode,
+            'encode_secs': encode,
+            'decode_mb_per_sec': len(payload) / decode / 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=50)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    page = make_page(0, args.page_size, args.page_size)
+    payload = make_page_bytes(0, args.page_size, args.page_size)
+
+    results = [bench_codec(codec, page, payload, args.repeat, args.number)
+               for codec in jsoncodecs.available_codecs()]
+
+    if args.json:
+        json.dump({'payload_bytes': len(payload), 'results': results},
+                  sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print('payload: %s docs, %s bytes' % (args.page_size, len(payload)))
+    print('%-8s %12s %12s %10s' % ('codec', 'decode (ms)', 'encode (ms)', 'MB/s'))
+    for result in results:
+        print('%-8s %12.3f %12.3f %10.1f' % (result['codec'],
+                                              result['decode_secs'] * 1000,
+                                              result['encode_secs'] * 1000,
+                                              result['decode_mb_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# coding: utf-8
+"""Measures harvests against a local fake Tastypie server.
+
+Each mode iterates over all documents of the endpoint with a
+`TastyPieConnector`, and reports docs/sec, per-request latency percentiles
+and the peak memory allocated while harvesting. Requests go through
+`requests` by default, or through `urllib3`, or are served in-process by a
+fake transport, without network, with `--transport`.
+
+Usage: python -m benchmarks.bench_harvest [--docs N] [--page-size N]
+       [--latency SECS] [--error-rate RATE] [--doc-bytes N]
+       [--modes serial,prefetch,parallel,stream]
+       [--transport requests|urllib3|fake] [--json] [--baseline FILE]
+"""
+import argparse
+import json
+import sys
+import time
+try:
+    import tracemalloc
+except ImportError:  # PY2
+    tracemalloc = None
+
+from forest import connectors, httpbroker, metrics, retry, transports
+
+from .fakeserver import fake_handler, running_server
+
+
+MODES = ['serial', 'prefetch', 'parallel', 'stream']
+
+
+def iter_docs_kwargs(mode, args):
+    if mode == 'prefetch':
+        return {'prefetch': args.prefetch}
+    elif mode == 'parallel':
+        return {'workers': args.workers}
+    elif mode == 'stream':
+        return {'stream': True}
+    return {}
+
+
+def make_transport(args):
+    pool_maxsize = max(args.workers, 10)
+    if args.transport == 'urllib3':
+        return transports.Urllib3Transport(pool_maxsize=pool_maxsize)
+    elif args.transport == 'fake':
+        return transports.FakeTransport(fake_handler(
+            total_count=args.docs, doc_bytes=args.doc_bytes))
+    return httpbroker.PooledTransport(pool_maxsize=pool_maxsize)
+
+
+def harvest(api_uri, mode, args):
+    """Harvests the whole endpoint, returning the number of docs and the
+    connector's metrics.
+    """
+    stats = metrics.Metrics()
+    conn = connectors.TastyPieConnector(
+        api_uri, items_per_request=args.page_size, metrics=stats,
+        transport=make_transport(args),
+        retry_policy=retry.RetryPolicy(max_retries=10))
+
+    count = 0
+    for _ in conn.iter_docs('journals', **iter_docs_kwargs(mode, args)):
+        count += 1
+
+    conn.transport.close()
+    return count, stats
+
+
+def peak_memory(api_uri, mode, args):
+    if tracemalloc is None:
+        return None
+
+    tracemalloc.start()
+    try:
+        harvest(api_uri, mode, args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_mode(api_uri, mode, args):
+    best = None
+    for _ in range(args.repeat):
+        started = time.time()
+        count, stats = harvest(api_uri, mode, args)
+        elapsed = time.time() - started
+        if best is None or elapsed < best[0]:
+            best = (elapsed, count, stats)
+
+    elapsed, count, stats = best
+    snapshot = stats.snapshot()
+    return {'mode': mode,
+            'docs': count,
+            'elapsed_secs': elapsed,
+            'docs_per_sec': count / elapsed,
+            'requests': snapshot['requests'],
+            'retries': snapshot['retries'],
+            'latency_p50': snapshot['latency_p50'],
+            'latency_p90': snapshot['latency_p90'],
+            'latency_p99': snapshot['latency_p99'],
+            'peak_memory_bytes': peak_memory(api_uri, mode, args)}
+
+
+def compare(results, baseline_path):
+    """Prints the docs/sec ratio of each mode relative to a previous run.
+    """
+    with open(baseline_path) as f:
+        baseline = dict((result['mode'], result)
+                        for result in json.load(f)['results'])
+
+    print('\nrelative to %s:' % baseline_path)
+    for result in results:
+        previous = baseline.get(result['mode'])
+        if previous is None:
+            continue
+        print('%-10s %+7.1f%% docs/sec' %
+              (result['mode'],
+               (result['docs_per_sec'] / previous['docs_per_sec'] - 1) * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds each response is delayed by')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of responses that are 503s')
+    parser.add_argument('--doc-bytes', type=int, default=0,
+                        help='extra bytes of padding per document')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=2)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--transport', default='requests',
+                        choices=['requests', 'urllib3', 'fake'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    parser.add_argument('--baseline',
+                        help='JSON results of a previous run to compare to')
+    args = parser.parse_args(argv)
+
+    config = {'docs': args.docs, 'page_size': args.page_size,
+              'latency': args.latency, 'error_rate': args.error_rate,
+              'doc_bytes': args.doc_bytes, 'workers': args.workers,
+              'prefetch': args.prefetch, 'transport': args.transport}
+
+    with running_server(total_count=args.docs, latency=args.latency,
+                        error_rate=args.error_rate,
+                        doc_bytes=args.doc_bytes) as api_uri:
+        results = [bench_mode(api_uri, mode, args)
+                   for mode in args.modes.split(',')]
+
+    if args.json:
+        json.dump({'config': config, 'results': results}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print(', '.join('%s=%s' % item for item in sorted(config.items())))
+    print('%-10s %10s %10s %10s %10s %12s' % ('mode', 'docs/s', 'p50 (ms)',
+                                              'p99 (ms)', 'retries', 'peak (KB)'))
+    for result in results:
+        peak = result['peak_memory_bytes']
+        print('%-10s %10.1f %10.2f %10.2f %10d %12s' % (
+            result['mode'], result['docs_per_sec'],
+            result['latency_p50'] * 1000, result['latency_p99'] * 1000,
+            result['retries'], '-' if peak is None else '%.0f' % (peak / 1024.0)))
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
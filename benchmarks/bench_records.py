@@ -0,0 +1,65 @@
+# coding: utf-8
+"""Compares the memory taken by materialized harvests of plain dicts and of
+compact records.
+
+Usage: python -m benchmarks.bench_records [--docs N] [--json]
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+
+from forest import jsoncodecs, records
+
+from .fixtures import make_page_bytes
+
+
+def materialize(payloads, compact):
+    """Decodes all pages and keeps their documents, like `list(iter_docs())`.
+    """
+    codec = jsoncodecs.get_codec('json')
+    compactor = records.Compactor() if compact else None
+
+    tracemalloc.start()
+    try:
+        docs = []
+        for payload in payloads:
+            page = codec.loads(payload)['objects']
+            docs.extend(compactor.compact_page(page) if compact else page)
+            del page
+        return len(docs), tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    payloads = [make_page_bytes(offset, args.page_size, args.docs)
+                for offset in range(0, args.docs, args.page_size)]
+
+    results = []
+    for compact in (False, True):
+        count, nbytes = materialize(payloads, compact)
+        results.append({'compact': compact, 'docs': count, 'bytes': nbytes,
+                        'bytes_per_doc': nbytes / float(count)})
+
+    if args.json:
+        json.dump({'results': results}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    for result in results:
+        print('%-8s %10d docs %12.1f MB %10.0f bytes/doc' % (
+            'records' if result['compact'] else 'dicts', result['docs'],
+            result['bytes'] / 1e6, result['bytes_per_doc']))
+    print('reduction: %.0f%%' % ((1 - results[1]['bytes'] / float(results[0]['bytes'])) * 100))
+
+
+if __name__ == '__main__':
+    main()
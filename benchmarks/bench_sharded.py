@@ -0,0 +1,68 @@
+# coding: utf-8
+"""Measures how `harvest.ShardedHarvest` scales with the number of
+processes, against a local fake Tastypie server with large documents.
+
+Usage: python -m benchmarks.bench_sharded [--docs N] [--page-size N]
+       [--doc-bytes N] [--processes 1,2,4] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from forest import connectors, harvest
+
+from .fakeserver import running_server
+
+
+def bench_processes(api_uri, processes, args):
+    workdir = tempfile.mkdtemp()
+    try:
+        runner = harvest.ShardedHarvest(
+            connectors.TastyPieConnector, api_uri,
+            connector_kwargs={'items_per_request': args.page_size},
+            processes=processes)
+        started = time.time()
+        count = runner.run('journals', os.path.join(workdir, 'journals.jsonl'))
+        elapsed = time.time() - started
+    finally:
+        shutil.rmtree(workdir)
+
+    return {'processes': processes, 'docs': count, 'secs': elapsed,
+            'docs_per_sec': count / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--doc-bytes', type=int, default=20000,
+                        help='extra bytes of padding per document')
+    parser.add_argument('--processes', default='1,2,4')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    with running_server(total_count=args.docs, latency=0.0,
+                        doc_bytes=args.doc_bytes,
+                        max_limit=args.page_size) as api_uri:
+        results = [bench_processes(api_uri, int(processes), args)
+                   for processes in args.processes.split(',')]
+
+    if args.json:
+        json.dump({'results': results}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    base = results[0]['docs_per_sec']
+    for result in results:
+        print('%3d processes %10.0f docs/s %6.2fx' % (
+            result['processes'], result['docs_per_sec'],
+            result['docs_per_sec'] / base))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# coding: utf-8
+"""A local HTTP server emulating a Tastypie list endpoint.
+
+Pages are served with keep-alive connections, and can be slowed down, padded
+or made to fail, to emulate different servers and networks. The same pages
+can be served in-process by a `forest.transports.FakeTransport`, to measure
+the client alone.
+"""
+import json
+import multiprocessing
+import random
+import threading
+import time
+from contextlib import contextmanager
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:  # PY2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+
+from .fixtures import make_page
+
+
+def encode_page(endpoint, offset, limit, total_count, doc_bytes=0):
+    page = make_page(offset, limit, total_count, endpoint)
+    if doc_bytes:
+        for doc in page['objects']:
+            doc['padding'] = 'x' * doc_bytes
+    return json.dumps(page).encode('utf-8')
+
+
+class FakeTastypieServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves `total_count` documents at `/api/v1/<endpoint>/`, paginated with
+    `limit` and `offset` like Tastypie.
+
+    :param total_count: (optional) number of documents. Defaults to `1000`.
+    :param latency: (optional) seconds each response is delayed by.
+    :param error_rate: (optional) fraction of the requests answered with
+    `503 Service Unavailable`.
+    :param doc_bytes: (optional) extra bytes of padding per document.
+    :param max_limit: (optional) max page size, like Tastypie's
+    `max_limit`. Defaults to `1000`.
+    :param seed: (optional) seed of the errors' random generator.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, total_count=1000, latency=0.0, error_rate=0.0,
+                 doc_bytes=0, max_limit=1000, seed=0, address=('127.0.0.1', 0)):
+        HTTPServer.__init__(self, address, TastypieHandler)
+        self.total_count = total_count
+        self.latency = latency
+        self.error_rate = error_rate
+        self.doc_bytes = doc_bytes
+        self.max_limit = max_limit
+        self.random = random.Random(seed)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    @property
+    def api_uri(self):
+        return 'http://%s:%s/api/v1/' % self.server_address[:2]
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def page(self, endpoint, offset, limit):
+        """Returns the encoded page, built only once.
+        """
+        key = (endpoint, offset, limit)
+        with self._lock:
+            body = self._pages.get(key)
+
+        if body is None:
+            body = encode_page(endpoint, offset, limit, self.total_count,
+                               self.doc_bytes)
+            with self._lock:
+                self._pages[key] = body
+
+        return body
+
+
+class TastypieHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, and Nagle's algorithm
+    # would hold the body until the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, body=b'', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.respond(200)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.should_fail():
+            return self.respond(503, b'{}', {'Retry-After': '0'})
+
+        parsed = urlsplit(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        if len(parts) != 3 or parts[:2] != ['api', 'v1']:
+            return self.respond(404, b'{}')
+
+        query = parse_qs(parsed.query)
+        try:
+            limit = min(int(query.get('limit', ['20'])[0]), server.max_limit)
+            offset = int(query.get('offset', ['0'])[0])
+        except ValueError:
+            return self.respond(400, b'{}')
+
+        self.respond(200, server.page(parts[2], offset, limit))
+
+
+def fake_handler(total_count=1000, doc_bytes=0, max_limit=1000):
+    """
+    Produces a `forest.transports.FakeTransport` handler serving the pages
+    a `FakeTastypieServer` would serve.
+    """
+    pages = {}
+
+    def first(value):
+        return value[0] if isinstance(value, (list, tuple)) else value
+
+    def handler(request):
+        endpoint = [part for part in urlsplit(request.url).path.split('/') if part][-1]
+        params = dict(request.params)
+        limit = min(int(first(params.get('limit', 20))), max_limit)
+        offset = int(first(params.get('offset', 0)))
+
+        key = (endpoint, offset, limit)
+        body = pages.get(key)
+        if body is None:
+            body = pages[key] = encode_page(endpoint, offset, limit,
+                                            total_count, doc_bytes)
+        return 200, body
+
+    return handler
+
+
+def _serve(options, ready):
+    server = FakeTastypieServer(**options)
+    ready.put(server.api_uri)
+    server.serve_forever()
+
+
+@contextmanager
+def running_server(separate_process=True, **options):
+    """
+    Runs a `FakeTastypieServer` for the duration of the `with` block,
+    yielding its api uri.
+
+    :param separate_process: (optional) if the server must run in a separate
+    process, so that it does not compete for the GIL with the client being
+    measured. Defaults to `True`.
+    :param options: passed to `FakeTastypieServer`.
+    """
+    if separate_process:
+        ready = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_serve, args=(options, ready))
+        process.daemon = True
+        process.start()
+        try:
+            yield ready.get(timeout=10)
+        finally:
+            process.terminate()
+            process.join()
+    else:
+        server = FakeTastypieServer(**options)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            yield server.api_uri
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,46 @@
+# coding: utf-8
+"""Realistic Tastypie payloads, shaped like SciELO Manager's journals.
+"""
+import json
+
+
+def make_journal(i):
+    return {
+        'abstract_keyword_languages': None,
+        'acronym': 'j%s' % i,
+        'issues': ['/api/v1/issues/%s/' % (i * 100 + n) for n in range(40)],
+        'print_issn': '0021-%04d' % i,
+        'pub_level': 'CT',
+        'pub_status': 'current',
+        'pub_status_history': [{'date': '2010-04-01T00:00:00',
+                                'status': 'current'}],
+        'publication_city': 'Roma',
+        'publisher_country': 'IT',
+        'publisher_name': 'Istituto Superiore di Sanit\xe0',
+        'publisher_state': 'Rome',
+        'resource_uri': '/api/v1/journals/%s/' % i,
+        'id': i,
+        'sections': ['/api/v1/sections/%s/' % (i * 10 + n) for n in range(8)],
+        'study_areas': ['Health Sciences'],
+        'title': "Annali dell'Istituto Superiore di Sanit\xe0 %s" % i,
+        'updated': '2014-02-%02dT10:00:00' % (i % 28 + 1),
+        'use_license': {'disclaimer': '<p> </p>' * 20,
+                        'resource_uri': '/api/v1/uselicenses/1044/'},
+    }
+
+
+def make_page(offset, limit, total_count, endpoint='journals'):
+    next_offset = offset + limit
+    if next_offset < total_count:
+        uri_next = '/api/v1/%s/?limit=%s&offset=%s' % (endpoint, limit, next_offset)
+    else:
+        uri_next = None
+
+    return {'meta': {'limit': limit, 'offset': offset, 'next': uri_next,
+                     'previous': None, 'total_count': total_count},
+            'objects': [make_journal(i) for i in
+                        range(offset, min(next_offset, total_count))]}
+
+
+def make_page_bytes(offset, limit, total_count, endpoint='journals'):
+    return json.dumps(make_page(offset, limit, total_count, endpoint)).encode('utf-8')
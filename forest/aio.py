@@ -0,0 +1,436 @@
+# coding: utf-8
+"""asyncio-native counterparts of `forest.core` and `forest.httpbroker`.
+
+Requires Python 3.6+ and, for the default transport, `aiohttp`.
+"""
+import asyncio
+import collections
+import logging
+
+from . import httpbroker
+from . import exceptions
+from . import jsoncodecs
+from . import retry
+from .core import ConnectorMixin
+from .connectors import TastyPieMixin
+
+
+__all__ = ['get', 'AiohttpTransport', 'AsyncConnector', 'AsyncTastyPieConnector']
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+logger = logging.getLogger(__name__)
+
+
+class Response(object):
+    """
+    Fully read HTTP response, with the subset of `requests.Response`
+    interface `httpbroker` relies on.
+    """
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return jsoncodecs.default_codec.loads(self.content)
+
+
+class _AuthRequest(object):
+    """Minimal request object `forest.auth.AuthBase` instances can act upon.
+    """
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def _flatten_params(params):
+    """aiohttp does not accept sequences as values, like `requests` does.
+    """
+    if params is None:
+        return None
+
+    flat = []
+    for key, value in params:
+        if isinstance(value, (list, tuple)):
+            flat.extend((key, str(item)) for item in value)
+        else:
+            flat.append((key, str(value)))
+
+    return flat
+
+
+class AiohttpTransport(object):
+    """
+    Non-blocking transport backed by a single `aiohttp.ClientSession`, that
+    keeps connections alive and pooled per host.
+
+    The session is created lazily, within the running event loop.
+
+    :param limit: (optional) max number of simultaneous connections.
+    Defaults to `100`.
+    :param limit_per_host: (optional) max number of simultaneous connections
+    to the same host. Defaults to `0`, i.e. no limit.
+    """
+    def __init__(self, limit=DEFAULT_MAX_CONCURRENCY, limit_per_host=0):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError('AiohttpTransport requires aiohttp. '
+                              'Install it with: pip install scielo.forest[aio]')
+
+        self._aiohttp = aiohttp
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = self._aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host)
+            self._session = self._aiohttp.ClientSession(connector=connector)
+
+        return self._session
+
+    async def request(self, method, url, headers=None, params=None, data=None,
+                      auth=None, verify=True):
+        """
+        Dispatches an HTTP request and reads the whole response body.
+
+        Dependencies' exceptions are translated to `forest.exceptions`.
+        """
+        headers = dict(headers or {})
+        if auth:
+            auth(_AuthRequest(headers))
+
+        optionals = {}
+        if not verify:
+            optionals['ssl'] = False
+
+        aiohttp = self._aiohttp
+        try:
+            async with self.session.request(method, url, headers=headers,
+                                            params=_flatten_params(params),
+                                            data=data, **optionals) as resp:
+                content = await resp.read()
+        except aiohttp.ClientConnectionError as e:
+            raise exceptions.ConnectionError(e)
+        except asyncio.TimeoutError as e:
+            raise exceptions.Timeout(e)
+        except aiohttp.ClientError as e:
+            raise exceptions.HTTPError(e)
+
+        return Response(resp.status, resp.headers, content)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self):
+        """Closes all pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+
+
+async def get(url, params=None, auth=None, check_ca=False, user_agent=None,
+              transport=None, codec=None, rate_limiter=None):
+    """
+    Dispatches an HTTP GET request to `url`, without blocking the event loop.
+
+    Mirrors `forest.httpbroker.get`.
+
+    :param url: A resource's url.
+    :param params: (optional) params to be passed as query string.
+    :param auth: (optional) instance of `forest.auth.AuthBase`.
+    :param check_ca: (optional) if certification authority should be checked during
+    ssl sessions. Defaults to `False`.
+    :param user_agent: (optional) string of the user agent.
+    :param transport: (optional) `AiohttpTransport` instance, or any object
+    exposing the same coroutine `get`. Defaults to a new `AiohttpTransport`,
+    closed once the response is read, i.e. a new connection per request.
+    :param codec: (optional) `jsoncodecs` codec used to decode the response
+    body. Defaults to the fastest one installed.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance. Waiting
+    for a token does not block the event loop.
+    """
+    headers = {'User-Agent': user_agent or httpbroker.DEFAULT_USER_AGENT}
+
+    optionals = {}
+    if auth:
+        optionals['auth'] = auth
+
+    if url.startswith('https'):
+        optionals['verify'] = check_ca
+
+    logger.debug('Sending a GET request to %s with headers %s and params %s',
+                 url, headers, params)
+
+    if rate_limiter is not None:
+        wait_secs = rate_limiter.reserve()
+        if wait_secs:
+            await asyncio.sleep(wait_secs)
+
+    owned = transport is None
+    if owned:
+        transport = AiohttpTransport()
+
+    try:
+        resp = await transport.get(url,
+                                   headers=headers,
+                                   params=httpbroker.prepare_params(params),
+                                   **optionals)
+    finally:
+        if owned:
+            await transport.close()
+
+    # check if an exception should be raised based on http status code
+    httpbroker.check_http_status(resp)
+
+    return (codec or jsoncodecs.default_codec).loads(resp.content)
+
+
+class AsyncConnector(ConnectorMixin):
+    """
+    Encapsulates the HTTP requests layer, without blocking the event loop.
+
+    Mirrors `forest.core.Connector`, and relies on the same
+    `__get_docs__` and `__resumption_resource_path__` hooks.
+
+    :param api_uri: Full path to the API. e.g.: `http://manager.scielo.org/api/v1/`.
+    :param auth: (optional) `forest.auth.AuthBase` subclass.
+    :param items_per_request: (optional) how many items are retrieved per request.
+    Defaults to `50`.
+    :param check_ca: (optional) if certification authority should be checked during
+    ssl sessions. Defaults to `False`.
+    :param max_retries: (optional) max retries before aborting on
+    connection failures.
+    :param retry_timeout_factor: (optional) waits
+    `retry_timeout_factor` * `retry_count` before firing a new request.
+    :param retry_policy: (optional) `retry.RetryPolicy` instance. Takes
+    precedence over `max_retries` and `retry_timeout_factor`.
+    :param circuit_breaker: (optional) `retry.CircuitBreaker` instance.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance, that
+    can be shared with other connectors, sync or async.
+    :param transport: (optional) `AiohttpTransport` instance, so that many
+    connectors can share the same connection pool. By default each
+    connector owns a new one.
+    :param max_concurrency: (optional) max number of in-flight requests
+    dispatched by this connector. Defaults to `100`.
+    :param codec: (optional) `jsoncodecs` codec used to decode responses.
+    Defaults to the fastest one installed.
+    """
+    #: adaptive page sizing is not supported by async connectors.
+    page_sizer = None
+
+    def __init__(self, api_uri, auth=None, items_per_request=50,
+                 check_ca=False, max_retries=5, retry_timeout_factor=0,
+                 transport=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 codec=None, retry_policy=None, circuit_breaker=None,
+                 rate_limiter=None):
+        self.api_uri = api_uri
+        self.auth = auth
+        self.items_per_request = items_per_request
+        self.check_ca = check_ca
+
+        self.max_retries = max_retries
+        self.retry_timeout_factor = retry_timeout_factor
+        if retry_policy is None:
+            retry_policy = retry.RetryPolicy(max_retries=max_retries,
+                                             backoff_factor=retry_timeout_factor)
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+
+        if transport is None:
+            transport = AiohttpTransport(limit=max_concurrency)
+        self.transport = transport
+
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self.codec = codec
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes the underlying transport.
+        """
+        await self.transport.close()
+
+    @property
+    def semaphore(self):
+        # created lazily so that it is bound to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def fetch_data(self, resource_path=None, params=None):
+        """
+        Fetches the specified resource.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        """
+        err_count = 0
+        resource_url = httpbroker._make_full_url(self.api_uri, resource_path)
+
+        policy = self.retry_policy
+        policy.on_request()
+
+        while True:
+            trial = False
+            if self.circuit_breaker is not None:
+                trial = self.circuit_breaker.before_request(resource_url)
+
+            try:
+                async with self.semaphore:
+                    response = await get(resource_url,
+                                         auth=self.auth,
+                                         params=params,
+                                         transport=self.transport,
+                                         codec=self.codec,
+                                         rate_limiter=self.rate_limiter)
+
+            except exceptions.APIError as e:
+                self._record_outcome(resource_url, e)
+                if policy.should_retry(err_count, e):
+                    wait_secs = policy.backoff(err_count, e)
+                    logger.info('%s. Waiting %ss to retry.', e, wait_secs)
+                    await asyncio.sleep(wait_secs)
+                    err_count += 1
+                    continue
+                else:
+                    logger.error('%s. Unable to connect to resource.', e)
+                    raise
+            except asyncio.CancelledError:
+                # tells nothing about the host. Not a BaseException before
+                # Python 3.8.
+                if trial:
+                    self.circuit_breaker.release(resource_url)
+                raise
+            except Exception:
+                # e.g. an undecodable body. A half-open circuit must not be
+                # left waiting for the outcome of its trial request.
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(resource_url)
+                raise
+            except BaseException:
+                # e.g. KeyboardInterrupt, which tells nothing about the host.
+                if trial:
+                    self.circuit_breaker.release(resource_url)
+                raise
+            else:
+                self._record_outcome(resource_url)
+                return response
+
+    async def fetch_many(self, resources):
+        """
+        Fetches many resources concurrently.
+
+        :param resources: iterable of `(resource_path, params)` pairs.
+        :returns: list of responses, in the same order as `resources`.
+        """
+        return await asyncio.gather(*[self.fetch_data(resource_path, params)
+                                      for resource_path, params in resources])
+
+    async def iter_docs(self, resource_path=None, params=None):
+        """
+        Asynchronously iterates over all documents of a given endpoint
+        and collection.
+
+        The size of the first page is `items_per_request`, unless `params`
+        sets it explicitly.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        """
+        data = await self.fetch_data(resource_path, self.page_params(params))
+
+        while True:
+            for obj in self.__get_docs__(data):
+                yield obj
+
+            try:
+                res_path, res_params = self.__resumption_resource_path__(data)
+            except ValueError:
+                return
+
+            data = await self.fetch_data(res_path, res_params)
+
+    def __get_docs__(self, data):
+        """Returns the iterable that will be consumed by iter_docs.
+        """
+        raise NotImplementedError()
+
+    def __resumption_resource_path__(self, data):
+        """Returns a pair of resource_path and params, just like
+        `iter_docs` or `fetch_data` would accept.
+        """
+        raise NotImplementedError()
+
+
+class AsyncTastyPieConnector(TastyPieMixin, AsyncConnector):
+    async def iter_docs(self, resource_path=None, params=None, concurrent=False):
+        """
+        Asynchronously iterates over all documents of a given endpoint
+        and collection.
+
+        When `concurrent` is true, the offsets of all pages are computed
+        from the first one and their requests are kept in flight at once,
+        limited by `max_concurrency`. Documents are yielded in order.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        :param concurrent: (optional) fetch pages concurrently. Cannot be
+        combined with keyset pagination. Defaults to `False`.
+        """
+        if concurrent and self.pagination == 'keyset':
+            raise ValueError('concurrent cannot be combined with keyset '
+                             'pagination')
+
+        if not concurrent:
+            async for obj in super(AsyncTastyPieConnector, self).iter_docs(
+                    resource_path, params):
+                yield obj
+            return
+
+        data = await self.fetch_data(resource_path, self.page_params(params))
+        for obj in self.__get_docs__(data):
+            yield obj
+
+        try:
+            res_path, res_params = self.__resumption_resource_path__(data)
+        except ValueError:
+            return
+
+        offsets = iter(self.__page_offsets__(data))
+        pending = collections.deque()
+
+        def schedule_next():
+            offset = next(offsets, None)
+            if offset is None:
+                return False
+
+            page_params = dict(res_params, offset=[str(offset)])
+            pending.append(asyncio.ensure_future(
+                self.fetch_data(res_path, page_params)))
+            return True
+
+        try:
+            while len(pending) < self.max_concurrency and schedule_next():
+                pass
+
+            while pending:
+                data = await pending.popleft()
+                schedule_next()
+                for obj in self.__get_docs__(data):
+                    yield obj
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,376 @@
+# coding: utf-8
+"""HTTP response caches, to be used by `httpbroker.get`.
+"""
+from __future__ import unicode_literals
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+try:
+    from urllib import parse
+except ImportError:  # PY2
+    import urlparse as parse
+try:
+    from urllib.parse import urlencode
+except ImportError:  # PY2
+    from urllib import urlencode
+
+from . import httpbroker, compat
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def cache_key(url, params=None, credentials=None):
+    """
+    Produces the key that identifies the response to a GET request.
+
+    The scheme and host are lowercased, default ports are removed and
+    params are sorted with `httpbroker.prepare_params`, so that equivalent
+    requests share the same key.
+
+    :param url: the resource's url.
+    :param params: (optional) params to be passed as query string.
+    :param credentials: (optional) string identifying the caller, e.g. the
+    `Authorization` header. Requests with different credentials get
+    different keys, so that responses are never shared between them. Only
+    a digest of it is part of the key.
+    """
+    parsed = parse.urlsplit(url)
+    scheme = parsed.scheme.lower()
+    netloc = parsed.hostname or ''
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc = '%s:%s' % (netloc, parsed.port)
+
+    query = parse.parse_qsl(parsed.query, keep_blank_values=True)
+    for key, value in httpbroker.prepare_params(params) or []:
+        if isinstance(value, (list, tuple)):
+            query.extend((key, item) for item in value)
+        else:
+            query.append((key, value))
+
+    query = urlencode(sorted((compat.text_type(key).encode('utf-8'),
+                              compat.text_type(value).encode('utf-8'))
+                             for key, value in query))
+
+    fragment = ''
+    if credentials:
+        fragment = hashlib.sha1(credentials.encode('utf-8')).hexdigest()
+
+    return parse.urlunsplit((scheme, netloc, parsed.path or '/', query, fragment))
+
+
+class CacheEntry(collections.namedtuple('CacheEntry',
+        ['body', 'etag', 'last_modified', 'stored_at'])):
+    """
+    A cached response body and its validators.
+
+    :param body: response body, as bytes.
+    :param etag: value of the `ETag` header, or `None`.
+    :param last_modified: value of the `Last-Modified` header, or `None`.
+    :param stored_at: timestamp of when the response was received.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(response.content,
+                   response.headers.get('etag'),
+                   response.headers.get('last-modified'),
+                   time.time())
+
+    def validators(self):
+        """Headers that turn a request into a conditional one.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def refreshed(self):
+        """A copy of this entry, as if it was stored just now.
+        """
+        return self._replace(stored_at=time.time())
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BaseCache(object):
+    """
+    Behaviour shared by all response caches.
+
+    Besides storing responses, caches coalesce concurrent identical
+    requests, so that only one of them reaches the server.
+    """
+    #: seconds an entry is served without being revalidated.
+    fresh_for = 0
+
+    key = staticmethod(cache_key)
+
+    def __init__(self):
+        self.coalesced = 0
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the `CacheEntry` stored under `key`, or `None`.
+        """
+        raise NotImplementedError()
+
+    def set(self, key, entry):
+        """Stores `entry` under `key`.
+        """
+        raise NotImplementedError()
+
+    def is_fresh(self, entry):
+        """If `entry` can be served without revalidation.
+        """
+        return time.time() - entry.stored_at < self.fresh_for
+
+    def store(self, key, response):
+        """
+        Stores a `200 OK` response, if it carries any validator.
+        """
+        entry = CacheEntry.from_response(response)
+        if entry.etag or entry.last_modified:
+            self.set(key, entry)
+
+    def coalesce(self, key, func):
+        """
+        Calls `func`, unless a call for the same `key` is already in flight,
+        in which case its result is awaited and shared.
+
+        :returns: a pair of the result and a boolean telling if it was
+        shared with a concurrent call.
+        """
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.result, False
+
+
+class DiskCache(BaseCache):
+    """
+    Stores responses on disk, along with their validators, so they can be
+    revalidated with conditional requests.
+
+    Entries are evicted in least recently used order when their total size
+    exceeds `max_bytes`. Instances are thread-safe, but the directory must
+    not be shared by concurrent processes.
+
+    :param directory: where entries are stored. It is created if missing.
+    :param max_bytes: (optional) max total size of the stored entries.
+    Defaults to 100MB.
+    """
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024):
+        super(DiskCache, self).__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        # maps file names to file sizes, from the least to the most
+        # recently used.
+        self._index = collections.OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _load_index(self):
+        paths = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory)
+                 if name.endswith('.cache')]
+        for path in sorted(paths, key=os.path.getmtime):
+            size = os.path.getsize(path)
+            self._index[os.path.basename(path)] = size
+            self._total_bytes += size
+
+    def _filename(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.cache'
+
+    def get(self, key):
+        """
+        Returns the `CacheEntry` stored under `key`, or `None`.
+        """
+        filename = self._filename(key)
+        with self._lock:
+            if filename not in self._index:
+                return None
+            self._index[filename] = self._index.pop(filename)
+
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+            os.utime(path, None)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning('Unable to read cache entry %s: %s', path, e)
+            return None
+
+        if header['key'] != key:
+            return None
+
+        return CacheEntry(body, header['etag'], header['last_modified'],
+                          header['stored_at'])
+
+    def set(self, key, entry):
+        """
+        Stores `entry` under `key`, evicting the least recently used
+        entries if needed.
+        """
+        filename = self._filename(key)
+        header = json.dumps({'key': key, 'etag': entry.etag,
+                             'last_modified': entry.last_modified,
+                             'stored_at': entry.stored_at}).encode('utf-8') + b'\n'
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(entry.body)
+        compat.replace(tmp_path, os.path.join(self.directory, filename))
+
+        size = len(header) + len(entry.body)
+        with self._lock:
+            self._total_bytes += size - self._index.pop(filename, 0)
+            self._index[filename] = size
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            filename, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+            logger.debug('Evicted cache entry %s', filename)
+
+
+class MemoryCache(BaseCache):
+    """
+    Keeps responses in memory, serving them without any request for `ttl`
+    seconds. After that, entries carrying validators are revalidated with
+    conditional requests.
+
+    Entries are evicted in least recently used order when there are more
+    than `max_entries` of them, or when their bodies add up to more than
+    `max_bytes`. Instances are thread-safe, and meant to be shared by all
+    connectors of a process.
+
+    :param ttl: (optional) seconds an entry is served without being
+    revalidated. Defaults to `60`.
+    :param max_entries: (optional) max number of entries. Defaults to `1000`.
+    :param max_bytes: (optional) max total size of the stored bodies.
+    Defaults to 50MB.
+    """
+    def __init__(self, ttl=60, max_entries=1000, max_bytes=50 * 1024 * 1024):
+        super(MemoryCache, self).__init__()
+        self.fresh_for = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # from the least to the most recently used.
+        self._entries = collections.OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key):
+        """
+        Returns the `CacheEntry` stored under `key`, or `None`.
+
+        Expired entries are only returned if they can be revalidated.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if self.is_fresh(entry):
+                self.hits += 1
+            else:
+                self.misses += 1
+                if not (entry.etag or entry.last_modified):
+                    self._total_bytes -= len(entry.body)
+                    return None
+
+            self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        """
+        Stores `entry` under `key`, evicting the least recently used
+        entries if needed.
+        """
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous.body)
+
+            self._entries[key] = entry
+            self._total_bytes += len(entry.body)
+
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     self._total_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted.body)
+                self.evictions += 1
+
+    def store(self, key, response):
+        """
+        Stores a `200 OK` response, even without validators.
+        """
+        self.set(key, CacheEntry.from_response(response))
+
+    def stats(self):
+        """
+        Returns a dict of counters, to help tuning the cache.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'coalesced': self.coalesced,
+                    'entries': len(self._entries),
+                    'bytes': self._total_bytes}
@@ -0,0 +1,101 @@
+# coding: utf-8
+"""Persistence of harvest state, so interrupted harvests can be resumed.
+"""
+from __future__ import unicode_literals
+import json
+import logging
+import os
+import tempfile
+
+from . import compat
+
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path, data):
+    """
+    Writes `data` to `path` atomically: readers either see the previous
+    content or the new one, never a partially written file.
+
+    :param path: destination file path.
+    :param data: byte string.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        compat.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class FileCheckpoint(object):
+    """
+    Stores the resumption cursor of a harvest in a JSON file.
+
+    The cursor is the pair of `resource_path` and `params` of the next page
+    to be fetched. It is stored along with the `resource_path` and `params`
+    the harvest was started with, so that it is only used to resume the
+    very same harvest.
+
+    :param path: the checkpoint file path.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, resource_path, params):
+        """
+        Returns the stored cursor of the harvest of `resource_path` and
+        `params`, or `None`.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                state = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError):
+            return None
+        except ValueError as e:
+            logger.warning('Ignoring corrupted checkpoint %s: %s', self.path, e)
+            return None
+
+        if state['origin'] != _normalize(resource_path, params):
+            logger.info('Ignoring checkpoint %s of a different harvest', self.path)
+            return None
+
+        res_path, res_params = state['cursor']
+        if isinstance(res_params, list):
+            res_params = [tuple(pair) for pair in res_params]
+
+        return res_path, res_params
+
+    def save(self, resource_path, params, cursor):
+        """
+        Stores `cursor` as the resumption point of the harvest of
+        `resource_path` and `params`.
+        """
+        state = {'origin': _normalize(resource_path, params),
+                 'cursor': list(cursor)}
+        atomic_write(self.path, json.dumps(state).encode('utf-8'))
+
+    def clear(self):
+        """Removes the checkpoint, usually because the harvest is over.
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _normalize(resource_path, params):
+    """JSON-compatible representation of a harvest's starting point.
+    """
+    if params is not None and hasattr(params, 'items'):
+        params = params.items()
+    if params is not None:
+        params = sorted([key, value] for key, value in params)
+
+    return json.loads(json.dumps([resource_path, params]))
@@ -1,5 +1,6 @@
 """Compatibility helpers.
 """
+import os
 import sys
 
 
@@ -9,7 +10,14 @@ PY2 = sys.version_info[0] == 2
 if PY2:
     text_type = unicode
     string_types = (str, unicode)
+    import Queue as queue
+    from collections import Mapping
 else:
     text_type = str
     string_types = (str,)
+    import queue
+    from collections.abc import Mapping
 
+
+# atomic on POSIX; also overwrites existing files on Windows under PY3.
+replace = getattr(os, 'replace', os.rename)
@@ -1,13 +1,43 @@
+import collections
+from concurrent import futures
 import urllib
 try:
     from urllib import parse
 except ImportError:  # PY2
     import urlparse as parse
 
+from . import records
 from .core import Connector
+from .lazy import LazyDocument
+from .resolver import Resolver, split_resource_uri
 
 
-class TastyPieConnector(Connector):
+class TastyPieMixin(object):
+    """Tastypie's pagination hooks, shared by sync and async connectors.
+
+    Pages are requested by offset, following `meta.next`, unless the
+    connector is created with `pagination='keyset'`. In that case pages are
+    ordered by `keyset_field` and each one is requested with
+    `<keyset_field>__gt=<last value of the previous page>`, so that the
+    server does not scan and skip all preceding rows to reach deep pages.
+    It requires the resource to allow ordering and `gt` filtering on
+    `keyset_field`, and pages cannot be fetched concurrently nor streamed.
+    `keyset_field` must be unique, as documents sharing the last value of
+    a page would be skipped by the next one.
+    """
+    stream_key = 'objects'
+    #: either `offset` or `keyset`.
+    pagination = 'offset'
+    #: unique field pages are ordered by, with keyset pagination.
+    keyset_field = 'id'
+
+    def __init__(self, *args, **kwargs):
+        pagination = kwargs.pop('pagination', self.pagination)
+        if pagination not in ('offset', 'keyset'):
+            raise ValueError('Unknown pagination: %s' % pagination)
+        self.pagination = pagination
+        super(TastyPieMixin, self).__init__(*args, **kwargs)
+
     def __get_docs__(self, data):
         """Documents are grouped under `objects`.
         """
@@ -19,6 +49,9 @@ class TastyPieConnector(Connector):
 
         And we must return:
         ('journals', {u'limit': [u'1'], u'collection': [u'saude-publica'], u'offset': [u'1']})
+
+        With keyset pagination, `offset` is replaced by the keyset filter,
+        e.g. `{u'id__gt': [u'1420'], u'order_by': [u'id'], ...}`.
         """
         uri_next = data['meta']['next']
         if uri_next is None:
@@ -29,5 +62,213 @@ class TastyPieConnector(Connector):
         path = parsed.path.rsplit('/', 2)[1]
         querystr = parse.parse_qs(parsed.query)
 
+        if self.pagination == 'keyset':
+            querystr.pop('offset', None)
+            querystr[self.keyset_field + '__gt'] = [self._keyset_value(data)]
+
         return path, querystr
 
+    def __page_offsets__(self, data):
+        """Offsets of all pages after `data`, computed from its `meta`.
+        """
+        if self.pagination == 'keyset':
+            raise ValueError('Page offsets are unknown with keyset pagination')
+
+        meta = data['meta']
+        # Tastypie's `limit: 0` means no limit, i.e. a single page.
+        if not meta['limit'] or meta['limit'] >= meta['total_count']:
+            return range(0)
+        return range(meta['offset'] + meta['limit'],
+                     meta['total_count'], meta['limit'])
+
+    def page_params(self, params, override=False):
+        """
+        Returns a copy of `params` with the page size set and, with keyset
+        pagination, the ordering by `keyset_field`.
+        """
+        params = super(TastyPieMixin, self).page_params(params, override)
+        if self.pagination != 'keyset':
+            return params
+
+        if hasattr(params, 'items'):
+            params['order_by'] = self.keyset_field
+            return params
+
+        return [(key, value) for key, value in params
+                if key != 'order_by'] + [('order_by', self.keyset_field)]
+
+    def _keyset_value(self, data):
+        docs = self.__get_docs__(data)
+        if not isinstance(docs, list):
+            raise TypeError('Keyset pagination requires whole pages')
+        if not docs:
+            raise ValueError('Missing resumption resource path')
+
+        last = docs[-1]
+        if self.keyset_field in last:
+            return '%s' % last[self.keyset_field]
+        if self.keyset_field == 'id' and 'resource_uri' in last:
+            return split_resource_uri(last['resource_uri'])[1]
+
+        # not a ValueError, which would silently end the iteration.
+        raise KeyError(self.keyset_field)
+
+
+class TastyPieConnector(TastyPieMixin, Connector):
+    def iter_docs(self, resource_path=None, params=None, prefetch=0,
+                  stream=False, checkpoint=None, workers=None, ordered=True,
+                  fields=None, filters=None, lazy=False, compact=False):
+        """
+        Iterates over all documents of a given endpoint and collection.
+
+        When `workers` is given, the first page is fetched and the offsets
+        of all remaining pages are computed from its `meta` section, so that
+        they can be fetched concurrently instead of following `meta.next`
+        one page at a time. In that case, all pages have the size of the
+        first one, even if a `page_sizer` is set.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        :param prefetch: (optional) number of pages to be fetched in
+        background while the current one is being consumed. Cannot be
+        combined with `workers`. Defaults to `0`.
+        :param stream: (optional) if documents must be decoded and yielded
+        one at a time, as each page is downloaded. Cannot be combined with
+        `prefetch`, `workers` or keyset pagination. Defaults to `False`.
+        :param checkpoint: (optional) `checkpoint.FileCheckpoint` instance,
+        to make the iteration resumable. Cannot be combined with `workers`.
+        :param workers: (optional) number of threads fetching pages
+        concurrently. Cannot be combined with keyset pagination. Defaults
+        to serial fetching.
+        :param ordered: (optional) if documents must be yielded in the same
+        order the serial iteration would yield them. Set to `False` to get
+        pages as soon as they arrive. Defaults to `True`.
+        :param fields: (optional) names of the fields to be retrieved. See
+        `Connector.iter_docs`.
+        :param filters: (optional) dict of filters, sent as query params.
+        :param lazy: (optional) if documents must be yielded as
+        `lazy.LazyDocument` proxies, whose related resources are fetched
+        on access through the connector's `resolver`. Defaults to `False`.
+        :param compact: (optional) if documents must be yielded as
+        `records.Record` instances. See `Connector.iter_docs`.
+        """
+        if self.pagination == 'keyset' and (workers or stream):
+            raise ValueError('workers and stream cannot be combined with '
+                             'keyset pagination')
+
+        if not workers:
+            docs = super(TastyPieConnector, self).iter_docs(
+                resource_path, params, prefetch=prefetch, stream=stream,
+                checkpoint=checkpoint, fields=fields, filters=filters,
+                compact=compact)
+        elif prefetch or stream or checkpoint is not None:
+            raise ValueError('prefetch, stream and checkpoint cannot be '
+                             'combined with workers')
+        else:
+            docs = self._iter_docs_parallel(
+                resource_path, self.query_params(params, fields, filters),
+                workers, ordered, self.projection(fields),
+                records.Compactor() if compact else None)
+
+        if lazy:
+            return self._iter_lazy(docs)
+        return docs
+
+    @property
+    def resolver(self):
+        """
+        `resolver.Resolver` instance shared by all lazy documents of this
+        connector, so that each related resource is fetched once.
+        """
+        resolver = getattr(self, '_resolver', None)
+        if resolver is None:
+            resolver = self._resolver = Resolver(self)
+        return resolver
+
+    def _iter_lazy(self, docs):
+        resolver = self.resolver
+        for doc in docs:
+            yield LazyDocument(doc, resolver)
+
+    def get_many(self, resource_path, ids, batch_size=100):
+        """
+        Fetches many resources of the same endpoint by id, in batches of
+        `batch_size`, through Tastypie's `set` endpoint, e.g.
+        `/api/v1/issues/set/1;2;3/`.
+
+        :param resource_path: the endpoint, e.g. `issues`.
+        :param ids: iterable of resource ids. Duplicates are fetched once.
+        :param batch_size: (optional) max number of ids per request, which
+        keeps URLs reasonably short. Defaults to `100`.
+        :returns: dict mapping each id, as text, to its document. Ids that
+        were not found are left out.
+        """
+        unique_ids = []
+        seen = set()
+        for resource_id in ids:
+            resource_id = '%s' % resource_id
+            if resource_id not in seen:
+                seen.add(resource_id)
+                unique_ids.append(resource_id)
+
+        docs = {}
+        for i in range(0, len(unique_ids), batch_size):
+            batch = unique_ids[i:i + batch_size]
+            data = self.fetch_data('%s/set/%s' % (resource_path.strip('/'),
+                                                  ';'.join(batch)))
+            for obj in data['objects']:
+                if 'id' in obj:
+                    docs['%s' % obj['id']] = obj
+                else:
+                    docs[split_resource_uri(obj['resource_uri'])[1]] = obj
+
+        return docs
+
+    def _iter_docs_parallel(self, resource_path, params, workers, ordered,
+                            project=None, compactor=None):
+        data = self.fetch_data(resource_path, self.page_params(params))
+        for obj in self._page_docs(data, project, compactor):
+            yield obj
+
+        try:
+            res_path, res_params = self.__resumption_resource_path__(data)
+        except ValueError:
+            return
+
+        offsets = iter(self.__page_offsets__(data))
+
+        # at most `max_pending` pages are held in memory at any given time.
+        max_pending = workers * 2
+        pending = collections.deque()
+        executor = futures.ThreadPoolExecutor(max_workers=workers)
+
+        def submit_next():
+            offset = next(offsets, None)
+            if offset is None:
+                return False
+
+            page_params = dict(res_params, offset=[str(offset)])
+            pending.append(executor.submit(self.fetch_data,
+                                           res_path, page_params))
+            return True
+
+        try:
+            while len(pending) < max_pending and submit_next():
+                pass
+
+            while pending:
+                if ordered:
+                    done = pending.popleft()
+                else:
+                    completed, _ = futures.wait(
+                        pending, return_when=futures.FIRST_COMPLETED)
+                    done = completed.pop()
+                    pending.remove(done)
+
+                submit_next()
+                for obj in self._page_docs(done.result(), project, compactor):
+                    yield obj
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
@@ -1,16 +1,140 @@
 # coding: utf-8
 from __future__ import unicode_literals
+from concurrent import futures
 import logging
+import threading
 import time
 
 from . import httpbroker
 from . import exceptions
+from . import compat
+from . import retry
+from . import query
+from . import records
 
 
 logger = logging.getLogger(__name__)
 
 
-class Connector(object):
+# bulk requests failing with these errors were rejected by Tastypie
+# before any object was created, so their records can be posted again.
+BULK_REJECTIONS = (exceptions.Unauthorized, exceptions.NotFound,
+                   exceptions.MethodNotAllowed, exceptions.NotAcceptable,
+                   exceptions.TooManyRequests)
+
+
+def read_ahead(iterable, depth):
+    """
+    Consumes `iterable` in a background thread, keeping up to `depth`
+    items ready to be yielded.
+
+    Exceptions raised while consuming `iterable` are re-raised to the
+    caller. If the caller stops iterating, the background thread stops
+    as soon as it finishes producing its current item.
+
+    :param iterable: any iterable.
+    :param depth: max number of items produced but not yet yielded.
+    """
+    queue = compat.queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+            except compat.queue.Full:
+                continue
+            else:
+                return True
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            item, error = queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def _chain(*observers):
+    """Returns an observer that calls each of `observers` that is not `None`.
+    """
+    observers = [observer for observer in observers if observer is not None]
+    if len(observers) == 1:
+        return observers[0]
+
+    def observe(info):
+        for observer in observers:
+            observer(info)
+    return observe
+
+
+class ConnectorMixin(object):
+    """Page sizing and circuit breaking, shared by sync and async connectors.
+    """
+    #: name of the query string param that sets the page size.
+    limit_param = 'limit'
+    page_sizer = None
+
+    def page_params(self, params, override=False):
+        """
+        Returns a copy of `params` with the page size set.
+
+        :param params: params to be passed as query string, or `None`.
+        :param override: (optional) if the page size already set in
+        `params` must be replaced.
+        """
+        if self.page_sizer is not None:
+            size = self.page_sizer.size
+        else:
+            size = self.items_per_request
+
+        if params is None:
+            params = {}
+
+        if hasattr(params, 'items'):
+            params = dict(params)
+            if override or self.limit_param not in params:
+                params[self.limit_param] = size
+        else:
+            params = [(key, value) for key, value in params
+                      if not (override and key == self.limit_param)]
+            if not any(key == self.limit_param for key, _ in params):
+                params.append((self.limit_param, size))
+
+        return params
+
+    def _record_outcome(self, resource_url, error=None):
+        """Informs the circuit breaker whether the host is healthy.
+        """
+        if self.circuit_breaker is None:
+            return
+        if isinstance(error, self.retry_policy.retryable):
+            self.circuit_breaker.record_failure(resource_url)
+        else:
+            self.circuit_breaker.record_success(resource_url)
+
+
+class Connector(ConnectorMixin):
     """
     Encapsulates the HTTP requests layer.
 
@@ -24,66 +148,411 @@ class Connector(object):
     connection failures.
     :param retry_timeout_factor: (optional) waits
     `retry_timeout_factor` * `retry_count` before firing a new request.
+    :param retry_policy: (optional) `retry.RetryPolicy` instance, e.g. with
+    exponential backoff and jitter. Takes precedence over `max_retries`
+    and `retry_timeout_factor`.
+    :param circuit_breaker: (optional) `retry.CircuitBreaker` instance, that
+    fails fast the requests to a host after repeated failures.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance every
+    request passes through. Share it among connectors to keep their
+    aggregate request rate below the server's throttling.
+    :param metrics: (optional) `metrics.Metrics` instance that records
+    latency, bytes, status codes, retries and decode time of every
+    request, and the pages and documents iterated over. Nothing is
+    measured by default.
+    :param transport: (optional) `httpbroker.PooledTransport` instance, or
+    any `transports.Transport`, e.g. `transports.Urllib3Transport`, so that
+    many connectors can share the same connection pool. By default each
+    connector owns a new `httpbroker.PooledTransport`.
+    :param pool_maxsize: (optional) max number of keep-alive connections per
+    host, used when `transport` is not given. Defaults to `10`.
+    :param prewarm: (optional) number of connections to the API host to open
+    at construction time. Defaults to `0`.
+    :param page_sizer: (optional) `paging.AdaptivePageSize` instance, that
+    replaces `items_per_request` by a page size adjusted to the observed
+    latency and payload size of each page.
+    :param cache: (optional) `cache.DiskCache` or `cache.MemoryCache`
+    instance, used to serve or revalidate previously fetched resources
+    instead of downloading them again. Concurrent identical requests are
+    coalesced into a single one.
+    :param codec: (optional) `jsoncodecs` codec used to decode responses.
+    Defaults to the fastest one installed.
     """
+    #: name of the member of each page holding the documents, which can be
+    #: decoded incrementally when pages are streamed.
+    stream_key = None
+    #: name of the query string param that selects the fields of the
+    #: documents, or `None` if the API does not support it, in which case
+    #: documents are projected client-side.
+    fields_param = None
 
     def __init__(self, api_uri, auth=None, items_per_request=50,
-                 check_ca=False, max_retries=5, retry_timeout_factor=0):
+                 check_ca=False, max_retries=5, retry_timeout_factor=0,
+                 transport=None, pool_maxsize=httpbroker.DEFAULT_POOL_MAXSIZE,
+                 prewarm=0, page_sizer=None, cache=None, codec=None,
+                 retry_policy=None, circuit_breaker=None, rate_limiter=None,
+                 metrics=None):
         self.api_uri = api_uri
         self.auth = auth
         self.items_per_request = items_per_request
+        self.page_sizer = page_sizer
+        self.cache = cache
+        self.codec = codec
         self.check_ca = check_ca
 
         self.max_retries = max_retries
         self.retry_timeout_factor = retry_timeout_factor
+        if retry_policy is None:
+            retry_policy = retry.RetryPolicy(max_retries=max_retries,
+                                             backoff_factor=retry_timeout_factor)
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+
+        if transport is None:
+            transport = httpbroker.PooledTransport(pool_maxsize=pool_maxsize)
+        self.transport = transport
+
+        if prewarm:
+            self.transport.prewarm(httpbroker._make_full_url(api_uri),
+                                   connections=prewarm, check_ca=check_ca,
+                                   auth=auth,
+                                   user_agent=httpbroker.DEFAULT_USER_AGENT)
 
-    def fetch_data(self, resource_path=None, params=None):
+    def fetch_data(self, resource_path=None, params=None, observer=None,
+                   stream=False, fields=None, filters=None):
         """
         Fetches the specified resource.
 
         :param resource_path: (optional) the endpoint and resource id.
         :param params: (optional) params to be passed as query string.
+        :param observer: (optional) callable that receives an
+        `httpbroker.ResponseInfo` for each response.
+        :param stream: (optional) if the documents under `stream_key` must be
+        decoded incrementally, as they are downloaded. Responses are never
+        cached in that case. Defaults to `False`.
+        :param fields: (optional) names of the fields to be retrieved, sent
+        as `fields_param` if the API supports it. See `iter_docs` for
+        client-side projection.
+        :param filters: (optional) dict of filters, e.g.
+        `{'title__startswith': 'A'}`. See `query.filter_params`.
         """
+        params = self.query_params(params, fields, filters)
         err_count = 0
         resource_url = httpbroker._make_full_url(self.api_uri, resource_path)
 
+        if self.metrics is not None:
+            observer = _chain(observer, self.metrics)
+
+        optionals = {}
+        if observer is not None:
+            optionals['observer'] = observer
+        if stream:
+            if self.stream_key is None:
+                raise ValueError('%s does not support streaming' %
+                                 self.__class__.__name__)
+            optionals['stream_key'] = self.stream_key
+        elif self.cache is not None:
+            optionals['cache'] = self.cache
+        if self.codec is not None:
+            optionals['codec'] = self.codec
+        if self.rate_limiter is not None:
+            optionals['rate_limiter'] = self.rate_limiter
+
+        policy = self.retry_policy
+        policy.on_request()
+
         while True:
+            trial = False
+            if self.circuit_breaker is not None:
+                trial = self.circuit_breaker.before_request(resource_url)
+
             try:
                 response = httpbroker.get(resource_url,
                                           auth=self.auth,
-                                          params=params)
+                                          params=params,
+                                          transport=self.transport,
+                                          **optionals)
 
-            except (exceptions.ConnectionError, exceptions.ServiceUnavailable) as e:
-                if err_count < self.max_retries:
-                    wait_secs = err_count * self.retry_timeout_factor
-                    logger.info('%s. Waiting %ss to retry.' % (e, wait_secs))
+            except exceptions.APIError as e:
+                self._record_outcome(resource_url, e)
+                if policy.should_retry(err_count, e):
+                    if self.metrics is not None:
+                        self.metrics.record_retry()
+                    wait_secs = policy.backoff(err_count, e)
+                    logger.info('%s. Waiting %ss to retry.', e, wait_secs)
                     time.sleep(wait_secs)
                     err_count += 1
                     continue
                 else:
-                    logger.error('%s. Unable to connect to resource.' % e)
+                    logger.error('%s. Unable to connect to resource.', e)
                     raise
+            except Exception:
+                # e.g. an undecodable body. A half-open circuit must not be
+                # left waiting for the outcome of its trial request.
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(resource_url)
+                raise
+            except BaseException:
+                # e.g. KeyboardInterrupt, which tells nothing about the host.
+                if trial:
+                    self.circuit_breaker.release(resource_url)
+                raise
             else:
+                self._record_outcome(resource_url)
                 return response
 
-    def iter_docs(self, resource_path=None, params=None):
+    def iter_docs(self, resource_path=None, params=None, prefetch=0,
+                  stream=False, checkpoint=None, fields=None, filters=None,
+                  compact=False):
         """
         Iterates over all documents of a given endpoint and collection.
 
         :param resource_path: (optional) the endpoint and resource id.
         :param params: (optional) params to be passed as query string.
+        :param prefetch: (optional) number of pages to be fetched in
+        background while the current one is being consumed. Defaults to `0`.
+        :param stream: (optional) if documents must be decoded and yielded
+        one at a time, as each page is downloaded, so that pages are never
+        entirely held in memory. Cannot be combined with `prefetch`.
+        Defaults to `False`.
+        :param checkpoint: (optional) `checkpoint.FileCheckpoint` instance.
+        The resumption cursor is stored after each fully consumed page, and
+        the iteration restarts from it if interrupted. The checkpoint is
+        cleared when the iteration is over.
+        :param fields: (optional) names of the fields to be retrieved.
+        Nested fields are given as dotted paths, e.g. `use_license.disclaimer`.
+        When the API does not support projection, i.e. `fields_param` is
+        `None`, documents are projected client-side as they are yielded.
+        :param filters: (optional) dict of filters, sent as query params.
+        See `query.filter_params`.
+        :param compact: (optional) if documents must be yielded as
+        `records.Record` instances, which take much less memory than dicts
+        when many of them are kept. Defaults to `False`.
         """
-        data = self.fetch_data(resource_path, params)
+        if prefetch and stream:
+            raise ValueError('prefetch and stream are mutually exclusive')
 
-        while True:
-            for obj in self.__get_docs__(data):
+        params = self.query_params(params, fields, filters)
+        project = self.projection(fields)
+        compactor = records.Compactor() if compact else None
+
+        start_path, start_params = resource_path, params
+        if checkpoint is not None:
+            cursor = checkpoint.load(resource_path, params)
+            if cursor is not None:
+                logger.info('Resuming harvest from %s', cursor)
+                start_path, start_params = cursor
+
+        pages = self.iter_pages(start_path, start_params, stream=stream)
+        if prefetch:
+            pages = read_ahead(pages, prefetch)
+
+        for data in pages:
+            for obj in self._page_docs(data, project, compactor):
                 yield obj
 
+            if checkpoint is not None:
+                try:
+                    cursor = self.__resumption_resource_path__(data)
+                except ValueError:
+                    continue
+                checkpoint.save(resource_path, params, cursor)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+    def query_params(self, params, fields=None, filters=None):
+        """
+        Returns a copy of `params` with `filters` and, if the API supports
+        it, `fields` added.
+
+        :param params: params to be passed as query string, or `None`.
+        :param fields: (optional) names of the fields to be retrieved.
+        :param filters: (optional) dict of filters.
+        """
+        pairs = []
+        if filters:
+            pairs.extend(query.filter_params(filters))
+        if fields and self.fields_param is not None:
+            pairs.append((self.fields_param, ','.join(fields)))
+
+        return query.merge_params(params, pairs)
+
+    def projection(self, fields):
+        """
+        Returns the callable that projects documents client-side, or `None`
+        if it is not needed.
+        """
+        if not fields or self.fields_param is not None:
+            return None
+        return query.Projection(fields)
+
+    def _page_docs(self, data, project=None, compactor=None):
+        """
+        Returns the documents of a page, projected by `project`, compacted
+        by `compactor` and counted if metrics are enabled.
+        """
+        docs = self.__get_docs__(data)
+        if project is not None:
+            if isinstance(docs, list):
+                docs = [project(doc) for doc in docs]
+            else:
+                docs = (project(doc) for doc in docs)
+        if compactor is not None:
+            docs = compactor.compact_page(docs)
+        if self.metrics is not None:
+            docs = self.metrics.count(docs)
+        return docs
+
+    def stats(self):
+        """
+        Returns a snapshot of the metrics as a dict, or `None` if metrics
+        are not enabled. See `metrics.Metrics.snapshot`.
+        """
+        if self.metrics is None:
+            return None
+        return self.metrics.snapshot()
+
+    def iter_pages(self, resource_path=None, params=None, stream=False):
+        """
+        Iterates over all pages of a given endpoint and collection, following
+        the resumption resource path of each page.
+
+        The size of the first page is `items_per_request`, unless `params`
+        sets it explicitly. When a `page_sizer` is set, the size of every
+        page is chosen by it.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        :param stream: (optional) if pages must be streamed. See `fetch_data`.
+        """
+        data = self.fetch_page(resource_path, self.page_params(params),
+                               stream=stream)
+
+        while True:
+            yield data
+
             try:
                 res_path, res_params = self.__resumption_resource_path__(data)
             except ValueError:
-                raise StopIteration()
+                return
+
+            if self.page_sizer is not None:
+                res_params = self.page_params(res_params, override=True)
+
+            data = self.fetch_page(res_path, res_params, stream=stream)
+
+    def fetch_page(self, resource_path=None, params=None, stream=False):
+        """
+        Fetches a page of documents, feeding the `page_sizer` with the
+        latency and payload size of the response.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        :param stream: (optional) if the page must be streamed. See
+        `fetch_data`.
+        """
+        optionals = {}
+        if stream:
+            optionals['stream'] = True
+
+        if self.page_sizer is None or stream:
+            # streamed pages cannot be measured before being consumed.
+            return self.fetch_data(resource_path, params, **optionals)
+
+        responses = []
+        data = self.fetch_data(resource_path, params, observer=responses.append)
+
+        try:
+            items = len(self.__get_docs__(data))
+        except TypeError:
+            # the amount of documents cannot be known without consuming them.
+            return data
+
+        if not responses:
+            # served from the cache, or shared with a concurrent request.
+            return data
+
+        info = responses[-1]
+        self.page_sizer.observe(items, info.elapsed, info.nbytes)
+        return data
+
+    def post_many(self, resource_path, records, workers=None, bulk=False,
+                  chunk_size=100):
+        """
+        Creates many resources concurrently, through the pooled connections.
+
+        When `bulk` is true, records are sent in chunks of `chunk_size` with
+        Tastypie's bulk `PATCH` on the list endpoint. Bulk requests are not
+        atomic: a chunk may fail after some of its records were created.
+        So the records of a failed chunk are only posted one by one when
+        the error is one of `BULK_REJECTIONS`, which Tastypie raises before
+        creating anything, e.g. when bulk `PATCH` is not allowed. Otherwise
+        they all get the error, and are left to be reconciled by the caller.
+
+        :param resource_path: the list endpoint, e.g. `journals`.
+        :param records: iterable of json serializable Python datastructures.
+        :param workers: (optional) number of concurrent requests. Defaults
+        to the transport's pool size, or to 1 if it is not pooled.
+        :param bulk: (optional) if records must be sent in chunks. Defaults
+        to `False`.
+        :param chunk_size: (optional) max number of records per chunk.
+        Defaults to `100`.
+        :returns: list with, for each record and in the same order, either
+        the newly created resource url or the `exceptions.APIError`
+        instance that prevented its creation. Bulk requests only return urls
+        if the resource is configured with `always_return_data`, `None`
+        otherwise.
+        """
+        records = list(records)
+        resource_url = httpbroker._make_full_url(self.api_uri, resource_path)
+        workers = workers or getattr(self.transport, 'pool_maxsize', 1)
+
+        def post_one(record):
+            try:
+                return httpbroker.post(resource_url, record, auth=self.auth,
+                                       transport=self.transport, codec=self.codec,
+                                       rate_limiter=self.rate_limiter,
+                                       observer=self.metrics)
+            except exceptions.APIError as e:
+                logger.error('Unable to create resource at %s: %s',
+                             resource_url, e)
+                return e
+
+        def patch_chunk(chunk):
+            try:
+                return httpbroker.patch_list(resource_url, chunk, auth=self.auth,
+                                             transport=self.transport,
+                                             codec=self.codec,
+                                             rate_limiter=self.rate_limiter,
+                                             observer=self.metrics)
+            except BULK_REJECTIONS as e:
+                logger.warning('Bulk creation of %s resources was rejected: '
+                               '%s. Retrying them one by one.', len(chunk), e)
+                return None
+            except exceptions.APIError as e:
+                logger.error('Bulk creation of %s resources at %s failed: %s',
+                             len(chunk), resource_url, e)
+                return [e] * len(chunk)
+
+        executor = futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            if not bulk:
+                return list(executor.map(post_one, records))
+
+            chunks = [records[i:i + chunk_size]
+                      for i in range(0, len(records), chunk_size)]
+            results = []
+            for chunk, created in zip(chunks, executor.map(patch_chunk, chunks)):
+                if created is None:
+                    created = list(executor.map(post_one, chunk))
+                results.extend(created)
 
-            data = self.fetch_data(res_path, res_params)
+            return results
+        finally:
+            executor.shutdown(wait=True)
 
     def __get_docs__(self, data):
         """Returns the iterable that will be consumed by iter_docs.
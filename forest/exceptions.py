@@ -2,6 +2,9 @@ class APIError(Exception):
     """
     Base class for all API exceptions
     """
+    #: seconds the server asked clients to wait before retrying, taken
+    #: from the `Retry-After` header.
+    retry_after = None
 
 
 class ConnectionError(APIError):
@@ -58,6 +61,12 @@ class NotAcceptable(APIError):
     """
 
 
+class TooManyRequests(APIError):
+    """
+    Raised on 429 HTTP status code
+    """
+
+
 class InternalServerError(APIError):
     """
     Raised on 500 HTTP status code
@@ -75,3 +84,10 @@ class ServiceUnavailable(APIError):
     Raised on 503 HTTP status code
     """
 
+
+
+class CircuitOpen(APIError):
+    """
+    Raised without dispatching the request when too many consecutive
+    requests to the same host have failed recently.
+    """
@@ -0,0 +1,155 @@
+# coding: utf-8
+"""Harvests of whole endpoints, split in shards processed in parallel by
+many processes, so that decoding is not bound to a single core.
+"""
+from __future__ import unicode_literals
+from concurrent import futures
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from . import compat, exceptions, query, sinks
+
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedHarvest(object):
+    """
+    Harvests Tastypie endpoints with a pool of processes.
+
+    The offset range of the endpoint, known from `meta.total_count`, is
+    split in shards of whole pages, sized after the `limit` the API
+    actually honours, which Tastypie caps at its `max_limit`. Each shard
+    is fetched, decoded and written as JSON lines to its own file by a
+    worker process, with its own connector, and the files are merged in
+    order at the end. Documents created or deleted during the harvest may
+    shift offsets, as with any offset-based pagination.
+
+    :param connector_class: `connectors.TastyPieConnector` or a subclass.
+    Each process instantiates its own.
+    :param api_uri: Full path to the API. e.g.:
+    `http://manager.scielo.org/api/v1/`.
+    :param connector_kwargs: (optional) dict of keyword arguments to the
+    connector, e.g. `auth` or `items_per_request`. Must be picklable.
+    :param processes: (optional) number of worker processes. Defaults to
+    the number of CPUs.
+    :param shards_per_process: (optional) number of shards per process, so
+    that processes finishing early pick up the remaining work. Defaults to
+    `4`.
+    """
+    def __init__(self, connector_class, api_uri, connector_kwargs=None,
+                 processes=None, shards_per_process=4):
+        self.connector_class = connector_class
+        self.api_uri = api_uri
+        self.connector_kwargs = connector_kwargs or {}
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shards_per_process = shards_per_process
+
+    def make_connector(self):
+        return self.connector_class(self.api_uri, **self.connector_kwargs)
+
+    def shards(self, total_count, page_size):
+        """
+        Splits `range(total_count)` in `(start, stop)` offsets, aligned to
+        `page_size`.
+        """
+        pages = -(-total_count // page_size)
+        count = max(1, min(pages, self.processes * self.shards_per_process))
+
+        bounds = [page_size * (pages * i // count) for i in range(count + 1)]
+        return [(start, min(stop, total_count))
+                for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+    def run(self, resource_path, output, params=None):
+        """
+        Harvests `resource_path` into the file `output`, one JSON document
+        per line, compressed with gzip if `output` ends with `.gz`. The file
+        is only replaced once all shards succeed.
+
+        :param resource_path: the endpoint, e.g. `journals`.
+        :param output: path of the output file.
+        :param params: (optional) params to be passed as query string.
+        :returns: the number of documents harvested.
+        """
+        connector = self.make_connector()
+        first = connector.fetch_data(resource_path, query.merge_params(
+            params, [(connector.limit_param, connector.items_per_request)]))
+        total_count = first['meta']['total_count']
+        page_size = first['meta'].get('limit') or connector.items_per_request
+        shards = self.shards(total_count, page_size)
+        logger.info('Harvesting %s documents of %s in %s shards with %s '
+                    'processes', total_count, resource_path, len(shards),
+                    self.processes)
+
+        directory = os.path.dirname(os.path.abspath(output))
+        workdir = tempfile.mkdtemp(dir=directory, suffix='.shards')
+        try:
+            # gzip members can be concatenated, so shards are compressed
+            # by the workers too.
+            suffix = '.jsonl.gz' if output.endswith('.gz') else '.jsonl'
+            paths = [os.path.join(workdir, 'shard-%05d%s' % (i, suffix))
+                     for i in range(len(shards))]
+
+            executor = futures.ProcessPoolExecutor(max_workers=self.processes)
+            try:
+                jobs = [executor.submit(_harvest_shard, self.connector_class,
+                                        self.api_uri, self.connector_kwargs,
+                                        resource_path, params, page_size,
+                                        start, stop, path)
+                        for (start, stop), path in zip(shards, paths)]
+                count = sum(job.result() for job in jobs)
+            finally:
+                executor.shutdown(wait=True)
+
+            _merge(paths, output)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        logger.info('Harvested %s documents of %s into %s',
+                    count, resource_path, output)
+        return count
+
+
+def _harvest_shard(connector_class, api_uri, connector_kwargs, resource_path,
+                   params, page_size, start, stop, path):
+    """Writes the documents from offset `start` to `stop` to `path`.
+
+    Pages shorter than requested are followed by the remaining offsets, and
+    an empty page before `stop` means documents are missing.
+    """
+    connector = connector_class(api_uri, **connector_kwargs)
+
+    with sinks.JsonLinesSink(path, codec=connector.codec) as sink:
+        offset = start
+        while offset < stop:
+            limit = min(page_size, stop - offset)
+            data = connector.fetch_data(resource_path, query.merge_params(
+                params, [(connector.limit_param, limit), ('offset', offset)]))
+            docs = connector.__get_docs__(data)[:limit]
+            if not docs:
+                raise exceptions.APIError(
+                    'Missing documents of %s from offset %s to %s'
+                    % (resource_path, offset, stop))
+            sink.consume(docs)
+            offset += len(docs)
+
+    return sink.count
+
+
+def _merge(paths, output):
+    """Concatenates `paths` into `output`, replacing it atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as merged:
+            for path in paths:
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, merged)
+        compat.replace(tmp_path, output)
+    except Exception:
+        os.remove(tmp_path)
+        raise
@@ -1,22 +1,51 @@
 # coding: utf-8
 from __future__ import unicode_literals
+import collections
+import email.utils
 from functools import wraps
-import json
 import logging
+import threading
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 
-from . import exceptions, compat
+from . import exceptions, compat, jsonstream, jsoncodecs
+from .transports import Transport, _AuthRequest
 
 
-__all__ = ['get', 'post', '_make_full_url']
+__all__ = ['get', 'post', 'patch_list', '_make_full_url', 'PooledTransport',
+           'ResponseInfo']
 
 DEFAULT_SCHEME = 'http'
 DEFAULT_USER_AGENT = 'scielo-client'
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CHUNK_SIZE = 64 * 1024
 
 logger = logging.getLogger(__name__)
 
 
+class ResponseInfo(collections.namedtuple('ResponseInfo',
+        ['method', 'url', 'status_code', 'elapsed', 'nbytes', 'decode_secs'])):
+    """
+    Describes a response, as passed to the `observer` of `get` and `post`.
+
+    :param elapsed: seconds between dispatching the request and reading the
+    whole response body, or only its headers for streamed responses.
+    :param nbytes: size of the response body, in bytes, or `None` for
+    streamed responses.
+    :param decode_secs: (optional) seconds spent decoding the response
+    body, or `None` if it was not decoded.
+    """
+    __slots__ = ()
+
+    def __new__(cls, method, url, status_code, elapsed, nbytes,
+                decode_secs=None):
+        return super(ResponseInfo, cls).__new__(cls, method, url, status_code,
+                                                elapsed, nbytes, decode_secs)
+
+
 def check_http_status(response):
     """
     Raises one of `scieloapi.exceptions` depending on response status-code.
@@ -25,7 +54,7 @@ def check_http_status(response):
     """
     http_status = response.status_code
 
-    logger.debug('Response status code is %s' % http_status)
+    logger.debug('Response status code is %s', http_status)
 
     if http_status == 400:
         raise exceptions.BadRequest()
@@ -39,28 +68,60 @@ def check_http_status(response):
         raise exceptions.MethodNotAllowed()
     elif http_status == 406:
         raise exceptions.NotAcceptable()
+    elif http_status == 429:
+        error = exceptions.TooManyRequests()
+        error.retry_after = parse_retry_after(response)
+        raise error
     elif http_status == 500:
         raise exceptions.InternalServerError()
     elif http_status == 502:
         raise exceptions.BadGateway()
     elif http_status == 503:
-        raise exceptions.ServiceUnavailable()
+        error = exceptions.ServiceUnavailable()
+        error.retry_after = parse_retry_after(response)
+        raise error
     else:
         return None
 
 
+def parse_retry_after(response):
+    """
+    Returns the seconds to wait according to the `Retry-After` header of
+    `response`, or `None` if it is missing or invalid.
+
+    :param response: is a requests.Response instance.
+    """
+    value = response.headers.get('Retry-After')
+    if not isinstance(value, compat.string_types):
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
 def translate_exceptions(func):
     """
     Translates all dependencies' exceptions and re-raise them as scieloapi's.
 
     This function aims to isolate third-party dependencies from the exposed
     API, in a way users should never import `requests` lib to handle exceptions
-    or other stuff.
+    or other stuff. Exceptions of `urllib3`, raised by
+    `transports.Urllib3Transport`, are translated the same way `requests`
+    translates them.
     """
     @wraps(func)
     def f_wrap(*args, **kwargs):
         try:
             resp = func(*args, **kwargs)
+        except exceptions.APIError:
+            raise
         except requests.exceptions.ConnectionError as e:
             raise exceptions.ConnectionError(e)
         except requests.exceptions.HTTPError as e:
@@ -71,12 +132,57 @@ def translate_exceptions(func):
             raise exceptions.HTTPError(e)
         except requests.exceptions.RequestException as e:
             raise exceptions.HTTPError(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise _translate_urllib3_error(e)
         else:
             return resp
 
     return f_wrap
 
 
+def _translate_urllib3_error(error):
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        if isinstance(error.reason, urllib3.exceptions.HTTPError):
+            error = error.reason
+        else:
+            # e.g. too many redirects.
+            return exceptions.HTTPError(error)
+
+    # NewConnectionError is a subclass of ConnectTimeoutError.
+    if isinstance(error, (urllib3.exceptions.NewConnectionError,
+                          urllib3.exceptions.ProtocolError,
+                          urllib3.exceptions.SSLError,
+                          urllib3.exceptions.ProxyError)):
+        return exceptions.ConnectionError(error)
+    if isinstance(error, urllib3.exceptions.TimeoutError):
+        return exceptions.Timeout(error)
+    return exceptions.HTTPError(error)
+
+
+def iter_content(response, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterates over the body of a streamed response, translating
+    dependencies' exceptions just like `translate_exceptions` does.
+
+    The response is closed, and its connection released, when the
+    iteration ends.
+
+    :param response: is a requests.Response instance, requested with
+    `stream=True`.
+    :param chunk_size: (optional) max size of each chunk, in bytes.
+    """
+    chunks = iter(response.iter_content(chunk_size))
+    next_chunk = translate_exceptions(lambda: next(chunks, None))
+    try:
+        while True:
+            chunk = next_chunk()
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        response.close()
+
+
 def prepare_params(params):
     """
     Prepare params before the http request is dispatched.
@@ -98,7 +204,7 @@ def prepare_params(params):
     return sorted(params)
 
 
-def prepare_data(data):
+def prepare_data(data, codec=None):
     """
     Prepare data to be dispatched.
 
@@ -106,12 +212,108 @@ def prepare_data(data):
     encoded as JSON.
 
     :param data: json serializable data
+    :param codec: (optional) `jsoncodecs` codec. Defaults to the fastest
+    one installed.
     """
-    prepared = data if isinstance(data, compat.string_types) else json.dumps(data)
-    return prepared
+    if isinstance(data, compat.string_types):
+        return data
+
+    return (codec or jsoncodecs.default_codec).dumps(data)
 
 
 
+class PooledTransport(Transport):
+    """
+    Thread-safe HTTP transport that keeps connections alive between requests.
+
+    Each thread gets its own `requests.Session`, but all of them are mounted
+    on the same `HTTPAdapter`, so TCP (and TLS) connections are pooled per
+    host and reused across threads. Instances expose the same `get` and
+    `post` interface as the `requests` module. This is the default
+    transport of connectors. See `transports` for the alternatives.
+
+    :param pool_connections: (optional) number of per-host pools to keep.
+    :param pool_maxsize: (optional) max number of idle connections kept
+    alive per host. Defaults to `10`.
+    :param pool_block: (optional) if requests should wait for a free
+    connection when the pool is exhausted, instead of opening a throwaway one.
+    """
+    def __init__(self, pool_connections=DEFAULT_POOL_MAXSIZE,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False):
+        self.pool_maxsize = pool_maxsize
+        self._adapter = HTTPAdapter(pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize,
+                                    pool_block=pool_block)
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """The `requests.Session` bound to the current thread.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.session.patch(url, **kwargs)
+
+    def prewarm(self, url, connections=1, check_ca=False, auth=None,
+                user_agent=None):
+        """
+        Opens `connections` keep-alive connections to the host of `url`.
+
+        The connections are opened concurrently, so that each one ends up
+        as a distinct idle connection in the pool. Failures are logged and
+        otherwise ignored, as prewarming is only an optimization.
+
+        :param url: any URL of the target host.
+        :param connections: (optional) how many connections to open.
+        :param check_ca: (optional) if certification authority should be
+        checked during ssl sessions. Defaults to `False`.
+        :param auth: (optional) `forest.auth.AuthBase` instance, for APIs
+        that reject anonymous requests.
+        :param user_agent: (optional) string of the user agent.
+        """
+        connections = min(connections, self.pool_maxsize)
+        headers = {'User-Agent': user_agent or DEFAULT_USER_AGENT}
+        optionals = {}
+        if auth:
+            optionals['auth'] = auth
+        if url.startswith('https'):
+            optionals['verify'] = check_ca
+
+        def warm():
+            try:
+                self.session.head(url, headers=headers, **optionals)
+            except requests.exceptions.RequestException as e:
+                logger.warning('Unable to prewarm connection to %s: %s', url, e)
+
+        threads = [threading.Thread(target=warm) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        """Closes all pooled connections.
+        """
+        self._adapter.close()
+
+
 def _make_full_url(*uri_segs):
     """
     Joins URI segments to produce an URL.
@@ -130,8 +332,21 @@ def _make_full_url(*uri_segs):
     return full_uri
 
 
+def _credentials(auth):
+    """Headers set by `auth`, as a string, or `None` if there is no `auth`.
+    """
+    if not auth:
+        return None
+
+    headers = {}
+    auth(_AuthRequest(headers))
+    return '\n'.join('%s: %s' % item for item in sorted(headers.items()))
+
+
 @translate_exceptions
-def get(url, params=None, auth=None, check_ca=False, user_agent=None):
+def get(url, params=None, auth=None, check_ca=False, user_agent=None,
+        transport=None, observer=None, cache=None, stream_key=None,
+        codec=None, rate_limiter=None):
     """
     Dispatches an HTTP GET request to `url`.
 
@@ -145,10 +360,46 @@ def get(url, params=None, auth=None, check_ca=False, user_agent=None):
     :param check_ca: (optional) if certification authority should be checked during
     ssl sessions. Defaults to `False`.
     :param user_agent: (optional) string of the user agent.
+    :param transport: (optional) `PooledTransport` or `transports.Transport`
+    instance. Defaults to the `requests` module, i.e. a new connection per
+    request.
+    :param observer: (optional) callable that receives a `ResponseInfo`
+    for the response.
+    :param cache: (optional) `forest.cache.DiskCache` or
+    `forest.cache.MemoryCache` instance. Fresh responses are served from
+    the cache, stale ones are revalidated with conditional requests and
+    served from the cache when the server answers `304 Not Modified`.
+    Concurrent identical requests are coalesced into a single one. Entries
+    are keyed by the credentials set by `auth` too, so that callers with
+    different credentials never share responses.
+    :param stream_key: (optional) name of the member of the response
+    object holding an array to be decoded incrementally, as the body is
+    downloaded. In that case a `jsonstream.StreamedObject` is returned.
+    Cannot be combined with `cache`.
+    :param codec: (optional) `jsoncodecs` codec used to decode the response
+    body straight from bytes. Defaults to the fastest one installed.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance,
+    shared by all requests to the same server.
     """
+    if stream_key is not None and cache is not None:
+        raise ValueError('stream_key and cache are mutually exclusive')
+
+    codec = codec or jsoncodecs.default_codec
+
     # custom headers
     headers = {'User-Agent': user_agent or DEFAULT_USER_AGENT}
 
+    entry = None
+    if cache is not None:
+        key = cache.key(url, params, _credentials(auth))
+        entry = cache.get(key)
+        if entry is not None:
+            if cache.is_fresh(entry):
+                logger.debug('Serving %s from cache', url)
+                return codec.loads(entry.body)
+
+            headers.update(entry.validators())
+
     optionals = {}
     if auth:
         optionals['auth'] = auth
@@ -156,21 +407,74 @@ def get(url, params=None, auth=None, check_ca=False, user_agent=None):
     if url.startswith('https'):
         optionals['verify'] = check_ca
 
-    logger.debug('Sending a GET request to %s with headers %s and params %s %s' %
-        (url, headers, params, optionals))
+    if stream_key is not None:
+        optionals['stream'] = True
+
+    logger.debug('Sending a GET request to %s with headers %s and params %s %s',
+                 url, headers, params, optionals)
+
+    transport = transport or requests
+
+    def dispatch():
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return time.time(), transport.get(url,
+                                          headers=headers,
+                                          params=prepare_params(params),
+                                          **optionals)
+
+    if cache is not None:
+        (started, resp), shared = cache.coalesce(key, dispatch)
+    else:
+        (started, resp), shared = dispatch(), False
+
+    received = time.time()
+
+    def notify(decode_secs=None):
+        if observer is not None and not shared:
+            nbytes = None if stream_key is not None else len(resp.content)
+            observer(ResponseInfo('GET', url, resp.status_code,
+                                  received - started, nbytes, decode_secs))
 
-    resp = requests.get(url,
-                        headers=headers,
-                        params=prepare_params(params),
-                        **optionals)
+    if shared and entry is None and resp.status_code == 304:
+        # the concurrent request this one was coalesced with was conditional.
+        entry = cache.get(key)
+
+    if entry is not None and resp.status_code == 304:
+        logger.debug('Serving %s from cache, as it was not modified', url)
+        notify()
+        if cache.fresh_for and not shared:
+            cache.set(key, entry.refreshed())
+        return codec.loads(entry.body)
 
     # check if an exception should be raised based on http status code
-    check_http_status(resp)
+    try:
+        check_http_status(resp)
+    except exceptions.APIError:
+        notify()
+        if stream_key is not None:
+            resp.close()
+        raise
+
+    if stream_key is not None:
+        notify()
+        return jsonstream.StreamedObject(iter_content(resp), stream_key)
 
-    return resp.json()
+    if cache is not None and resp.status_code == 200 and not shared:
+        cache.store(key, resp)
 
+    if observer is None or shared:
+        return codec.loads(resp.content)
 
-def post(url, data, auth=None, check_ca=False, user_agent=None):
+    decode_started = time.time()
+    data = codec.loads(resp.content)
+    notify(time.time() - decode_started)
+    return data
+
+
+@translate_exceptions
+def post(url, data, auth=None, check_ca=False, user_agent=None,
+         transport=None, observer=None, codec=None, rate_limiter=None):
     """
     Dispatches an HTTP POST request to `api_uri`, with `data`.
 
@@ -183,6 +487,15 @@ def post(url, data, auth=None, check_ca=False, user_agent=None):
     :param auth: (optional) `forest.auth.AuthBase` instance.
     :param check_ca: (optional) if certification authority should be checked during ssl sessions. Defaults to `False`.
     :param user_agent: (optional) string of the user agent.
+    :param transport: (optional) `PooledTransport` or `transports.Transport`
+    instance. Defaults to the `requests` module, i.e. a new connection per
+    request.
+    :param observer: (optional) callable that receives a `ResponseInfo`
+    for the response.
+    :param codec: (optional) `jsoncodecs` codec used to encode `data`.
+    Defaults to the fastest one installed.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance,
+    shared by all requests to the same server.
     :returns: newly created resource url
     """
     # custom headers
@@ -196,14 +509,22 @@ def post(url, data, auth=None, check_ca=False, user_agent=None):
     if url.startswith('https'):
         optionals['verify'] = check_ca
 
-    prepared_data = prepare_data(data)
-    logger.debug('Sending a POST request to %s with headers %s, data %s and params %s' %
-        (url, headers, prepared_data, optionals))
+    prepared_data = prepare_data(data, codec=codec)
+    logger.debug('Sending a POST request to %s with headers %s, data %s and params %s',
+                 url, headers, prepared_data, optionals)
 
-    resp = requests.post(url=url,
-                         data=prepared_data,
-                         headers=headers,
-                         **optionals)
+    transport = transport or requests
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    started = time.time()
+    resp = transport.post(url=url,
+                          data=prepared_data,
+                          headers=headers,
+                          **optionals)
+
+    if observer is not None:
+        observer(ResponseInfo('POST', url, resp.status_code,
+                              time.time() - started, len(resp.content)))
 
     # check if an exception should be raised based on http status code
     check_http_status(resp)
@@ -211,7 +532,85 @@ def post(url, data, auth=None, check_ca=False, user_agent=None):
     if resp.status_code != 201:
         raise exceptions.APIError('The server has gone nuts: %s' % resp.status_code)
 
-    logger.info('Newly created resource at %s' % resp.headers['location'])
+    location = resp.headers.get('location')
+    if not location:
+        raise exceptions.APIError(
+            'The server did not return the location of the new resource')
+
+    logger.info('Newly created resource at %s', location)
+
+    return location
+
+
+
+@translate_exceptions
+def patch_list(url, objects, auth=None, check_ca=False, user_agent=None,
+               transport=None, observer=None, codec=None, rate_limiter=None):
+    """
+    Dispatches an HTTP PATCH request to the list endpoint `url`, creating
+    all `objects` at once, as supported by Tastypie.
+
+    Tastypie only returns the created objects when the resource is
+    configured with `always_return_data`.
+
+    :param url: e.g. http://manager.scielo.org/api/v1/journals/
+    :param objects: list of json serializable Python datastructures.
+    :param auth: (optional) `forest.auth.AuthBase` instance.
+    :param check_ca: (optional) if certification authority should be checked during ssl sessions. Defaults to `False`.
+    :param user_agent: (optional) string of the user agent.
+    :param transport: (optional) `PooledTransport` or `transports.Transport`
+    instance. Defaults to the `requests` module, i.e. a new connection per
+    request.
+    :param observer: (optional) callable that receives a `ResponseInfo`
+    for the response.
+    :param codec: (optional) `jsoncodecs` codec used to encode `objects`
+    and decode the response. Defaults to the fastest one installed.
+    :param rate_limiter: (optional) `ratelimit.TokenBucket` instance,
+    shared by all requests to the same server.
+    :returns: list of the newly created resources uris, in the same order
+    as `objects`, or a list of `None` if the server returned no data.
+    """
+    codec = codec or jsoncodecs.default_codec
+
+    # custom headers
+    headers = {'User-Agent': user_agent or DEFAULT_USER_AGENT,
+               'Content-Type': 'application/json'}
+
+    optionals = {}
+    if auth:
+        optionals['auth'] = auth
+
+    if url.startswith('https'):
+        optionals['verify'] = check_ca
+
+    prepared_data = prepare_data({'objects': objects}, codec=codec)
+    logger.debug('Sending a PATCH request to %s with headers %s and %s objects',
+                 url, headers, len(objects))
+
+    transport = transport or requests
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    started = time.time()
+    resp = transport.patch(url,
+                           data=prepared_data,
+                           headers=headers,
+                           **optionals)
+
+    if observer is not None:
+        observer(ResponseInfo('PATCH', url, resp.status_code,
+                              time.time() - started, len(resp.content)))
+
+    # check if an exception should be raised based on http status code
+    check_http_status(resp)
+
+    if resp.status_code not in (200, 202):
+        raise exceptions.APIError('The server has gone nuts: %s' % resp.status_code)
+
+    if not resp.content:
+        return [None] * len(objects)
 
-    return resp.headers['location']
+    created = codec.loads(resp.content).get('objects') or []
+    if len(created) != len(objects):
+        return [None] * len(objects)
 
+    return [obj.get('resource_uri') for obj in created]
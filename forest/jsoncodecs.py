@@ -0,0 +1,96 @@
+# coding: utf-8
+"""JSON codecs used to decode responses and encode request bodies.
+
+Faster third-party codecs are used when installed, in order of preference:
+`orjson` and `ujson`. The standard library's `json` module is the fallback.
+"""
+from __future__ import unicode_literals
+import json
+import sys
+
+from . import compat
+
+
+__all__ = ['StdlibCodec', 'OrjsonCodec', 'UjsonCodec', 'get_codec',
+           'available_codecs']
+
+# json.loads only accepts bytes from Python 3.6 on.
+_LOADS_BYTES = compat.PY2 or sys.version_info >= (3, 6)
+
+
+class StdlibCodec(object):
+    """The standard library's `json` module.
+    """
+    name = 'json'
+
+    def loads(self, data):
+        """Decodes `data`, a byte or text string.
+        """
+        if isinstance(data, bytes) and not _LOADS_BYTES:
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """Encodes `obj` as JSON text or bytes.
+        """
+        return json.dumps(obj)
+
+
+class OrjsonCodec(object):
+    """`orjson`, which decodes straight from bytes and encodes to bytes.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.loads = orjson.loads
+        self.dumps = orjson.dumps
+
+
+class UjsonCodec(object):
+    """`ujson`, a C implementation with the same interface as `json`.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self.loads = ujson.loads
+        self.dumps = ujson.dumps
+
+
+CODECS = [OrjsonCodec, UjsonCodec, StdlibCodec]
+
+
+def available_codecs():
+    """Returns instances of all installed codecs, from the fastest to the
+    slowest.
+    """
+    codecs = []
+    for codec_class in CODECS:
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            continue
+    return codecs
+
+
+def get_codec(name=None):
+    """
+    Returns a codec instance.
+
+    :param name: (optional) one of `orjson`, `ujson` or `json`. Defaults to
+    the fastest codec installed.
+    :raises ImportError: if the named codec is not installed.
+    """
+    if name is None:
+        return available_codecs()[0]
+
+    for codec_class in CODECS:
+        if codec_class.name == name:
+            return codec_class()
+
+    raise ValueError('Unknown codec: %s' % name)
+
+
+#: the fastest codec installed.
+default_codec = get_codec()
@@ -0,0 +1,155 @@
+# coding: utf-8
+"""Incremental decoding of JSON objects whose bulk is a single array,
+like Tastypie's list responses.
+"""
+from __future__ import unicode_literals
+import codecs
+import json
+
+
+WHITESPACE = ' \t\n\r'
+
+
+class StreamedObject(dict):
+    """
+    A JSON object decoded incrementally from `chunks`.
+
+    The members preceding `stream_key` are decoded at construction time.
+    The array under `stream_key` is exposed as an iterator that decodes one
+    element at a time, and the members following it become available as
+    soon as the iterator is exhausted. This way, at most one element of
+    the array is held in memory at any time.
+
+    :param chunks: iterable of bytes or text chunks.
+    :param stream_key: name of the member holding the array to be streamed.
+    """
+    def __init__(self, chunks, stream_key):
+        super(StreamedObject, self).__init__()
+        self._reader = _Reader(chunks)
+        self.stream_key = stream_key
+
+        self._reader.expect('{')
+        if self._decode_members():
+            self[stream_key] = self._iter_stream()
+        else:
+            self._reader.finish()
+
+    def _decode_members(self):
+        """Decodes members until the end of the object or until
+        `stream_key` is found, in which case `True` is returned.
+        """
+        reader = self._reader
+        first = True
+        while True:
+            if reader.peek() == '}':
+                reader.expect('}')
+                return False
+
+            if not first:
+                reader.expect(',')
+            first = False
+
+            key = reader.decode_value()
+            reader.expect(':')
+            if key == self.stream_key:
+                return True
+
+            self[key] = reader.decode_value()
+
+    def _iter_stream(self):
+        reader = self._reader
+        reader.expect('[')
+
+        first = True
+        while reader.peek() != ']':
+            if not first:
+                reader.expect(',')
+            first = False
+            yield reader.decode_value()
+
+        reader.expect(']')
+        if reader.peek() == ',':
+            reader.expect(',')
+            self._decode_members()
+        else:
+            reader.expect('}')
+
+        reader.finish()
+
+
+class _Reader(object):
+    """Buffers decoded text from `chunks`, discarding what was consumed.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Reads the next chunk. Returns `False` when there is none.
+        """
+        if self._eof:
+            return False
+
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk)
+            if chunk:
+                self._buffer += chunk
+                return True
+
+        self._eof = True
+        self._buffer += self._decoder.decode(b'', final=True)
+        return False
+
+    def finish(self):
+        """Consumes the remaining chunks, so the underlying resources
+        can be released.
+        """
+        while self._fill():
+            pass
+
+    def peek(self):
+        """Returns the next non-whitespace character, without consuming it.
+        """
+        while True:
+            while self._pos < len(self._buffer):
+                char = self._buffer[self._pos]
+                if char not in WHITESPACE:
+                    return char
+                self._pos += 1
+
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError('Expecting %r at position %s, found %r' %
+                             (char, self._pos, found))
+        self._pos += 1
+
+    def decode_value(self):
+        """Decodes the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+
+            # a number at the end of the buffer may continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            self._pos = end
+            return value
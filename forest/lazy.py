@@ -0,0 +1,123 @@
+# coding: utf-8
+"""Documents whose related resources are fetched on access.
+"""
+from __future__ import unicode_literals
+
+from . import compat
+
+
+class LazyDocument(compat.Mapping):
+    """
+    Read-only proxy of a document, that resolves resource URIs as they are
+    accessed.
+
+    A field holding a resource URI, like `/api/v1/issues/1420/`, yields the
+    referred document instead, and a field holding a list of URIs yields
+    the list of documents, all fetched in a single batch. Nested objects
+    are proxied too, and the ones that are only partially embedded, e.g.
+    `{'resource_uri': '/api/v1/uselicenses/1044/'}`, are fetched as soon as
+    a missing field is accessed. The `resource_uri` field itself is never
+    resolved. Resources that do not exist are `None`.
+
+    Resolved values are memoized by the proxy, and resources are memoized
+    by `resolver`, which is shared by all documents of the same connector.
+
+    :param doc: the document.
+    :param resolver: `resolver.Resolver` instance.
+    :param complete: (optional) if `doc` has all the fields of the
+    resource. Defaults to `True`.
+    """
+    __slots__ = ('_doc', '_resolver', '_complete', '_resolved')
+
+    def __init__(self, doc, resolver, complete=True):
+        self._doc = doc
+        self._resolver = resolver
+        self._complete = complete
+        self._resolved = {}
+
+    @property
+    def raw(self):
+        """The proxied document, with URIs left unresolved.
+        """
+        return self._doc
+
+    def __getitem__(self, key):
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+
+        if key not in self._doc and not self._complete:
+            self._fetch()
+
+        value = self._doc[key]
+        if key != 'resource_uri':
+            value = self._wrap(value)
+
+        self._resolved[key] = value
+        return value
+
+    def __iter__(self):
+        if not self._complete:
+            self._fetch()
+        return iter(self._doc)
+
+    def __len__(self):
+        if not self._complete:
+            self._fetch()
+        return len(self._doc)
+
+    def __contains__(self, key):
+        if key not in self._doc and not self._complete:
+            self._fetch()
+        return key in self._doc
+
+    def __eq__(self, other):
+        if isinstance(other, LazyDocument):
+            other = other.raw
+        return self._doc == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<LazyDocument %r>' % (self._doc.get('resource_uri'),)
+
+    def _fetch(self):
+        uri = self._doc.get('resource_uri')
+        full = self._resolver.resolve([uri])[uri] if uri else None
+        if full is not None:
+            doc = dict(full)
+            doc.update(self._doc)
+            self._doc = doc
+        self._complete = True
+
+    def _wrap(self, value):
+        resolver = self._resolver
+        if resolver.is_resource_uri(value):
+            return self._proxy(resolver.resolve([value])[value])
+
+        if isinstance(value, compat.Mapping):
+            return LazyDocument(value, resolver, complete=False)
+
+        if isinstance(value, (list, tuple)):
+            uris = [item for item in value if resolver.is_resource_uri(item)]
+            resolved = resolver.resolve(uris) if uris else {}
+
+            wrapped = []
+            for item in value:
+                if resolver.is_resource_uri(item):
+                    item = self._proxy(resolved[item])
+                elif isinstance(item, compat.Mapping):
+                    item = LazyDocument(item, resolver, complete=False)
+                wrapped.append(item)
+            return wrapped
+
+        return value
+
+    def _proxy(self, doc):
+        if doc is None:
+            return None
+        return LazyDocument(doc, self._resolver)
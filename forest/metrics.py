@@ -0,0 +1,144 @@
+# coding: utf-8
+"""Instrumentation of harvests: where the time goes, and how fast it goes.
+"""
+from __future__ import unicode_literals
+import collections
+import math
+import threading
+import time
+
+
+class Metrics(object):
+    """
+    Aggregates the `httpbroker.ResponseInfo` of each response, along with
+    retries, pages and documents, so that throughput and latency
+    percentiles can be reported.
+
+    Instances are thread-safe callables that can be passed as `observer`
+    to `httpbroker` functions, or as `metrics` to connectors, and may be
+    shared by many of them.
+
+    :param max_samples: (optional) number of most recent latencies used to
+    compute percentiles. Defaults to `10000`.
+    """
+    #: percentiles included in snapshots.
+    percentiles = (50, 90, 99)
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discards everything recorded so far.
+        """
+        with self._lock:
+            self.started_at = time.time()
+            self.requests = 0
+            self.nbytes = 0
+            self.statuses = collections.Counter()
+            self.latencies = collections.deque(maxlen=self.max_samples)
+            self.decode_secs = 0.0
+            self.retries = 0
+            self.pages = 0
+            self.docs = 0
+
+    def __call__(self, info):
+        """Records a `httpbroker.ResponseInfo`.
+        """
+        with self._lock:
+            self.requests += 1
+            self.statuses[info.status_code] += 1
+            self.latencies.append(info.elapsed)
+            if info.nbytes:
+                self.nbytes += info.nbytes
+            if info.decode_secs:
+                self.decode_secs += info.decode_secs
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_page(self, docs):
+        """Records a page of `docs` documents.
+        """
+        with self._lock:
+            self.pages += 1
+            self.docs += docs
+
+    def count(self, docs):
+        """
+        Iterates over `docs`, recording them as a page once exhausted.
+        """
+        count = 0
+        for doc in docs:
+            count += 1
+            yield doc
+        self.record_page(count)
+
+    def percentile(self, percent):
+        """
+        Returns the latency, in seconds, below which `percent` of the
+        recent requests fall, or `None` if there are none.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+        return _nearest_rank(latencies, percent)
+
+    def snapshot(self):
+        """Returns a dict with the current values of all metrics.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            snapshot = {
+                'elapsed': elapsed,
+                'requests': self.requests,
+                'bytes': self.nbytes,
+                'statuses': dict(self.statuses),
+                'retries': self.retries,
+                'decode_secs': self.decode_secs,
+                'pages': self.pages,
+                'docs': self.docs,
+                'pages_per_sec': self.pages / elapsed,
+                'docs_per_sec': self.docs / elapsed,
+            }
+
+        for percent in self.percentiles:
+            snapshot['latency_p%s' % percent] = _nearest_rank(latencies, percent)
+
+        return snapshot
+
+    def render(self, prefix='forest'):
+        """
+        Returns a snapshot as text, one `name value` pair per line, in the
+        Prometheus text exposition format.
+
+        :param prefix: (optional) prefix of the metrics names. Defaults to
+        `forest`.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name in ['requests', 'bytes', 'retries', 'decode_secs', 'pages',
+                     'docs', 'pages_per_sec', 'docs_per_sec']:
+            lines.append('%s_%s %s' % (prefix, name, snapshot[name]))
+
+        for status, count in sorted(snapshot['statuses'].items()):
+            lines.append('%s_responses{status="%s"} %s' % (prefix, status, count))
+
+        for percent in self.percentiles:
+            value = snapshot['latency_p%s' % percent]
+            if value is not None:
+                lines.append('%s_latency_secs{quantile="0.%s"} %s' %
+                             (prefix, percent, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _nearest_rank(values, percent):
+    """Percentile of the sorted list `values`, by the nearest-rank method.
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
@@ -0,0 +1,92 @@
+# coding: utf-8
+from __future__ import unicode_literals
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptivePageSize(object):
+    """
+    Chooses how many items are requested per page, based on the latency
+    and payload size observed on previous pages.
+
+    Pages grow while the server answers faster than `target_secs` and
+    shrink when it gets slower, so that each request takes about
+    `target_secs`. Observations are smoothed with an exponentially
+    weighted moving average, and the size never changes by more than
+    `max_growth` times between two pages.
+
+    :param initial: (optional) size of the first page. Defaults to `50`.
+    :param target_secs: (optional) desired duration of each request.
+    Defaults to `1.0`.
+    :param min_size: (optional) lower bound of the page size. Defaults to `10`.
+    :param max_size: (optional) upper bound of the page size. Defaults to `1000`.
+    :param max_bytes: (optional) upper bound of the payload size of each
+    page, in bytes. Defaults to `None`, i.e. unbounded.
+    :param max_growth: (optional) max factor the page size is multiplied or
+    divided by between two pages. Defaults to `2.0`.
+    :param smoothing: (optional) weight of the newest observation, between
+    `0` and `1`. Defaults to `0.5`.
+    """
+    def __init__(self, initial=50, target_secs=1.0, min_size=10,
+                 max_size=1000, max_bytes=None, max_growth=2.0, smoothing=0.5):
+        self.target_secs = target_secs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_growth = max_growth
+        self.smoothing = smoothing
+
+        self._size = self._clamp(initial)
+        self._secs_per_item = None
+        self._bytes_per_item = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """Number of items to be requested for the next page.
+        """
+        return self._size
+
+    def observe(self, items, elapsed, nbytes):
+        """
+        Adjusts the page size after a page was fetched.
+
+        :param items: number of items in the page.
+        :param elapsed: duration of the request, in seconds.
+        :param nbytes: payload size, in bytes.
+        """
+        if not items:
+            return
+
+        with self._lock:
+            self._secs_per_item = self._smooth(self._secs_per_item,
+                                               float(elapsed) / items)
+            self._bytes_per_item = self._smooth(self._bytes_per_item,
+                                                float(nbytes) / items)
+
+            if self._secs_per_item > 0:
+                ideal = self.target_secs / self._secs_per_item
+            else:
+                ideal = self.max_size
+
+            if self.max_bytes and self._bytes_per_item > 0:
+                ideal = min(ideal, self.max_bytes / self._bytes_per_item)
+
+            current = self._size
+            ideal = max(current / self.max_growth,
+                        min(ideal, current * self.max_growth))
+
+            self._size = self._clamp(ideal)
+
+        logger.debug('Page size adjusted to %s', self._size)
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return self.smoothing * value + (1 - self.smoothing) * average
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(size, self.max_size)))
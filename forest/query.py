@@ -0,0 +1,100 @@
+# coding: utf-8
+"""Field projection and filters, pushed down to the API as query params.
+"""
+from __future__ import unicode_literals
+
+from . import compat
+
+
+def filter_params(filters):
+    """
+    Translates `filters` into query params, using Tastypie's conventions.
+
+    Filters are given like Django's lookups, e.g. `{'acronym': 'aiss'}` or
+    `{'title__startswith': 'Annali', 'id__in': [1, 2]}`. Sequences are
+    joined with commas and booleans become `true` or `false`.
+
+    :param filters: dict or list of pairs.
+    :returns: list of pairs, sorted by name.
+    """
+    if hasattr(filters, 'items'):
+        filters = filters.items()
+
+    params = []
+    for name, value in filters:
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            value = ','.join(compat.text_type(item) for item in value)
+        params.append((name, value))
+
+    return sorted(params)
+
+
+def merge_params(params, pairs):
+    """
+    Returns a copy of `params` with `pairs` added, preserving whether
+    `params` is a dict or a list of pairs.
+
+    :param params: params to be passed as query string, or `None`.
+    :param pairs: list of `(name, value)` pairs.
+    """
+    if not pairs:
+        return params
+
+    if params is None:
+        params = {}
+
+    if hasattr(params, 'items'):
+        params = dict(params)
+        params.update(pairs)
+        return params
+
+    return list(params) + list(pairs)
+
+
+class Projection(object):
+    """
+    Keeps only `fields` of documents.
+
+    Fields of nested objects are given as dotted paths, e.g.
+    `use_license.disclaimer`. Missing fields are omitted.
+
+    :param fields: iterable of field names.
+    """
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._tree = {}
+        for field in self.fields:
+            node = self._tree
+            parts = field.split('.')
+            for part in parts[:-1]:
+                child = node.setdefault(part, {})
+                if child is None:
+                    # the whole parent was already selected.
+                    break
+                node = child
+            else:
+                node[parts[-1]] = None
+
+    def __call__(self, doc):
+        return _project(doc, self._tree)
+
+
+def _project(doc, tree):
+    if not isinstance(doc, dict):
+        return doc
+
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if subtree is not None:
+            if isinstance(value, list):
+                value = [_project(item, subtree) for item in value]
+            else:
+                value = _project(value, subtree)
+        projected[key] = value
+
+    return projected
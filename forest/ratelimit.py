@@ -0,0 +1,81 @@
+# coding: utf-8
+"""Client-side rate limiting, to stay below the server's throttling.
+"""
+from __future__ import unicode_literals
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    Limits requests to `rate` per second on average, allowing bursts of
+    up to `burst` requests.
+
+    Instances are thread-safe and are meant to be shared by all the
+    connectors talking to the same server. Requests are served in the
+    order they ask for a token, and the time they spend waiting is
+    accounted in `stats()`, so the limiter can be sized.
+
+    :param rate: tokens added to the bucket per second.
+    :param burst: (optional) capacity of the bucket. Defaults to `1`.
+    """
+    def __init__(self, rate, burst=1):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate must be positive and burst at least 1')
+
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+        self.acquired = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def reserve(self, tokens=1):
+        """
+        Takes `tokens` from the bucket, possibly ahead of time, and returns
+        the seconds the caller must wait before using them. Meant for
+        callers that cannot block, e.g. coroutines.
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            # a negative balance stands for tokens reserved by waiting callers.
+            self._tokens -= tokens
+            wait_secs = max(0.0, -self._tokens / self.rate)
+
+            self.acquired += 1
+            if wait_secs:
+                self.throttled += 1
+                self.waited += wait_secs
+
+        return wait_secs
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available. Returns the seconds waited.
+        """
+        wait_secs = self.reserve(tokens)
+        if wait_secs:
+            logger.debug('Rate limited. Waiting %.3fs', wait_secs)
+            time.sleep(wait_secs)
+        return wait_secs
+
+    def stats(self):
+        """
+        Returns a dict with the number of `acquired` tokens, how many of
+        them were `throttled`, and the total and average seconds `waited`.
+        """
+        with self._lock:
+            return {'acquired': self.acquired,
+                    'throttled': self.throttled,
+                    'waited': self.waited,
+                    'avg_wait': self.waited / self.acquired if self.acquired else 0.0}
@@ -0,0 +1,221 @@
+# coding: utf-8
+"""Compact, read-only representation of documents, for harvests that are
+entirely held in memory.
+
+A document becomes a `Record`: a tuple of its values, whose field names are
+stored once per schema instead of once per document. Nested objects become
+records too, lists become tuples and repeated strings are interned.
+"""
+from __future__ import unicode_literals
+
+from . import compat
+
+
+class _Missing(object):
+    """Placeholder of the fields a record does not have.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return str('MISSING')
+
+
+MISSING = _Missing()
+
+
+class Record(tuple):
+    """
+    Read-only document backed by a tuple.
+
+    Records support the read-only mapping interface of dicts, e.g.
+    `record['title']`, `record.get('title')`, `'title' in record` and
+    iteration over field names, plus attribute access for fields whose
+    names are valid identifiers, e.g. `record.title`.
+
+    Subclasses are created by `record_class`, one for each schema.
+    """
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        try:
+            value = tuple.__getitem__(self, self._index[key])
+        except KeyError:
+            raise KeyError(key)
+
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        index = self._index.get(key)
+        return index is not None and tuple.__getitem__(self, index) is not MISSING
+
+    def items(self):
+        return [(field, value) for field, value in
+                zip(self._fields, tuple.__iter__(self)) if value is not MISSING]
+
+    def keys(self):
+        return [field for field, _ in self.items()]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Record(%s)' % ', '.join('%s=%r' % item for item in self.items())
+
+    def __reduce__(self):
+        return (_rebuild, (self._fields, tuple(tuple.__iter__(self))))
+
+    def to_dict(self):
+        """Returns the record as a plain document.
+        """
+        return dict((field, _to_plain(value)) for field, value in self.items())
+
+
+compat.Mapping.register(Record)
+
+
+_classes = {}
+
+
+def record_class(fields):
+    """
+    Returns the `Record` subclass of the schema `fields`, creating it on
+    the first call.
+
+    :param fields: tuple of field names.
+    """
+    cls = _classes.get(fields)
+    if cls is None:
+        cls = type(str('Record'), (Record,),
+                   {'__slots__': (), '_fields': fields,
+                    '_index': dict((field, i) for i, field in enumerate(fields))})
+        cls = _classes.setdefault(fields, cls)
+    return cls
+
+
+def _rebuild(fields, values):
+    return record_class(fields)(values)
+
+
+def _to_plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_to_plain(item) for item in value]
+    return value
+
+
+class Compactor(object):
+    """
+    Converts documents into records.
+
+    The schema of the documents of each nested path is inferred from the
+    first documents, preferably from a whole page with `compact_page`, and
+    is extended when new fields show up.
+
+    Instances are not thread-safe, and are meant to be used for a single
+    endpoint, so that documents share as much as possible.
+
+    :param intern_max_length: (optional) strings up to this length are
+    interned, so that repeated values like statuses, dates or languages
+    are stored once. Defaults to `256`.
+    :param max_interned: (optional) max number of distinct strings
+    interned. Defaults to `100000`.
+    """
+    def __init__(self, intern_max_length=256, max_interned=100000):
+        self.intern_max_length = intern_max_length
+        self.max_interned = max_interned
+        self._schemas = {}
+        self._strings = {}
+
+    def infer(self, docs, path=''):
+        """Extends the schema of `path` with the fields of all `docs`.
+        """
+        fields = list(self._schemas.get(path, ()))
+        known = set(fields)
+        for doc in docs:
+            for key in doc:
+                if key not in known:
+                    known.add(key)
+                    fields.append(key)
+
+        self._schemas[path] = tuple(fields)
+
+    def compact_page(self, docs):
+        """
+        Iterates over the records of `docs`. If `docs` is a list, the
+        schema is first extended with the fields of all of them.
+        """
+        if isinstance(docs, list):
+            self.infer(docs)
+        for doc in docs:
+            yield self.compact(doc)
+
+    def compact(self, doc, path=''):
+        """Returns the record of `doc`.
+        """
+        fields = self._schemas.get(path)
+        if fields is None or not all(key in record_class(fields)._index
+                                     for key in doc):
+            self.infer([doc], path)
+            fields = self._schemas[path]
+
+        return record_class(fields)(
+            [self._value(doc[field], path, field) if field in doc else MISSING
+             for field in fields])
+
+    def _value(self, value, path, field):
+        if isinstance(value, compat.string_types):
+            return self._intern(value)
+        if isinstance(value, dict):
+            return self.compact(value, '%s.%s' % (path, field))
+        if isinstance(value, list):
+            return tuple([self._value(item, path, field) for item in value])
+        return value
+
+    def _intern(self, value):
+        if len(value) > self.intern_max_length:
+            return value
+
+        interned = self._strings.get(value)
+        if interned is not None:
+            return interned
+
+        if len(self._strings) < self.max_interned:
+            self._strings[value] = value
+        return value
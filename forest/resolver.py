@@ -0,0 +1,153 @@
+# coding: utf-8
+"""Dereferencing of related resources, in batches.
+"""
+from __future__ import unicode_literals
+import collections
+import logging
+import threading
+try:
+    from urllib import parse
+except ImportError:  # PY2
+    import urlparse as parse
+
+from . import compat
+
+
+logger = logging.getLogger(__name__)
+
+
+def split_resource_uri(uri):
+    """
+    Splits Tastypie's resource URIs into endpoint and id, e.g.
+    `/api/v1/issues/1420/` into `('issues', '1420')`.
+    """
+    parts = parse.urlparse(uri).path.strip('/').split('/')
+    if len(parts) < 2:
+        raise ValueError('Invalid resource uri: %s' % uri)
+
+    return parts[-2], parts[-1]
+
+
+class Resolver(object):
+    """
+    Resolves Tastypie resource URIs, e.g. `/api/v1/issues/1420/`, into
+    their documents.
+
+    URIs are deduplicated and fetched in batches with
+    `TastyPieConnector.get_many`, one endpoint at a time, and the results
+    are memoized for the lifetime of the resolver, so that each resource is
+    fetched at most once per harvest. Instances are thread-safe.
+
+    :param connector: `connectors.TastyPieConnector` instance.
+    :param batch_size: (optional) max number of ids per request. Defaults
+    to `100`.
+    """
+    def __init__(self, connector, batch_size=100):
+        self.connector = connector
+        self.batch_size = batch_size
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._memo)
+
+    def is_resource_uri(self, value):
+        """
+        Tells if `value` is the URI of a resource of the connector's API,
+        like `/api/v1/issues/1420/`.
+        """
+        if not isinstance(value, compat.string_types):
+            return False
+
+        api_path = parse.urlparse(self.connector.api_uri).path.rstrip('/') + '/'
+        path = parse.urlparse(value).path
+        if not path.startswith(api_path) or not path.endswith('/'):
+            return False
+
+        return len(path[len(api_path):].strip('/').split('/')) == 2
+
+    def resolve(self, uris):
+        """
+        Returns a dict mapping each of `uris` to its document, or to `None`
+        if it does not exist.
+
+        :param uris: iterable of resource URIs.
+        """
+        uris = list(uris)
+        with self._lock:
+            missing = [uri for uri in collections.OrderedDict.fromkeys(uris)
+                       if uri not in self._memo]
+
+        by_endpoint = collections.OrderedDict()
+        for uri in missing:
+            resource_path, resource_id = split_resource_uri(uri)
+            by_endpoint.setdefault(resource_path, []).append((resource_id, uri))
+
+        for resource_path, pairs in by_endpoint.items():
+            logger.debug('Resolving %s resources of %s', len(pairs), resource_path)
+            found = self.connector.get_many(resource_path,
+                                            [resource_id for resource_id, _ in pairs],
+                                            batch_size=self.batch_size)
+            with self._lock:
+                for resource_id, uri in pairs:
+                    self._memo[uri] = found.get(resource_id)
+
+        with self._lock:
+            return dict((uri, self._memo[uri]) for uri in uris)
+
+    def expand(self, docs, fields):
+        """
+        Returns copies of `docs`, with the URIs under `fields` replaced by
+        the documents they refer to.
+
+        The URIs of all `docs` are resolved at once, so that pages of
+        documents are expanded with a handful of requests.
+
+        :param docs: list of documents.
+        :param fields: names of the fields holding a URI or a list of URIs.
+        """
+        uris = []
+        for doc in docs:
+            for field in fields:
+                value = doc.get(field)
+                if isinstance(value, compat.string_types):
+                    uris.append(value)
+                elif isinstance(value, list):
+                    uris.extend(value)
+
+        resolved = self.resolve(uris)
+
+        expanded = []
+        for doc in docs:
+            doc = dict(doc)
+            for field in fields:
+                value = doc.get(field)
+                if isinstance(value, compat.string_types):
+                    doc[field] = resolved[value]
+                elif isinstance(value, list):
+                    doc[field] = [resolved[uri] for uri in value]
+            expanded.append(doc)
+
+        return expanded
+
+    def iter_expanded(self, docs, fields, window=50):
+        """
+        Expands documents as they are iterated over, `window` documents
+        at a time. See `expand`.
+
+        :param docs: iterable of documents, e.g. from `iter_docs`.
+        :param fields: names of the fields holding a URI or a list of URIs.
+        :param window: (optional) number of documents whose URIs are
+        resolved together. Usually the page size. Defaults to `50`.
+        """
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= window:
+                for expanded in self.expand(batch, fields):
+                    yield expanded
+                batch = []
+
+        if batch:
+            for expanded in self.expand(batch, fields):
+                yield expanded
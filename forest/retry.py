@@ -0,0 +1,235 @@
+# coding: utf-8
+"""Policies that decide when and how failed requests are retried.
+"""
+from __future__ import unicode_literals
+import logging
+import random
+import threading
+import time
+try:
+    from urllib import parse
+except ImportError:  # PY2
+    import urlparse as parse
+
+from . import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+#: errors that are likely to go away by themselves.
+RETRYABLE_ERRORS = (exceptions.ConnectionError,
+                    exceptions.Timeout,
+                    exceptions.TooManyRequests,
+                    exceptions.BadGateway,
+                    exceptions.ServiceUnavailable)
+
+
+class RetryBudget(object):
+    """
+    Caps the retries to a fraction of the requests, so that an outage
+    does not multiply the load on the server.
+
+    Each request deposits `ratio` tokens, and each retry withdraws one.
+    The budget is thread-safe and is meant to be shared by all the
+    connectors talking to the same server.
+
+    :param ratio: (optional) retries allowed per request. Defaults to `0.2`.
+    :param min_retries: (optional) retries allowed regardless of the
+    number of requests, e.g. at start up. Defaults to `10`.
+    """
+    def __init__(self, ratio=0.2, min_retries=10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._max_tokens = max(min_retries, 1) + ratio * 100
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self._max_tokens)
+
+    def withdraw(self):
+        """Returns `True` if there is budget for one more retry.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is retried, and how long to wait
+    before doing so.
+
+    The default backoff is linear, i.e. `backoff_factor` * `attempt`. With
+    `exponential`, it is `backoff_factor` * 2 ** `attempt`, capped at
+    `max_backoff`. With `jitter`, a random wait between zero and the
+    computed backoff is used instead, so that many clients recovering from
+    the same failure do not retry in lockstep.
+
+    :param max_retries: (optional) max retries of a request. Defaults to `5`.
+    :param backoff_factor: (optional) seconds used to compute the backoff.
+    Defaults to `0`.
+    :param exponential: (optional) if the backoff grows exponentially.
+    Defaults to `False`.
+    :param jitter: (optional) if the backoff must be randomized. Defaults
+    to `False`.
+    :param max_backoff: (optional) max seconds to wait before a retry,
+    including those asked by the server. Defaults to `120`.
+    :param respect_retry_after: (optional) if the `Retry-After` header
+    must be honored, when longer than the backoff. Defaults to `True`.
+    :param budget: (optional) `RetryBudget` instance.
+    :param retryable: (optional) tuple of `exceptions.APIError` subclasses
+    that are retried. Defaults to `RETRYABLE_ERRORS`.
+    """
+    def __init__(self, max_retries=5, backoff_factor=0, exponential=False,
+                 jitter=False, max_backoff=120, respect_retry_after=True,
+                 budget=None, retryable=RETRYABLE_ERRORS):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.exponential = exponential
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.respect_retry_after = respect_retry_after
+        self.budget = budget
+        self.retryable = retryable
+
+    def on_request(self):
+        """Must be called once per request, not counting its retries.
+        """
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def should_retry(self, attempt, error):
+        """
+        Returns `True` if the request that failed with `error` must be
+        retried.
+
+        :param attempt: number of retries made so far.
+        :param error: `exceptions.APIError` instance.
+        """
+        if not isinstance(error, self.retryable):
+            return False
+        if attempt >= self.max_retries:
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            logger.warning('Retry budget exhausted. Giving up on: %s', error)
+            return False
+        return True
+
+    def backoff(self, attempt, error=None):
+        """
+        Returns the seconds to wait before the next retry.
+
+        :param attempt: number of retries made so far.
+        :param error: (optional) the `exceptions.APIError` instance.
+        """
+        if self.exponential:
+            wait_secs = self.backoff_factor * (2 ** attempt)
+        else:
+            wait_secs = self.backoff_factor * attempt
+        wait_secs = min(wait_secs, self.max_backoff)
+
+        if self.jitter:
+            wait_secs = random.uniform(0, wait_secs)
+
+        retry_after = getattr(error, 'retry_after', None)
+        if self.respect_retry_after and retry_after is not None:
+            wait_secs = max(wait_secs, min(retry_after, self.max_backoff))
+
+        return wait_secs
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast the requests to hosts that are failing repeatedly.
+
+    After `failure_threshold` consecutive failures, the circuit of the host
+    opens, and requests raise `exceptions.CircuitOpen` without being
+    dispatched. Once `reset_timeout` seconds have passed, a single trial
+    request is let through: its success closes the circuit, and its failure
+    opens it again for another period.
+
+    The breaker is thread-safe and is meant to be shared by all the
+    connectors of a process.
+
+    :param failure_threshold: (optional) consecutive failures that open
+    the circuit. Defaults to `5`.
+    :param reset_timeout: (optional) seconds the circuit stays open.
+    Defaults to `30`.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._trying = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        return parse.urlsplit(url).netloc
+
+    def state(self, url):
+        """Returns `closed`, `open` or `half-open`.
+        """
+        host = self.host(url)
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return 'closed'
+            if time.time() - opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+    def before_request(self, url):
+        """
+        Raises `exceptions.CircuitOpen` if requests to the host of `url`
+        must not be dispatched.
+
+        :returns: `True` if the request is the trial of a half-open circuit.
+        """
+        host = self.host(url)
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return False
+
+            if (time.time() - opened_at >= self.reset_timeout and
+                    host not in self._trying):
+                self._trying.add(host)
+                return True
+
+        raise exceptions.CircuitOpen('Too many failures on %s' % host)
+
+    def release(self, url):
+        """
+        Lets another request be the trial of the half-open circuit of the
+        host of `url`, when the trial ended without telling anything about
+        the host, e.g. because it was cancelled.
+        """
+        with self._lock:
+            self._trying.discard(self.host(url))
+
+    def record_success(self, url):
+        host = self.host(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trying.discard(host)
+
+    def record_failure(self, url):
+        host = self.host(url)
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+
+            if host in self._trying or failures >= self.failure_threshold:
+                if host not in self._opened_at or host in self._trying:
+                    logger.warning('Opening the circuit of %s for %ss, '
+                                   'after %s consecutive failures',
+                                   host, self.reset_timeout, failures)
+                self._opened_at[host] = time.time()
+                self._trying.discard(host)
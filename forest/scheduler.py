@@ -0,0 +1,283 @@
+# coding: utf-8
+"""Concurrent harvests of many endpoints, sharing a budget of requests.
+"""
+from __future__ import unicode_literals
+import collections
+from concurrent import futures
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job(object):
+    """
+    Harvest of all documents of an endpoint, run by a `Scheduler`.
+
+    Its progress is updated as pages are harvested.
+
+    :param connector: `core.Connector` instance. Connectors of jobs to the
+    same host should share the same `transport`, so that they share the
+    connection pool.
+    :param resource_path: the endpoint, e.g. `journals`.
+    :param params: (optional) params to be passed as query string.
+    :param fields: (optional) names of the fields to be retrieved. See
+    `core.Connector.iter_docs`.
+    :param filters: (optional) dict of filters. See `query.filter_params`.
+    :param name: (optional) name of the job in logs. Defaults to
+    `resource_path`.
+    """
+    def __init__(self, connector, resource_path, params=None, fields=None,
+                 filters=None, name=None):
+        self.connector = connector
+        self.resource_path = resource_path
+        self.params = params
+        self.fields = fields
+        self.filters = filters
+        self.name = name or resource_path
+
+        #: number of documents of the endpoint, once the first page is
+        #: fetched, if the API tells it.
+        self.total_count = None
+        self.pages = 0
+        self.docs = 0
+        self.done = False
+        self.error = None
+
+    def progress(self):
+        """
+        Returns the fraction of documents harvested, or `None` if
+        `total_count` is not known.
+        """
+        if self.done:
+            return 1.0
+        if not self.total_count:
+            return None
+        return min(1.0, self.docs / float(self.total_count))
+
+    def __repr__(self):
+        return '<Job %s %s/%s>' % (self.name, self.docs, self.total_count)
+
+
+class _JobRun(object):
+    """Scheduling state of a job: the pages to be fetched, the ones being
+    fetched and the ones fetched but not yet yielded.
+    """
+    def __init__(self, job, max_pending):
+        self.job = job
+        self.max_pending = max_pending
+
+        conn = job.connector
+        params = conn.query_params(job.params, job.fields, job.filters)
+        self.project = conn.projection(job.fields)
+        self.requests = collections.deque(
+            [(job.resource_path, conn.page_params(params))])
+        self.offsets = None
+        self.offsets_path = None
+        self.follow = not hasattr(conn, '__page_offsets__')
+
+        self.submitted = 0
+        self.yielded = 0
+        self.inflight = 0
+        self.fetched = {}
+
+    def can_submit(self):
+        return (self.job.error is None and
+                self.inflight + len(self.fetched) < self.max_pending)
+
+    def next_request(self):
+        if self.requests:
+            return self.requests.popleft()
+
+        if self.offsets:
+            res_path, res_params = self.offsets_path
+            offset = self.offsets.popleft()
+            return res_path, dict(res_params, offset=[str(offset)])
+
+        return None
+
+    def is_finished(self):
+        return (self.job.error is not None or
+                (not self.inflight and not self.fetched and
+                 not self.requests and not self.offsets))
+
+    def page_fetched(self, seq, data):
+        """
+        Stores the page `seq`, and finds out the pages that follow it.
+
+        Tastypie connectors compute the offsets of all pages from the first
+        one, so that many of them are fetched concurrently. Others, and
+        Tastypie connectors with keyset pagination, follow the resumption
+        path of each page, one page at a time.
+        """
+        conn = self.job.connector
+        self.fetched[seq] = data
+
+        if seq == 0:
+            meta = data.get('meta') if isinstance(data, dict) else None
+            if isinstance(meta, dict):
+                self.job.total_count = meta.get('total_count')
+
+        if seq > 0 and not self.follow:
+            return
+
+        try:
+            cursor = conn.__resumption_resource_path__(data)
+        except ValueError:
+            return
+
+        if not self.follow:
+            try:
+                self.offsets = collections.deque(conn.__page_offsets__(data))
+                self.offsets_path = cursor
+                return
+            except ValueError:
+                # e.g. keyset pagination.
+                self.follow = True
+
+        self.requests.append(cursor)
+
+    def iter_ready(self):
+        """Pops the fetched pages that are next in order.
+        """
+        while self.yielded in self.fetched:
+            data = self.fetched.pop(self.yielded)
+            self.yielded += 1
+            yield data
+
+
+class Scheduler(object):
+    """
+    Harvests many endpoints concurrently.
+
+    Pages of all jobs are fetched by a pool of `max_concurrency` threads,
+    which caps the number of requests in flight across all jobs. Free
+    slots are given to jobs in round-robin, so that small endpoints are
+    harvested alongside large ones instead of waiting for them to finish.
+    Tastypie jobs have many pages fetched concurrently once their first
+    page is known, while other connectors follow the resumption path of
+    each page, one at a time.
+
+        >>> transport = httpbroker.PooledTransport(pool_maxsize=8)
+        >>> conn = TastyPieConnector(api_uri, transport=transport)
+        >>> scheduler = Scheduler([Job(conn, 'journals'),
+        ...                        Job(conn, 'articles')], max_concurrency=8)
+        >>> for job, doc in scheduler.iter_docs():
+        ...     sinks[job.name].write(doc)
+
+    If a job fails, the others go on, and the error of the first one that
+    failed is raised once they are over.
+
+    :param jobs: list of `Job` instances.
+    :param max_concurrency: (optional) max number of requests in flight.
+    Defaults to `4`.
+    :param max_pending: (optional) max number of pages per job being
+    fetched or waiting to be yielded, which bounds memory usage. Defaults
+    to `2 * max_concurrency`.
+    :param on_progress: (optional) callable that receives each `Job` after
+    each of its pages is yielded.
+    """
+    def __init__(self, jobs, max_concurrency=4, max_pending=None,
+                 on_progress=None):
+        self.jobs = list(jobs)
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending or max_concurrency * 2
+        self.on_progress = on_progress
+
+    def iter_docs(self):
+        """
+        Runs all jobs, iterating over `(job, doc)` pairs. Documents of each
+        job are yielded in order.
+        """
+        runs = collections.deque(_JobRun(job, self.max_pending)
+                                 for job in self.jobs)
+        active = list(runs)
+        inflight = {}
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        def fill():
+            # round-robin over the runs that are able to submit a page.
+            idle = 0
+            while len(inflight) < self.max_concurrency and idle < len(runs):
+                run = runs[0]
+                runs.rotate(-1)
+                request = run.next_request() if run.can_submit() else None
+                if request is None:
+                    idle += 1
+                    continue
+
+                idle = 0
+                res_path, res_params = request
+                future = executor.submit(run.job.connector.fetch_data,
+                                         res_path, res_params)
+                inflight[future] = (run, run.submitted)
+                run.submitted += 1
+                run.inflight += 1
+
+        try:
+            fill()
+            while inflight:
+                completed, _ = futures.wait(
+                    list(inflight), return_when=futures.FIRST_COMPLETED)
+
+                for future in completed:
+                    run, seq = inflight.pop(future)
+                    run.inflight -= 1
+                    if run.job.error is not None:
+                        continue
+                    try:
+                        run.page_fetched(seq, future.result())
+                    except Exception as e:
+                        logger.error('Job %s failed: %s', run.job.name, e)
+                        run.job.error = e
+                        run.fetched.clear()
+
+                for run in active:
+                    for data in run.iter_ready():
+                        job = run.job
+                        for doc in job.connector._page_docs(data, run.project):
+                            job.docs += 1
+                            yield job, doc
+                        job.pages += 1
+                        if self.on_progress is not None:
+                            self.on_progress(job)
+
+                for run in list(active):
+                    if run.is_finished():
+                        active.remove(run)
+                        runs.remove(run)
+                        if run.job.error is None:
+                            run.job.done = True
+                            logger.info('Job %s harvested %s documents',
+                                        run.job.name, run.job.docs)
+
+                fill()
+        finally:
+            for future in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        for job in self.jobs:
+            if job.error is not None:
+                raise job.error
+
+    def run(self, consumer=None):
+        """
+        Runs all jobs, passing each `(job, doc)` pair to `consumer`, if
+        given.
+
+        :returns: the list of jobs.
+        """
+        for job, doc in self.iter_docs():
+            if consumer is not None:
+                consumer(job, doc)
+        return self.jobs
+
+    def progress(self):
+        """Returns a dict of the progress of each job, by name.
+        """
+        return dict((job.name, {'docs': job.docs, 'pages': job.pages,
+                                'total_count': job.total_count,
+                                'progress': job.progress(),
+                                'done': job.done})
+                    for job in self.jobs)
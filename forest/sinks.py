@@ -0,0 +1,212 @@
+# coding: utf-8
+"""Sinks that write documents to disk as they are harvested.
+"""
+from __future__ import unicode_literals
+import gzip
+import logging
+import os
+import tempfile
+import threading
+
+from . import compat, jsoncodecs, records
+from .lazy import LazyDocument
+
+
+logger = logging.getLogger(__name__)
+
+
+class JsonLinesSink(object):
+    """
+    Writes documents to `path` as JSON lines, optionally compressed with
+    gzip.
+
+    Documents are encoded by the caller's thread and buffered into batches
+    of about `buffer_size` bytes, that a writer thread compresses and
+    writes. At most `max_pending` batches wait for the writer, and `write`
+    blocks when they do, so that the harvest never runs far ahead of the
+    disk.
+
+    Documents are written to a temporary file that only replaces `path`
+    when the sink is closed, so readers never see a partial export. If
+    the sink is used as a context manager and an exception is raised, the
+    temporary file is discarded.
+
+    Records are written as plain documents, and lazy documents as their
+    raw documents, with URIs left unresolved.
+
+    :param path: destination file path.
+    :param compress: (optional) compress with gzip. Defaults to `True` if
+    `path` ends with `.gz`.
+    :param codec: (optional) JSON codec from `jsoncodecs`. Defaults to
+    the fastest available.
+    :param buffer_size: (optional) bytes per batch. Defaults to 1MiB.
+    :param max_pending: (optional) max number of batches waiting to be
+    written. Defaults to `4`.
+    :param compresslevel: (optional) gzip compression level. Defaults to `6`.
+    """
+    def __init__(self, path, compress=None, codec=None, buffer_size=1 << 20,
+                 max_pending=4, compresslevel=6):
+        self.path = path
+        self.compress = path.endswith('.gz') if compress is None else compress
+        self.codec = codec or jsoncodecs.default_codec
+        self.buffer_size = buffer_size
+        self.max_pending = max_pending
+        self.compresslevel = compresslevel
+        self.count = 0
+
+        self._tmp_path = None
+        self._thread = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        """Creates the temporary file and starts the writer thread.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        self._raw = os.fdopen(fd, 'wb')
+        if self.compress:
+            self._file = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw,
+                                       compresslevel=self.compresslevel)
+        else:
+            self._file = self._raw
+
+        self._batch = []
+        self._batch_bytes = 0
+        self._error = None
+        self._queue = compat.queue.Queue(maxsize=self.max_pending)
+        self._thread = threading.Thread(target=self._drain)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, doc):
+        """Encodes and buffers `doc`.
+        """
+        if isinstance(doc, records.Record):
+            doc = doc.to_dict()
+        elif isinstance(doc, LazyDocument):
+            doc = doc.raw
+
+        line = self.codec.dumps(doc)
+        if isinstance(line, compat.text_type):
+            line = line.encode('utf-8')
+
+        self._batch.append(line)
+        self._batch.append(b'\n')
+        self._batch_bytes += len(line) + 1
+        self.count += 1
+
+        if self._batch_bytes >= self.buffer_size:
+            self._put_batch()
+
+    def consume(self, docs):
+        """
+        Writes all `docs`, e.g. from `iter_docs`.
+
+        :returns: the number of documents written by the sink so far.
+        """
+        for doc in docs:
+            self.write(doc)
+        return self.count
+
+    def close(self):
+        """
+        Writes the remaining documents and replaces `path` with the
+        temporary file.
+
+        :returns: the number of documents written.
+        """
+        try:
+            self._put_batch()
+        except Exception:
+            # e.g. the writer failed after the last full batch.
+            self.abort()
+            raise
+
+        self._stop()
+        if self._error is not None:
+            self._discard()
+            raise self._error
+
+        try:
+            if self._file is not self._raw:
+                self._file.close()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+            self._raw.close()
+            compat.replace(self._tmp_path, self.path)
+        except Exception:
+            self._discard()
+            raise
+
+        logger.info('Wrote %s documents to %s', self.count, self.path)
+        return self.count
+
+    def abort(self):
+        """Discards the temporary file, leaving `path` untouched.
+        """
+        self._batch = []
+        self._stop()
+        self._discard()
+
+    def _put_batch(self):
+        if self._error is not None:
+            raise self._error
+
+        if self._batch:
+            self._queue.put(b''.join(self._batch))
+            self._batch = []
+            self._batch_bytes = 0
+
+    def _stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _discard(self):
+        for f in (self._file, self._raw):
+            try:
+                f.close()
+            except Exception:
+                pass
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def _drain(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self._error is not None:
+                # keeps draining, so the producer is never blocked.
+                continue
+            try:
+                self._file.write(chunk)
+            except Exception as e:
+                logger.error('Could not write to %s: %s', self._tmp_path, e)
+                self._error = e
+
+
+def export(docs, path, **kwargs):
+    """
+    Writes `docs` to `path` as JSON lines. See `JsonLinesSink` for the
+    keyword arguments.
+
+        >>> export(conn.iter_docs('journals'), 'journals.jsonl.gz')
+
+    :returns: the number of documents written.
+    """
+    with JsonLinesSink(path, **kwargs) as sink:
+        sink.consume(docs)
+    return sink.count
@@ -0,0 +1,183 @@
+# coding: utf-8
+"""Incremental synchronization of endpoints, based on high-water marks.
+"""
+from __future__ import unicode_literals
+import json
+import logging
+import threading
+
+from . import httpbroker
+from .checkpoint import atomic_write
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatermarkStore(object):
+    """
+    Stores the high-water mark of many endpoints in a single JSON file.
+
+    Every update rewrites the file atomically. Instances are thread-safe,
+    but the file must not be shared by concurrent processes.
+
+    :param path: the JSON file path.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError):
+            return {}
+
+    def get(self, name):
+        """Returns the high-water mark stored under `name`, or `None`.
+        """
+        with self._lock:
+            return self._load().get(name)
+
+    def set(self, name, value):
+        """Stores `value` as the high-water mark under `name`.
+        """
+        with self._lock:
+            marks = self._load()
+            marks[name] = value
+            atomic_write(self.path, json.dumps(marks, indent=2,
+                                               sort_keys=True).encode('utf-8'))
+
+
+class DeltaSync(object):
+    """
+    Iterates over the documents changed since the previous run.
+
+    The highest value of `field` seen on each endpoint is stored as its
+    high-water mark, and is used on the next run to filter documents
+    with the `<field>__<lookup>` param, as understood by Tastypie.
+
+    Pages are fetched by keyset instead of by offset. They are ordered by
+    `field` and `tiebreaker`, and each one starts past the last value of
+    `field` seen, once the documents tying on that value are fetched by
+    `tiebreaker`. A document changed during a run moves past the pages
+    already fetched, and is fetched again, instead of shifting the pages
+    still to be fetched, which would skip another document. `field` and
+    `tiebreaker` must be listed in the resource's `ordering` and
+    `filtering` options, and `field` should be indexed.
+
+    :param connector: `connectors.TastyPieConnector` instance.
+    :param store: `FileWatermarkStore` instance, or any object with the
+    same `get` and `set` methods.
+    :param field: (optional) document field that tells when it was last
+    changed. Its values must sort chronologically, like ISO 8601
+    timestamps. Defaults to `updated`.
+    :param lookup: (optional) filter lookup of the watermark. Defaults to
+    `gt`.
+    :param tiebreaker: (optional) unique document field that orders the
+    documents sharing the same value of `field`. Defaults to `id`.
+    """
+    def __init__(self, connector, store, field='updated', lookup='gt',
+                 tiebreaker='id'):
+        self.connector = connector
+        self.store = store
+        self.field = field
+        self.lookup = lookup
+        self.tiebreaker = tiebreaker
+
+    @property
+    def filter_param(self):
+        return '%s__%s' % (self.field, self.lookup)
+
+    def watermark_name(self, resource_path, params=None):
+        """Identifies an endpoint and its params in the store.
+        """
+        params = httpbroker.prepare_params(params) or []
+        return json.dumps([resource_path, params])
+
+    def iter_changes(self, resource_path=None, params=None, fields=None,
+                     filters=None):
+        """
+        Iterates over the documents changed since the previous run.
+
+        Documents changed during the run may be yielded twice. The
+        high-water mark is only updated when the iteration is over, so
+        that interrupted runs are entirely repeated on the next time.
+
+        :param resource_path: (optional) the endpoint and resource id.
+        :param params: (optional) params to be passed as query string.
+        :param fields: (optional) names of the fields to be retrieved. See
+        `core.Connector.iter_docs`. `field` and `tiebreaker` are always
+        retrieved.
+        :param filters: (optional) dict of filters. See `query.filter_params`.
+        """
+        name = self.watermark_name(resource_path, params)
+        if fields:
+            fields = list(fields) + [key for key in (self.field, self.tiebreaker)
+                                     if key not in fields]
+        watermark = self.store.get(name)
+
+        conn = self.connector
+        params = conn.query_params(params, fields, filters)
+        if hasattr(params, 'items'):
+            params = list(params.items())
+        params = [(key, value) for key, value in params or []
+                  if key != 'order_by']
+        project = conn.projection(fields)
+
+        if watermark is not None:
+            logger.info('Fetching %s changed since %s', resource_path, watermark)
+            start = [(self.filter_param, watermark)]
+        else:
+            start = []
+
+        highest = watermark
+        while True:
+            # a single param, as `httpbroker` sorts params.
+            docs, exhausted = self._fetch(resource_path, params, start + [
+                ('order_by', [self.field, self.tiebreaker])])
+            highest = self._highest(highest, docs)
+            for doc in docs:
+                yield project(doc) if project is not None else doc
+            if exhausted:
+                break
+
+            value = docs[-1][self.field]
+            last = docs[-1][self.tiebreaker]
+            while True:
+                docs, exhausted = self._fetch(resource_path, params, [
+                    (self.field, value), ('%s__gt' % self.tiebreaker, last),
+                    ('order_by', self.tiebreaker)])
+                highest = self._highest(highest, docs)
+                for doc in docs:
+                    yield project(doc) if project is not None else doc
+                if exhausted:
+                    break
+                last = docs[-1][self.tiebreaker]
+
+            start = [('%s__gt' % self.field, value)]
+
+        if highest != watermark:
+            self.store.set(name, highest)
+
+    def _fetch(self, resource_path, params, pairs):
+        """Fetches a page, telling if it is the last one.
+        """
+        conn = self.connector
+        data = conn.fetch_page(resource_path, conn.page_params(params + pairs))
+        docs = conn.__get_docs__(data)
+        if not isinstance(docs, list):
+            raise TypeError('Keyset pagination requires whole pages')
+
+        try:
+            conn.__resumption_resource_path__(data)
+        except ValueError:
+            return docs, True
+        return docs, not docs
+
+    def _highest(self, highest, docs):
+        for doc in docs:
+            value = doc.get(self.field)
+            if value is not None and (highest is None or value > highest):
+                highest = value
+        return highest
@@ -0,0 +1,301 @@
+# coding: utf-8
+"""HTTP transports `httpbroker` dispatches requests through.
+
+A transport exposes `get`, `post` and `patch`, with the same signature as
+their `requests` counterparts, and returns responses with the subset of
+`requests.Response` interface `httpbroker` relies on: `status_code`,
+case-insensitive `headers`, `content`, `iter_content` and `close`.
+Exceptions of the underlying library are raised as they are, and
+translated by `httpbroker.translate_exceptions`.
+
+The default transport is `httpbroker.PooledTransport`, built on `requests`.
+`Urllib3Transport` talks to `urllib3`'s connection pools directly, without
+the per-request overhead of `requests` sessions, and `FakeTransport`
+serves responses from a function, without any network.
+"""
+from __future__ import unicode_literals
+import collections
+import logging
+import threading
+try:
+    from urllib.parse import urlencode
+except ImportError:  # PY2
+    from urllib import urlencode
+
+from requests.structures import CaseInsensitiveDict
+import urllib3
+
+from . import compat, jsoncodecs
+
+
+__all__ = ['Transport', 'Response', 'Urllib3Transport', 'FakeTransport',
+           'FakeRequest']
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_REDIRECTS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class Transport(object):
+    """
+    Base class of transports. Subclasses implement `request`.
+    """
+    def request(self, method, url, params=None, data=None, headers=None,
+                auth=None, verify=True, stream=False):
+        """
+        Dispatches an HTTP request.
+
+        :param method: e.g. `GET`.
+        :param url: the full URL.
+        :param params: (optional) list of `(name, value)` pairs or dict,
+        whose values may be sequences, as accepted by `requests`.
+        :param data: (optional) request body, as bytes or text.
+        :param headers: (optional) dict of headers.
+        :param auth: (optional) `forest.auth.AuthBase` instance.
+        :param verify: (optional) if certificates must be checked on https
+        connections. Defaults to `True`.
+        :param stream: (optional) if the body must be read on demand, with
+        `iter_content`, instead of being read at once.
+        """
+        raise NotImplementedError()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def prewarm(self, url, connections=1, check_ca=False, auth=None,
+                user_agent=None):
+        """
+        Opens `connections` keep-alive connections to the host of `url`,
+        concurrently, with `HEAD` requests sent with `auth` and `user_agent`.
+        Failures are logged and otherwise ignored.
+        """
+        optionals = {}
+        if auth:
+            optionals['auth'] = auth
+        if user_agent:
+            optionals['headers'] = {'User-Agent': user_agent}
+        if url.startswith('https'):
+            optionals['verify'] = check_ca
+
+        def warm():
+            try:
+                self.request('HEAD', url, **optionals).close()
+            except Exception as e:
+                logger.warning('Unable to prewarm connection to %s: %s', url, e)
+
+        threads = [threading.Thread(target=warm) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        """Releases the resources held by the transport.
+        """
+
+
+class Response(object):
+    """
+    HTTP response, with the subset of `requests.Response` interface
+    `httpbroker` relies on.
+
+    :param status_code: the HTTP status code.
+    :param headers: (optional) dict of headers.
+    :param content: (optional) the whole body, as bytes.
+    :param raw: (optional) `urllib3.HTTPResponse` whose body is yet to be
+    read, for streamed responses.
+    """
+    def __init__(self, status_code, headers=None, content=None, raw=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self._content = content
+        self.raw = raw
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self.iter_content()) if self.raw else b''
+        return self._content
+
+    def iter_content(self, chunk_size=64 * 1024):
+        if self._content is not None or self.raw is None:
+            content = self.content
+            for i in range(0, len(content), chunk_size):
+                yield content[i:i + chunk_size]
+            return
+
+        for chunk in self.raw.stream(chunk_size, decode_content=True):
+            yield chunk
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.release_conn()
+
+    def json(self):
+        return jsoncodecs.default_codec.loads(self.content)
+
+
+class _AuthRequest(object):
+    """Minimal request object `forest.auth.AuthBase` instances can act upon.
+    """
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def _encode_params(params):
+    """Encodes `params` the way `requests` does, repeating the names of
+    sequence values.
+    """
+    if hasattr(params, 'items'):
+        params = params.items()
+
+    pairs = []
+    for key, value in params:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is None:
+                continue
+            if not isinstance(item, compat.string_types):
+                item = compat.text_type(item)
+            pairs.append((key.encode('utf-8'), item.encode('utf-8')))
+
+    return urlencode(pairs)
+
+
+def _prepare(url, params, headers, auth):
+    if params:
+        query = _encode_params(params)
+        if query:
+            url = '%s%s%s' % (url, '&' if '?' in url else '?', query)
+
+    headers = dict(headers or {})
+    if auth is not None:
+        auth(_AuthRequest(headers))
+
+    return url, headers
+
+
+class Urllib3Transport(Transport):
+    """
+    Thread-safe transport that dispatches requests straight to `urllib3`'s
+    connection pools, skipping the sessions, hooks and adapters `requests`
+    goes through for every request.
+
+    Retries are left to the connectors. Redirects are followed.
+
+    :param pool_connections: (optional) number of per-host pools to keep.
+    :param pool_maxsize: (optional) max number of idle connections kept
+    alive per host. Defaults to `10`.
+    :param pool_block: (optional) if requests should wait for a free
+    connection when the pool is exhausted, instead of opening a throwaway one.
+    :param timeout: (optional) seconds to wait for the server, or a
+    `urllib3.Timeout` instance. Defaults to no timeout, like `requests`.
+    """
+    def __init__(self, pool_connections=DEFAULT_POOL_MAXSIZE,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 timeout=None):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        # certificates are checked per pool, so unverified https requests
+        # go through pools of their own.
+        self._managers = dict(
+            (verify, urllib3.PoolManager(
+                num_pools=pool_connections, maxsize=pool_maxsize,
+                block=pool_block,
+                cert_reqs='CERT_REQUIRED' if verify else 'CERT_NONE'))
+            for verify in (True, False))
+        self._retries = urllib3.Retry(total=None, connect=0, read=0, status=0,
+                                      redirect=DEFAULT_MAX_REDIRECTS,
+                                      raise_on_status=False)
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                auth=None, verify=True, stream=False):
+        url, headers = _prepare(url, params, headers, auth)
+        if isinstance(data, compat.text_type):
+            data = data.encode('utf-8')
+
+        optionals = {}
+        if self.timeout is not None:
+            optionals['timeout'] = self.timeout
+
+        manager = self._managers[bool(verify) or not url.startswith('https')]
+        raw = manager.urlopen(method, url, body=data, headers=headers,
+                              retries=self._retries, redirect=True,
+                              preload_content=not stream,
+                              decode_content=True, **optionals)
+
+        if stream:
+            return Response(raw.status, raw.headers, raw=raw)
+
+        return Response(raw.status, raw.headers, content=raw.data)
+
+    def close(self):
+        """Closes all pooled connections.
+        """
+        for manager in self._managers.values():
+            manager.clear()
+
+
+FakeRequest = collections.namedtuple(
+    'FakeRequest', ['method', 'url', 'params', 'headers', 'data'])
+
+
+class FakeTransport(Transport):
+    """
+    In-process transport for tests and benchmarks, whose responses are
+    produced by `handler`.
+
+    `handler` receives a `FakeRequest`, with the URL without the query
+    string, the params as a list of pairs, and the headers after `auth`
+    is applied. It returns a `Response`, or a `(status_code, body)` or
+    `(status_code, body, headers)` tuple, where `body` is bytes, text or
+    a JSON serializable object. It may also raise exceptions, e.g.
+    `requests.exceptions.ConnectionError`, to emulate network failures.
+
+    All requests are kept in `requests`, in order.
+
+        >>> transport = FakeTransport(lambda request: (200, {'objects': []}))
+
+    :param handler: callable that produces the response of each request.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                auth=None, verify=True, stream=False):
+        headers = dict(headers or {})
+        if auth is not None:
+            auth(_AuthRequest(headers))
+
+        if params is None:
+            params = []
+        elif hasattr(params, 'items'):
+            params = sorted(params.items())
+
+        request = FakeRequest(method, url, list(params), headers, data)
+        with self._lock:
+            self.requests.append(request)
+
+        response = self.handler(request)
+        if isinstance(response, Response):
+            return response
+
+        status_code, body = response[:2]
+        headers = response[2] if len(response) > 2 else {}
+        if isinstance(body, compat.text_type):
+            body = body.encode('utf-8')
+        elif not isinstance(body, bytes):
+            body = jsoncodecs.default_codec.dumps(body)
+            if isinstance(body, compat.text_type):
+                body = body.encode('utf-8')
+
+        return Response(status_code, headers, content=body)
@@ -10,6 +10,8 @@ if PY2:
 
 
 install_requires = ['requests']
+if PY2:
+    install_requires.append('futures')
 
 
 setup(
@@ -31,6 +33,7 @@ setup(
         "Programming Language :: Python :: 3.4",
     ],
     install_requires=install_requires,
+    extras_require={'aio': ['aiohttp']},
     tests_require=tests_require,
     test_suite='tests',
 )
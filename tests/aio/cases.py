@@ -0,0 +1,276 @@
+"""Tests of `forest.aio`, collected by `tests/test_aio.py` on Python 3.7+.
+
+This directory has no `__init__.py`, so that test loaders scanning the
+`tests` package on older Pythons never compile it.
+"""
+import asyncio
+import json
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from forest import aio, exceptions, retry
+from ..test_core import sample_one
+from ..test_connectors import make_pages
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def collect(agen):
+    return [item async for item in agen]
+
+
+class FakeAsyncTransport(object):
+    """Serves the responses returned by `handler(url, params)`, that may
+    also raise exceptions.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            body = self.handler(url, dict(kwargs.get('params') or []))
+        finally:
+            self.in_flight -= 1
+
+        return aio.Response(200, {}, json.dumps(body).encode('utf-8'))
+
+    async def close(self):
+        pass
+
+
+def tastypie_handler(total_count, limit):
+    fetch = make_pages(total_count, limit)
+    return lambda url, params: fetch(params=params)
+
+
+class GetFunctionTests(unittest.TestCase):
+
+    def test_user_agent_and_params(self):
+        transport = FakeAsyncTransport(lambda url, params: sample_one)
+
+        result = run(aio.get('http://manager.scielo.org/api/v1/journals/70/',
+                             params={'b': 1, 'a': 2},
+                             user_agent='scielo.forest',
+                             transport=transport))
+
+        self.assertEqual(result, sample_one)
+        self.assertEqual(transport.calls,
+                         [('http://manager.scielo.org/api/v1/journals/70/',
+                           {'headers': {'User-Agent': 'scielo.forest'},
+                            'params': [('a', 2), ('b', 1)]})])
+
+    def test_http_status_is_checked(self):
+        class Transport(object):
+            async def get(self, url, **kwargs):
+                return aio.Response(404, {}, b'')
+
+        self.assertRaises(exceptions.NotFound,
+                          lambda: run(aio.get('http://foo.org/', transport=Transport())))
+
+
+    def test_default_transport_is_closed(self):
+        transport = FakeAsyncTransport(lambda url, params: sample_one)
+        closed = []
+
+        async def close():
+            closed.append(True)
+        transport.close = close
+
+        with mock.patch.object(aio, 'AiohttpTransport', return_value=transport):
+            result = run(aio.get('http://manager.scielo.org/api/v1/journals/70/'))
+
+        self.assertEqual(result, sample_one)
+        self.assertEqual(len(transport.calls), 1)
+        self.assertEqual(closed, [True])
+
+
+class AsyncConnectorTests(unittest.TestCase):
+
+    def test_fetch_data(self):
+        transport = FakeAsyncTransport(lambda url, params: sample_one)
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/', transport=transport)
+
+        self.assertEqual(run(conn.fetch_data('/journals/2/')), sample_one)
+        self.assertEqual(transport.calls[0][0],
+                         'http://api.foo.com/api/v1/journals/2/')
+
+    def test_fetch_data_retry_on_ServiceUnavailable(self):
+        errors = [exceptions.ServiceUnavailable()]
+
+        def handler(url, params):
+            if errors:
+                raise errors.pop()
+            return sample_one
+
+        transport = FakeAsyncTransport(handler)
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/', transport=transport)
+
+        self.assertEqual(run(conn.fetch_data('/journals/2/')), sample_one)
+        self.assertEqual(len(transport.calls), 2)
+
+    def test_fetch_data_raises_if_reach_max_retries(self):
+        def handler(url, params):
+            raise exceptions.ConnectionError()
+
+        transport = FakeAsyncTransport(handler)
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/', transport=transport,
+                                  max_retries=2)
+
+        self.assertRaises(exceptions.ConnectionError,
+                          lambda: run(conn.fetch_data('/journals/2/')))
+        self.assertEqual(len(transport.calls), 3)
+
+    def test_unexpected_errors_end_the_half_open_trial(self):
+        outcomes = [exceptions.ServiceUnavailable(), ValueError('bad json')]
+
+        def handler(url, params):
+            if outcomes:
+                raise outcomes.pop(0)
+            return sample_one
+
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/', max_retries=0,
+                                  transport=FakeAsyncTransport(handler),
+                                  circuit_breaker=breaker)
+
+        self.assertRaises(exceptions.ServiceUnavailable,
+                          lambda: run(conn.fetch_data('/journals/2/')))
+        self.assertRaises(ValueError, lambda: run(conn.fetch_data('/journals/2/')))
+        self.assertEqual(run(conn.fetch_data('/journals/2/')), sample_one)
+
+    def test_cancelled_requests_are_not_failures(self):
+        class StalledTransport(object):
+            async def get(self, url, **kwargs):
+                await asyncio.sleep(60)
+
+        breaker = retry.CircuitBreaker(failure_threshold=3)
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/',
+                                  transport=StalledTransport(),
+                                  circuit_breaker=breaker)
+
+        async def cancel_fetches():
+            tasks = [asyncio.ensure_future(conn.fetch_data('/journals/%s/' % i))
+                     for i in range(3)]
+            await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        run(cancel_fetches())
+        self.assertEqual(breaker.state('http://api.foo.com/'), 'closed')
+
+    def test_cancelled_trial_is_released(self):
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure('http://api.foo.com/')
+        time.sleep(0.06)
+
+        class StalledTransport(object):
+            async def get(self, url, **kwargs):
+                await asyncio.sleep(60)
+
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/',
+                                  transport=StalledTransport(),
+                                  circuit_breaker=breaker)
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(conn.fetch_data('/journals/2/'))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        run(cancel_trial())
+        self.assertEqual(breaker.state('http://api.foo.com/'), 'half-open')
+        self.assertTrue(breaker.before_request('http://api.foo.com/'))
+
+    def test_fetch_many_is_concurrent_and_bounded(self):
+        transport = FakeAsyncTransport(lambda url, params: {'url': url})
+        conn = aio.AsyncConnector('http://api.foo.com/api/v1/', transport=transport,
+                                  max_concurrency=5)
+
+        resources = [('/journals/%s/' % i, None) for i in range(20)]
+        results = run(conn.fetch_many(resources))
+
+        self.assertEqual([r['url'] for r in results],
+                         ['http://api.foo.com/api/v1/journals/%s/' % i
+                          for i in range(20)])
+        self.assertEqual(transport.max_in_flight, 5)
+
+
+class AsyncTastyPieConnectorTests(unittest.TestCase):
+
+    def test_iter_docs(self):
+        transport = FakeAsyncTransport(tastypie_handler(7, 2))
+        conn = aio.AsyncTastyPieConnector('http://api.foo.com/api/v1/',
+                                          transport=transport)
+
+        docs = run(collect(conn.iter_docs('journals')))
+
+        self.assertEqual([doc['id'] for doc in docs], list(range(7)))
+        self.assertEqual(transport.max_in_flight, 1)
+
+    def test_iter_docs_concurrent(self):
+        transport = FakeAsyncTransport(tastypie_handler(41, 2))
+        conn = aio.AsyncTastyPieConnector('http://api.foo.com/api/v1/',
+                                          transport=transport, max_concurrency=8)
+
+        docs = run(collect(conn.iter_docs('journals', concurrent=True)))
+
+        self.assertEqual([doc['id'] for doc in docs], list(range(41)))
+        self.assertEqual(transport.max_in_flight, 8)
+
+    def test_keyset_pagination_is_not_concurrent(self):
+        conn = aio.AsyncTastyPieConnector('http://api.foo.com/api/v1/',
+                                          pagination='keyset')
+
+        self.assertEqual(conn.page_params(None), {'limit': 50, 'order_by': 'id'})
+        self.assertRaises(ValueError, run,
+                          collect(conn.iter_docs('journals', concurrent=True)))
+
+
+class HelpersTests(unittest.TestCase):
+
+    def test_params_are_flattened(self):
+        self.assertEqual(aio._flatten_params([('limit', ['1']), ('offset', 2)]),
+                         [('limit', '1'), ('offset', '2')])
+
+    def test_auth_is_applied(self):
+        from forest import auth
+        headers = {}
+        auth.ApiKeyAuth('user', 'key')(aio._AuthRequest(headers))
+
+        self.assertEqual(headers, {'Authorization': ' ApiKey user:key'})
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AiohttpTransportTests(unittest.TestCase):
+
+    def test_connection_errors_are_translated(self):
+        async def fetch():
+            transport = aio.AiohttpTransport()
+            try:
+                return await transport.get('http://127.0.0.1:1/')
+            finally:
+                await transport.close()
+
+        self.assertRaises(exceptions.ConnectionError, lambda: run(fetch()))
+
+    def test_get_without_transport(self):
+        self.assertRaises(exceptions.ConnectionError,
+                          lambda: run(aio.get('http://127.0.0.1:1/')))
@@ -10,6 +10,8 @@ class RequestsResponseStub(object):
     """
     def __init__(self, *args, **kwargs):
         self.status_code = 200
+        self.headers = {}
+        self.content = b'{"foo": "bar"}'
 
     def json(self):
         return {'foo': 'bar'}
@@ -0,0 +1,14 @@
+"""`forest.aio` requires Python 3.7+, so its tests, which cannot even be
+compiled by older Pythons, are only imported on these.
+"""
+import sys
+
+
+if sys.version_info >= (3, 7):
+    from .aio.cases import (GetFunctionTests, AsyncConnectorTests,
+                            AsyncTastyPieConnectorTests, HelpersTests,
+                            AiohttpTransportTests)
+
+    __all__ = ['GetFunctionTests', 'AsyncConnectorTests',
+               'AsyncTastyPieConnectorTests', 'HelpersTests',
+               'AiohttpTransportTests']
@@ -0,0 +1,359 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import auth, cache, connectors, httpbroker, paging, transports
+from . import doubles
+from .test_connectors import make_pages
+
+
+class CacheKeyTests(unittest.TestCase):
+
+    def test_params_order_does_not_matter(self):
+        self.assertEqual(cache.cache_key('http://foo.org/api/', {'a': 1, 'b': 2}),
+                         cache.cache_key('http://foo.org/api/', [('b', 2), ('a', 1)]))
+
+    def test_sequence_values_are_flattened(self):
+        self.assertEqual(cache.cache_key('http://foo.org/api/', {'limit': ['1']}),
+                         cache.cache_key('http://foo.org/api/', {'limit': 1}))
+
+    def test_querystring_and_params_are_merged(self):
+        self.assertEqual(cache.cache_key('http://foo.org/api/?b=2', {'a': 1}),
+                         'http://foo.org/api/?a=1&b=2')
+
+    def test_scheme_and_host_are_normalized(self):
+        self.assertEqual(cache.cache_key('HTTP://Foo.ORG:80/api/'),
+                         'http://foo.org/api/')
+
+    def test_non_default_ports_are_kept(self):
+        self.assertEqual(cache.cache_key('https://foo.org:8443/api/'),
+                         'https://foo.org:8443/api/')
+
+    def test_credentials_are_part_of_the_key(self):
+        anonymous = cache.cache_key('http://foo.org/api/')
+        alice = cache.cache_key('http://foo.org/api/', credentials='ApiKey alice:s3cret')
+        bob = cache.cache_key('http://foo.org/api/', credentials='ApiKey bob:s3cret')
+
+        self.assertEqual(len(set([anonymous, alice, bob])), 3)
+        self.assertNotIn('s3cret', alice)
+
+
+class DiskCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_entry(self, body=b'{"foo": "bar"}', etag='"abc"'):
+        return cache.CacheEntry(body, etag, None, time.time())
+
+    def test_missing_key(self):
+        self.assertIsNone(cache.DiskCache(self.directory).get('http://foo.org/'))
+
+    def test_set_and_get(self):
+        disk_cache = cache.DiskCache(self.directory)
+        entry = self.make_entry()
+        disk_cache.set('http://foo.org/', entry)
+
+        self.assertEqual(disk_cache.get('http://foo.org/'), entry)
+
+    def test_entries_survive_new_instances(self):
+        entry = self.make_entry()
+        cache.DiskCache(self.directory).set('http://foo.org/', entry)
+
+        self.assertEqual(cache.DiskCache(self.directory).get('http://foo.org/'),
+                         entry)
+
+    def test_least_recently_used_are_evicted(self):
+        disk_cache = cache.DiskCache(self.directory)
+        disk_cache.set('http://foo.org/1/', self.make_entry(b'x' * 50))
+        # room for exactly two entries
+        disk_cache.max_bytes = os.path.getsize(
+            os.path.join(self.directory, os.listdir(self.directory)[0])) * 2 + 20
+        disk_cache.set('http://foo.org/2/', self.make_entry(b'x' * 50))
+        disk_cache.get('http://foo.org/1/')
+        disk_cache.set('http://foo.org/3/', self.make_entry(b'x' * 50))
+
+        self.assertIsNotNone(disk_cache.get('http://foo.org/1/'))
+        self.assertIsNone(disk_cache.get('http://foo.org/2/'))
+        self.assertIsNotNone(disk_cache.get('http://foo.org/3/'))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_responses_without_validators_are_not_stored(self):
+        disk_cache = cache.DiskCache(self.directory)
+        disk_cache.store('http://foo.org/', doubles.RequestsResponseStub())
+
+        self.assertIsNone(disk_cache.get('http://foo.org/'))
+
+    def test_responses_with_validators_are_stored(self):
+        disk_cache = cache.DiskCache(self.directory)
+        response = doubles.RequestsResponseStub()
+        response.headers = {'etag': '"abc"', 'last-modified': 'Mon, 01 Jun 2015'}
+        disk_cache.store('http://foo.org/', response)
+
+        entry = disk_cache.get('http://foo.org/')
+        self.assertEqual(entry.body, response.content)
+        self.assertEqual(entry.validators(),
+                         {'If-None-Match': '"abc"',
+                          'If-Modified-Since': 'Mon, 01 Jun 2015'})
+
+
+class GetWithCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = cache.DiskCache(self.directory)
+        self.transport = mock.MagicMock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get(self):
+        return httpbroker.get('http://foo.org/api/v1/journals/',
+                              params={'limit': 1},
+                              user_agent='scielo.forest',
+                              transport=self.transport,
+                              cache=self.cache)
+
+    def test_conditional_request_and_304(self):
+        response = doubles.RequestsResponseStub()
+        response.headers = {'etag': '"abc"'}
+        not_modified = doubles.RequestsResponseStub()
+        not_modified.status_code = 304
+        not_modified.content = b''
+        self.transport.get.side_effect = [response, not_modified]
+
+        self.assertEqual(self.get(), {'foo': 'bar'})
+        self.assertEqual(self.get(), {'foo': 'bar'})
+
+        self.assertEqual(self.transport.get.call_args_list[0][1]['headers'],
+                         {'User-Agent': 'scielo.forest'})
+        self.assertEqual(self.transport.get.call_args_list[1][1]['headers'],
+                         {'User-Agent': 'scielo.forest', 'If-None-Match': '"abc"'})
+
+    def test_modified_resources_replace_cached_ones(self):
+        response = doubles.RequestsResponseStub()
+        response.headers = {'etag': '"abc"'}
+        modified = doubles.RequestsResponseStub()
+        modified.headers = {'etag': '"def"'}
+        modified.content = b'{"foo": "baz"}'
+        modified.json = lambda: {'foo': 'baz'}
+        self.transport.get.side_effect = [response, modified]
+
+        self.get()
+        self.assertEqual(self.get(), {'foo': 'baz'})
+        self.assertEqual(
+            self.cache.get(cache.cache_key('http://foo.org/api/v1/journals/',
+                                           {'limit': 1})).etag,
+            '"def"')
+
+
+class MemoryCacheTests(unittest.TestCase):
+
+    def make_entry(self, body=b'{"foo": "bar"}', etag=None, age=0):
+        return cache.CacheEntry(body, etag, None, time.time() - age)
+
+    def test_fresh_entries_are_hits(self):
+        memory_cache = cache.MemoryCache(ttl=60)
+        entry = self.make_entry()
+        memory_cache.set('k', entry)
+
+        self.assertEqual(memory_cache.get('k'), entry)
+        self.assertTrue(memory_cache.is_fresh(entry))
+        self.assertEqual(memory_cache.stats()['hits'], 1)
+
+    def test_missing_entries_are_misses(self):
+        memory_cache = cache.MemoryCache()
+
+        self.assertIsNone(memory_cache.get('k'))
+        self.assertEqual(memory_cache.stats()['misses'], 1)
+
+    def test_expired_entries_without_validators_are_dropped(self):
+        memory_cache = cache.MemoryCache(ttl=60)
+        memory_cache.set('k', self.make_entry(age=120))
+
+        self.assertIsNone(memory_cache.get('k'))
+        self.assertEqual(memory_cache.stats()['entries'], 0)
+        self.assertEqual(memory_cache.stats()['bytes'], 0)
+
+    def test_expired_entries_with_validators_are_kept(self):
+        memory_cache = cache.MemoryCache(ttl=60)
+        entry = self.make_entry(etag='"abc"', age=120)
+        memory_cache.set('k', entry)
+
+        self.assertEqual(memory_cache.get('k'), entry)
+        self.assertFalse(memory_cache.is_fresh(entry))
+        self.assertEqual(memory_cache.stats()['misses'], 1)
+
+    def test_evicts_by_entries(self):
+        memory_cache = cache.MemoryCache(max_entries=2)
+        memory_cache.set('a', self.make_entry())
+        memory_cache.set('b', self.make_entry())
+        memory_cache.get('a')
+        memory_cache.set('c', self.make_entry())
+
+        self.assertIsNotNone(memory_cache.get('a'))
+        self.assertIsNone(memory_cache.get('b'))
+        self.assertEqual(memory_cache.stats()['evictions'], 1)
+
+    def test_evicts_by_bytes(self):
+        memory_cache = cache.MemoryCache(max_bytes=25)
+        memory_cache.set('a', self.make_entry(b'x' * 10))
+        memory_cache.set('b', self.make_entry(b'x' * 10))
+        memory_cache.set('c', self.make_entry(b'x' * 10))
+
+        self.assertEqual(memory_cache.stats()['entries'], 2)
+        self.assertEqual(memory_cache.stats()['bytes'], 20)
+        self.assertIsNone(memory_cache.get('a'))
+
+    def test_responses_without_validators_are_stored(self):
+        memory_cache = cache.MemoryCache()
+        memory_cache.store('k', doubles.RequestsResponseStub())
+
+        self.assertEqual(memory_cache.get('k').body, b'{"foo": "bar"}')
+
+
+class CoalesceTests(unittest.TestCase):
+
+    def test_concurrent_calls_share_a_single_flight(self):
+        import threading
+        memory_cache = cache.MemoryCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(memory_cache.coalesce('k', func)))
+        leader.start()
+        started.wait()
+
+        followers = [threading.Thread(
+            target=lambda: results.append(memory_cache.coalesce('k', func)))
+            for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while memory_cache.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results),
+                         [('result', False)] + [('result', True)] * 3)
+
+    def test_errors_are_shared(self):
+        memory_cache = cache.MemoryCache()
+
+        def func():
+            raise ValueError()
+
+        self.assertRaises(ValueError, lambda: memory_cache.coalesce('k', func))
+        # the failed flight is not kept around.
+        self.assertEqual(memory_cache.coalesce('k', lambda: 1), (1, False))
+
+
+class GetWithMemoryCacheTests(unittest.TestCase):
+
+    def test_fresh_responses_are_served_without_requests(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        memory_cache = cache.MemoryCache(ttl=60)
+
+        for _ in range(3):
+            self.assertEqual(httpbroker.get('http://foo.org/api/v1/journals/',
+                                            transport=transport,
+                                            cache=memory_cache),
+                             {'foo': 'bar'})
+
+        self.assertEqual(transport.get.call_count, 1)
+        self.assertEqual(memory_cache.stats()['hits'], 2)
+
+    def test_cache_hits_do_not_take_rate_limiter_tokens(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        memory_cache = cache.MemoryCache(ttl=60)
+        limiter = mock.MagicMock()
+
+        for _ in range(3):
+            httpbroker.get('http://foo.org/api/v1/journals/', transport=transport,
+                           cache=memory_cache, rate_limiter=limiter)
+
+        self.assertEqual(limiter.acquire.call_count, 1)
+
+    def test_each_caller_gets_its_own_document(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        memory_cache = cache.MemoryCache(ttl=60)
+
+        first = httpbroker.get('http://foo.org/', transport=transport,
+                               cache=memory_cache)
+        first['foo'] = 'changed'
+
+        self.assertEqual(httpbroker.get('http://foo.org/', transport=transport,
+                                        cache=memory_cache),
+                         {'foo': 'bar'})
+
+    def assert_not_shared_between_credentials(self, response_cache):
+        def handler(request):
+            if 'If-None-Match' in request.headers:
+                return 304, b''
+            return (200, {'user': request.headers.get('Authorization')},
+                    {'ETag': '"v1"'})
+
+        transport = transports.FakeTransport(handler)
+
+        def get(credentials=None):
+            return httpbroker.get('http://foo.org/api/v1/journals/',
+                                  auth=credentials, transport=transport,
+                                  cache=response_cache)['user']
+
+        self.assertEqual(get(auth.ApiKeyAuth('alice', 'a')), ' ApiKey alice:a')
+        self.assertEqual(get(auth.ApiKeyAuth('bob', 'b')), ' ApiKey bob:b')
+        self.assertIsNone(get())
+        self.assertEqual(get(auth.ApiKeyAuth('alice', 'a')), ' ApiKey alice:a')
+
+    def test_responses_are_not_shared_between_credentials(self):
+        self.assert_not_shared_between_credentials(cache.MemoryCache(ttl=60))
+
+    def test_disk_responses_are_not_shared_between_credentials(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.assert_not_shared_between_credentials(cache.DiskCache(directory))
+        finally:
+            shutil.rmtree(directory)
+
+
+class ConnectorWithCacheTests(unittest.TestCase):
+
+    def test_page_sizer_skips_cached_pages(self):
+        pages = make_pages(120, 50)
+        transport = transports.FakeTransport(
+            lambda request: (200, pages('journals', dict(request.params))))
+        conn = connectors.TastyPieConnector(
+            'http://api.foo.com/api/v1/', transport=transport,
+            page_sizer=paging.AdaptivePageSize(min_size=50, max_size=50),
+            cache=cache.MemoryCache())
+
+        first = [doc['id'] for doc in conn.iter_docs('journals')]
+        second = [doc['id'] for doc in conn.iter_docs('journals')]
+
+        self.assertEqual(first, list(range(120)))
+        self.assertEqual(second, first)
+        self.assertEqual(len(transport.requests), 3)
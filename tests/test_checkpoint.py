@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from forest import checkpoint
+
+
+class AtomicWriteTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_writes_and_replaces(self):
+        path = os.path.join(self.directory, 'state.json')
+        checkpoint.atomic_write(path, b'first')
+        checkpoint.atomic_write(path, b'second')
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'second')
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+
+
+class FileCheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journals.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_file(self):
+        self.assertIsNone(checkpoint.FileCheckpoint(self.path).load('journals', None))
+
+    def test_save_and_load(self):
+        cp = checkpoint.FileCheckpoint(self.path)
+        cp.save('journals', {'collection': 'scl'},
+                ('journals', {'offset': ['20'], 'limit': ['20']}))
+
+        self.assertEqual(checkpoint.FileCheckpoint(self.path).load(
+                             'journals', {'collection': 'scl'}),
+                         ('journals', {'offset': ['20'], 'limit': ['20']}))
+
+    def test_list_of_pairs_params(self):
+        cp = checkpoint.FileCheckpoint(self.path)
+        cp.save('journals', [('b', 1), ('a', 2)], ('journals', [('page', 2)]))
+
+        self.assertEqual(cp.load('journals', [('a', 2), ('b', 1)]),
+                         ('journals', [('page', 2)]))
+
+    def test_checkpoint_of_other_harvest_is_ignored(self):
+        cp = checkpoint.FileCheckpoint(self.path)
+        cp.save('journals', {'collection': 'scl'}, ('journals', {'offset': ['20']}))
+
+        self.assertIsNone(cp.load('journals', {'collection': 'arg'}))
+        self.assertIsNone(cp.load('issues', {'collection': 'scl'}))
+
+    def test_corrupted_file_is_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"orig')
+
+        self.assertIsNone(checkpoint.FileCheckpoint(self.path).load('journals', None))
+
+    def test_clear(self):
+        cp = checkpoint.FileCheckpoint(self.path)
+        cp.save('journals', None, ('journals', {'offset': ['20']}))
+        cp.clear()
+        cp.clear()
+
+        self.assertFalse(os.path.exists(self.path))
@@ -20,3 +20,282 @@ class TastyPieConnectorTests(unittest.TestCase):
         self.assertEquals(path, 'journals')
         self.assertEquals(params, {'limit': ['1'], 'collection': ['saude-publica'], 'offset': ['1']})
 
+    def test_page_offsets(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        offsets = conn.__page_offsets__(
+            {'meta': {'offset': 0, 'limit': 2, 'total_count': 7}})
+
+        self.assertEqual(list(offsets), [2, 4, 6])
+
+    def test_page_offsets_without_limit(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        offsets = conn.__page_offsets__(
+            {'meta': {'offset': 0, 'limit': 0, 'total_count': 7}})
+
+        self.assertEqual(list(offsets), [])
+
+
+
+def make_pages(total_count, limit):
+    """Produces a `fetch_data` replacement that serves `total_count`
+    documents, `limit` per page, the way Tastypie does.
+    """
+    def fake_fetch_data(resource_path=None, params=None):
+        params = params or {}
+        offset = int(params.get('offset', ['0'])[0])
+        next_offset = offset + limit
+        if next_offset < total_count:
+            uri_next = '/api/v1/journals/?limit=%s&offset=%s' % (limit, next_offset)
+        else:
+            uri_next = None
+
+        return {'meta': {'limit': limit, 'offset': offset,
+                         'next': uri_next, 'total_count': total_count},
+                'objects': [{'id': i} for i in
+                            range(offset, min(offset + limit, total_count))]}
+
+    return fake_fetch_data
+
+
+class TastyPieConnectorIterDocsTests(unittest.TestCase):
+    def make_connector(self, total_count, limit):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        conn.fetch_data = mock.MagicMock(side_effect=make_pages(total_count, limit))
+        return conn
+
+    def test_serial(self):
+        conn = self.make_connector(7, 2)
+        docs = list(conn.iter_docs('journals'))
+
+        self.assertEqual([doc['id'] for doc in docs], list(range(7)))
+        self.assertEqual(conn.fetch_data.call_count, 4)
+
+    def test_parallel_preserves_order(self):
+        conn = self.make_connector(23, 2)
+        docs = list(conn.iter_docs('journals', workers=3))
+
+        self.assertEqual([doc['id'] for doc in docs], list(range(23)))
+        self.assertEqual(conn.fetch_data.call_count, 12)
+
+    def test_parallel_unordered_yields_every_doc(self):
+        conn = self.make_connector(23, 2)
+        docs = list(conn.iter_docs('journals', workers=3, ordered=False))
+
+        self.assertEqual(sorted(doc['id'] for doc in docs), list(range(23)))
+
+    def test_parallel_requests_computed_offsets(self):
+        conn = self.make_connector(5, 2)
+        list(conn.iter_docs('journals', params={'collection': 'scl'}, workers=2))
+
+        offsets = sorted(call[0][1]['offset'] for call in
+                         conn.fetch_data.call_args_list[1:])
+        self.assertEqual(offsets, [['2'], ['4']])
+        self.assertEqual(conn.fetch_data.call_args_list[0],
+                         mock.call('journals', {'collection': 'scl', 'limit': 50}))
+
+    def test_parallel_with_fields_and_filters(self):
+        conn = self.make_connector(5, 2)
+        docs = list(conn.iter_docs('journals', workers=2, fields=['title'],
+                                   filters={'collection': 'scl'}))
+
+        self.assertEqual(docs, [{}] * 5)
+        self.assertEqual(conn.fetch_data.call_args_list[0],
+                         mock.call('journals', {'collection': 'scl', 'limit': 50}))
+
+    def test_compact(self):
+        from forest import records
+        conn = self.make_connector(5, 2)
+        docs = list(conn.iter_docs('journals', compact=True))
+
+        self.assertTrue(all(isinstance(doc, records.Record) for doc in docs))
+        self.assertEqual([doc['id'] for doc in docs], list(range(5)))
+
+    def test_parallel_compact(self):
+        from forest import records
+        conn = self.make_connector(5, 2)
+        docs = list(conn.iter_docs('journals', workers=2, compact=True))
+
+        self.assertTrue(all(isinstance(doc, records.Record) for doc in docs))
+        self.assertEqual([doc.id for doc in docs], list(range(5)))
+
+    def test_parallel_single_page(self):
+        conn = self.make_connector(2, 2)
+        docs = list(conn.iter_docs('journals', workers=3))
+
+        self.assertEqual([doc['id'] for doc in docs], [0, 1])
+        self.assertEqual(conn.fetch_data.call_count, 1)
+
+    def test_parallel_without_limit(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        conn.fetch_data = mock.MagicMock(return_value={
+            'meta': {'limit': 0, 'offset': 0, 'next': None, 'total_count': 3},
+            'objects': [{'id': i} for i in range(3)]})
+        docs = list(conn.iter_docs('journals', workers=3))
+
+        self.assertEqual([doc['id'] for doc in docs], [0, 1, 2])
+        self.assertEqual(conn.fetch_data.call_count, 1)
+
+    def test_parallel_propagates_errors(self):
+        from forest import exceptions
+        fetch = make_pages(7, 2)
+
+        def failing_fetch(resource_path=None, params=None):
+            if params and params.get('offset') == ['4']:
+                raise exceptions.NotFound()
+            return fetch(resource_path, params)
+
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        conn.fetch_data = failing_fetch
+
+        self.assertRaises(exceptions.NotFound,
+                          lambda: list(conn.iter_docs('journals', workers=2)))
+
+
+def make_keyset_pages(ids, limit):
+    """Produces a `fetch_data` replacement that serves documents of `ids`
+    ordered by id, filtered by `id__gt`, the way Tastypie does.
+    """
+    def first(value):
+        return value[0] if isinstance(value, list) else value
+
+    def fake_fetch_data(resource_path=None, params=None):
+        params = dict(params or {})
+        after = int(first(params.get('id__gt', -1)))
+        remaining = [i for i in sorted(ids) if i > after]
+        offset = int(first(params.get('offset', 0)))
+        page = remaining[offset:offset + limit]
+
+        if offset + limit < len(remaining):
+            uri_next = '/api/v1/journals/?id__gt=%s&limit=%s&offset=%s&order_by=id' % (
+                after, limit, offset + limit)
+        else:
+            uri_next = None
+
+        return {'meta': {'limit': limit, 'offset': offset, 'next': uri_next,
+                         'total_count': len(remaining)},
+                'objects': [{'id': i, 'resource_uri': '/api/v1/journals/%s/' % i}
+                            for i in page]}
+
+    return fake_fetch_data
+
+
+class TastyPieConnectorKeysetTests(unittest.TestCase):
+    ids = [3, 5, 8, 13, 21, 34, 55]
+
+    def make_connector(self, **kwargs):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            items_per_request=2,
+                                            pagination='keyset', **kwargs)
+        conn.fetch_data = mock.MagicMock(side_effect=make_keyset_pages(self.ids, 2))
+        return conn
+
+    def test_iter_docs(self):
+        conn = self.make_connector()
+        docs = list(conn.iter_docs('journals'))
+
+        self.assertEqual([doc['id'] for doc in docs], self.ids)
+        self.assertEqual(conn.fetch_data.call_count, 4)
+
+    def test_pages_are_requested_after_the_last_id(self):
+        conn = self.make_connector()
+        list(conn.iter_docs('journals', params={'collection': 'scl'}))
+
+        calls = [call[0][1] for call in conn.fetch_data.call_args_list]
+        self.assertEqual(calls[0], {'collection': 'scl', 'limit': 2,
+                                    'order_by': 'id'})
+        self.assertEqual([call.get('id__gt') for call in calls],
+                         [None, ['5'], ['13'], ['34']])
+        self.assertTrue(all('offset' not in call for call in calls))
+        self.assertTrue(all(call['order_by'] in ('id', ['id']) for call in calls))
+
+    def test_id_is_taken_from_resource_uri(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            pagination='keyset')
+        data = {'meta': {'next': '/api/v1/journals/?limit=2&offset=2&order_by=id'},
+                'objects': [{'resource_uri': '/api/v1/journals/1420/'}]}
+
+        self.assertEqual(conn.__resumption_resource_path__(data),
+                         ('journals', {'limit': ['2'], 'order_by': ['id'],
+                                       'id__gt': ['1420']}))
+
+    def test_missing_id_is_not_the_end_of_the_harvest(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            pagination='keyset')
+        data = {'meta': {'next': '/api/v1/journals/?limit=2&offset=2&order_by=id'},
+                'objects': [{'title': 'Annali'}]}
+
+        self.assertRaises(KeyError, conn.__resumption_resource_path__, data)
+
+    def test_ordering_replaces_list_params(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            items_per_request=2,
+                                            pagination='keyset')
+
+        self.assertEqual(conn.page_params([('order_by', 'title')]),
+                         [('limit', 2), ('order_by', 'id')])
+
+    def test_offset_pagination_is_the_default(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+
+        self.assertEqual(conn.pagination, 'offset')
+        self.assertEqual(conn.page_params(None), {'limit': 50})
+
+    def test_unknown_pagination(self):
+        self.assertRaises(ValueError, connectors.TastyPieConnector,
+                          'http://api.foo.com/api/v1/', pagination='cursor')
+
+    def test_cannot_be_combined_with_workers_or_stream(self):
+        conn = self.make_connector()
+
+        self.assertRaises(ValueError, conn.iter_docs, 'journals', workers=2)
+        self.assertRaises(ValueError, conn.iter_docs, 'journals', stream=True)
+        self.assertRaises(ValueError, conn.__page_offsets__,
+                          {'meta': {'offset': 0, 'limit': 2, 'total_count': 7}})
+
+
+class TastyPieConnectorStreamTests(unittest.TestCase):
+
+    def test_iter_docs_stream(self):
+        from forest import jsonstream
+        import json
+        pages = make_pages(5, 2)
+
+        def fetch_data(resource_path=None, params=None, stream=False):
+            self.assertTrue(stream)
+            text = json.dumps(pages(resource_path, params))
+            return jsonstream.StreamedObject([text], 'objects')
+
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        conn.fetch_data = fetch_data
+
+        docs = list(conn.iter_docs('journals', stream=True))
+        self.assertEqual([doc['id'] for doc in docs], list(range(5)))
+
+    def test_stream_passes_stream_key(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        with mock.patch('forest.httpbroker.get') as mock_get:
+            conn.fetch_data('journals', stream=True)
+
+        self.assertEqual(mock_get.call_args[1]['stream_key'], 'objects')
+
+    def test_stream_cannot_be_combined_with_workers(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+
+        self.assertRaises(ValueError,
+                          lambda: conn.iter_docs('journals', stream=True, workers=2))
+
+
+class GetManyTests(unittest.TestCase):
+
+    def test_ids_are_fetched_in_batches(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/')
+        conn.fetch_data = mock.MagicMock(side_effect=[
+            {'objects': [{'id': 1}, {'id': 2}], 'not_found': []},
+            {'objects': [{'resource_uri': '/api/v1/issues/3/'}], 'not_found': ['4']},
+        ])
+
+        docs = conn.get_many('issues', [1, 2, 1, 3, 4], batch_size=2)
+
+        self.assertEqual(conn.fetch_data.call_args_list,
+                         [mock.call('issues/set/1;2'), mock.call('issues/set/3;4')])
+        self.assertEqual(sorted(docs), ['1', '2', '3'])
@@ -1,10 +1,17 @@
+import json
+import os
+import threading
+import time
 import unittest
 try:
     from unittest import mock
 except ImportError: # PY2
     import mock
 
-from forest import core, exceptions
+import requests
+
+from forest import (auth, core, exceptions, httpbroker, metrics, paging,
+                    ratelimit, retry, transports)
 from . import doubles
 
 
@@ -52,6 +59,33 @@ class ConnectorTests(unittest.TestCase):
         self.assertEqual(conn.auth, None)
         self.assertEqual(conn.items_per_request, 50)
         self.assertEqual(conn.check_ca, False)
+        self.assertIsInstance(conn.transport, httpbroker.PooledTransport)
+
+    def test_shared_transport(self):
+        transport = httpbroker.PooledTransport()
+        conn1 = core.Connector('http://api.foo.com/api/v1/', transport=transport)
+        conn2 = core.Connector('http://api.foo.com/api/v1/', transport=transport)
+
+        self.assertIs(conn1.transport, conn2.transport)
+
+    def test_prewarm_at_construction(self):
+        transport = mock.MagicMock()
+        api_key = auth.ApiKeyAuth('user', 'key')
+        conn = core.Connector('http://api.foo.com/api/v1/', transport=transport,
+                              auth=api_key, prewarm=4)
+
+        self.assertIs(conn.transport, transport)
+        self.assertEqual(transport.prewarm.call_args,
+                         mock.call('http://api.foo.com/api/v1/',
+                                   connections=4, check_ca=False, auth=api_key,
+                                   user_agent=httpbroker.DEFAULT_USER_AGENT))
+
+    def test_no_prewarm_by_default(self):
+        transport = mock.MagicMock()
+        conn = core.Connector('http://api.foo.com/api/v1/', transport=transport)
+
+        self.assertIs(conn.transport, transport)
+        self.assertFalse(transport.prewarm.called)
 
     def test_fetch_data(self):
         mock_get = mock.MagicMock()
@@ -67,7 +101,8 @@ class ConnectorTests(unittest.TestCase):
             self.assertEquals(fake_httpbroker.get.call_args,
                               mock.call('http://api.foo.com/api/v1/journals/2/',
                                         params=None,
-                                        auth=None))
+                                        auth=None,
+                                        transport=conn.transport))
 
     def test_fetch_data_with_params(self):
         mock_get = mock.MagicMock()
@@ -83,7 +118,8 @@ class ConnectorTests(unittest.TestCase):
             self.assertEquals(fake_httpbroker.get.call_args,
                               mock.call('http://api.foo.com/api/v1/journals/',
                                         params={'collection': 'mexico'},
-                                        auth=None))
+                                        auth=None,
+                                        transport=conn.transport))
 
     def test_fetch_data_with_auth(self):
         mock_get = mock.MagicMock()
@@ -103,7 +139,8 @@ class ConnectorTests(unittest.TestCase):
             self.assertEquals(fake_httpbroker.get.call_args,
                               mock.call('http://api.foo.com/api/v1/journals/',
                                         params=None,
-                                        auth=auth))
+                                        auth=auth,
+                                        transport=conn.transport))
 
     def test_fetch_data_retry_on_ConnectionError(self):
         calls = [exceptions.ConnectionError, sample_one]
@@ -119,7 +156,8 @@ class ConnectorTests(unittest.TestCase):
             self.assertEquals(fake_httpbroker.get.call_args,
                               mock.call('http://api.foo.com/api/v1/journals/2/',
                                         params=None,
-                                        auth=None))
+                                        auth=None,
+                                        transport=conn.transport))
 
     def test_fetch_data_retry_on_ServiceUnavailable(self):
         calls = [exceptions.ServiceUnavailable, sample_one]
@@ -135,7 +173,8 @@ class ConnectorTests(unittest.TestCase):
             self.assertEquals(fake_httpbroker.get.call_args,
                               mock.call('http://api.foo.com/api/v1/journals/2/',
                                         params=None,
-                                        auth=None))
+                                        auth=None,
+                                        transport=conn.transport))
 
     def test_fetch_data_retry_timeout_factor(self):
         calls = [exceptions.ServiceUnavailable,
@@ -170,4 +209,481 @@ class ConnectorTests(unittest.TestCase):
             self.assertRaises(exceptions.ServiceUnavailable,
                               lambda: conn.fetch_data('/journals/2/'))
 
+    def test_fetch_data_retry_on_BadGateway_and_Timeout(self):
+        calls = [exceptions.BadGateway, exceptions.Timeout, sample_one]
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(side_effect=calls)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+
+            self.assertEquals(sample_one, conn.fetch_data('/journals/2/'))
+
+    def test_fetch_data_does_not_retry_on_NotFound(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(side_effect=exceptions.NotFound)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+
+            self.assertRaises(exceptions.NotFound,
+                              lambda: conn.fetch_data('/journals/2/'))
+            self.assertEqual(fake_httpbroker.get.call_count, 1)
+
+    def test_fetch_data_uses_retry_policy(self):
+        calls = [exceptions.ServiceUnavailable] * 3 + [sample_one]
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(side_effect=calls)
+        mock_time = mock.MagicMock()
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker,
+                                                     time=mock_time):
+            policy = retry.RetryPolicy(backoff_factor=1, exponential=True)
+            conn = core.Connector('http://api.foo.com/api/v1/', retry_policy=policy)
+
+            self.assertEquals(sample_one, conn.fetch_data('/journals/2/'))
+            self.assertEquals(mock_time.sleep.call_args_list,
+                              [mock.call(1), mock.call(2), mock.call(4)])
+
+    def test_fetch_data_with_rate_limiter(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(return_value=sample_one)
+        limiter = ratelimit.TokenBucket(rate=10)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/', rate_limiter=limiter)
+            conn.fetch_data('/journals/2/')
+
+            self.assertEquals(fake_httpbroker.get.call_args,
+                              mock.call('http://api.foo.com/api/v1/journals/2/',
+                                        params=None,
+                                        auth=None,
+                                        transport=conn.transport,
+                                        rate_limiter=limiter))
+
+    def test_fetch_data_records_metrics(self):
+        def get(url, observer=None, **kwargs):
+            observer(httpbroker.ResponseInfo('GET', url, 200, 0.1, 10, 0.01))
+            return sample_one
+
+        errors = [exceptions.ServiceUnavailable()]
+
+        def side_effect(*args, **kwargs):
+            if errors:
+                raise errors.pop()
+            return get(*args, **kwargs)
+
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(side_effect=side_effect)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/',
+                                  metrics=metrics.Metrics())
+            conn.fetch_data('/journals/2/')
+
+        stats = conn.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['bytes'], 10)
+
+    def test_fetch_data_with_fields_and_filters(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(return_value=sample_many)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            conn.fields_param = 'fields'
+            conn.fetch_data('/journals/', fields=['title', 'acronym'],
+                            filters={'pub_status': 'current'})
+
+            self.assertEquals(fake_httpbroker.get.call_args,
+                              mock.call('http://api.foo.com/api/v1/journals/',
+                                        params={'fields': 'title,acronym',
+                                                'pub_status': 'current'},
+                                        auth=None,
+                                        transport=conn.transport))
+
+    def test_stats_without_metrics(self):
+        conn = core.Connector('http://api.foo.com/api/v1/')
+        self.assertIsNone(conn.stats())
+
+    def test_fetch_data_fails_fast_on_open_circuit(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(side_effect=exceptions.ServiceUnavailable)
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            breaker = retry.CircuitBreaker(failure_threshold=2)
+            conn = core.Connector('http://api.foo.com/api/v1/',
+                                  circuit_breaker=breaker)
+
+            self.assertRaises(exceptions.CircuitOpen,
+                              lambda: conn.fetch_data('/journals/2/'))
+            self.assertEqual(fake_httpbroker.get.call_count, 2)
+
+
+    def test_unexpected_errors_end_the_half_open_trial(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(
+            side_effect=[exceptions.ServiceUnavailable(), ValueError('bad json'),
+                         sample_one])
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+            conn = core.Connector('http://api.foo.com/api/v1/', max_retries=0,
+                                  circuit_breaker=breaker)
+
+            self.assertRaises(exceptions.ServiceUnavailable,
+                              lambda: conn.fetch_data('/journals/2/'))
+            self.assertRaises(ValueError, lambda: conn.fetch_data('/journals/2/'))
+            self.assertEqual(conn.fetch_data('/journals/2/'), sample_one)
+            self.assertEqual(breaker.state('http://api.foo.com/'), 'closed')
+
+
+    def test_interrupted_trial_is_not_a_failure(self):
+        fake_httpbroker = doubles.make_fake_httpbroker()
+        fake_httpbroker.get = mock.MagicMock(
+            side_effect=[exceptions.ServiceUnavailable(), KeyboardInterrupt(),
+                         sample_one])
+
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+            conn = core.Connector('http://api.foo.com/api/v1/', max_retries=0,
+                                  circuit_breaker=breaker)
+
+            self.assertRaises(exceptions.ServiceUnavailable,
+                              lambda: conn.fetch_data('/journals/2/'))
+            time.sleep(0.06)
+            self.assertRaises(KeyboardInterrupt,
+                              lambda: conn.fetch_data('/journals/2/'))
+            self.assertEqual(breaker.state('http://api.foo.com/'), 'half-open')
+            self.assertEqual(conn.fetch_data('/journals/2/'), sample_one)
+            self.assertEqual(breaker.state('http://api.foo.com/'), 'closed')
+
+
+class PostManyTests(unittest.TestCase):
+
+    def make_fake_httpbroker(self, post=None, patch_list=None):
+        fake_httpbroker = doubles.make_fake_httpbroker(
+            ignore=['get', 'post', 'patch_list'])
+        fake_httpbroker.post = post or mock.MagicMock()
+        fake_httpbroker.patch_list = patch_list or mock.MagicMock()
+        return fake_httpbroker
+
+    def test_locations_are_returned_in_order(self):
+        def post(url, data, **kwargs):
+            time.sleep(0.01 * (3 - data['id']))
+            return url + '%s/' % data['id']
+
+        fake_httpbroker = self.make_fake_httpbroker(post=post)
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            results = conn.post_many('journals', [{'id': i} for i in range(3)],
+                                     workers=3)
+
+        self.assertEqual(results, ['http://api.foo.com/api/v1/journals/0/',
+                                   'http://api.foo.com/api/v1/journals/1/',
+                                   'http://api.foo.com/api/v1/journals/2/'])
+
+    def test_failures_are_returned_in_place(self):
+        error = exceptions.BadRequest()
+
+        def post(url, data, **kwargs):
+            if data['id'] == 1:
+                raise error
+            return url
+
+        fake_httpbroker = self.make_fake_httpbroker(post=post)
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            results = conn.post_many('journals', [{'id': i} for i in range(3)])
+
+        self.assertIs(results[1], error)
+        self.assertEqual(results[0], 'http://api.foo.com/api/v1/journals/')
+
+    def test_network_failures_are_returned_in_place(self):
+        def handler(request):
+            doc_id = json.loads(request.data)['id']
+            if doc_id == 1:
+                raise requests.exceptions.ConnectionError('connection refused')
+            return (201, '', {'Location': request.url + '%s/' % doc_id})
+
+        transport = transports.FakeTransport(handler)
+        conn = core.Connector('http://api.foo.com/api/v1/', transport=transport)
+        results = conn.post_many('journals', [{'id': i} for i in range(3)])
+
+        self.assertEqual(results[0], 'http://api.foo.com/api/v1/journals/0/')
+        self.assertIsInstance(results[1], exceptions.ConnectionError)
+        self.assertEqual(results[2], 'http://api.foo.com/api/v1/journals/2/')
+
+    def test_bulk_sends_chunks(self):
+        patch_list = mock.MagicMock(side_effect=lambda url, objs, **kw: [None] * len(objs))
+        fake_httpbroker = self.make_fake_httpbroker(patch_list=patch_list)
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            results = conn.post_many('journals', [{'id': i} for i in range(5)],
+                                     bulk=True, chunk_size=2)
+
+        self.assertEqual(results, [None] * 5)
+        self.assertEqual(patch_list.call_count, 3)
+        self.assertFalse(fake_httpbroker.post.called)
+
+    def test_rejected_chunks_are_posted_one_by_one(self):
+        def patch_list(url, objs, **kwargs):
+            if objs[0]['id'] == 2:
+                raise exceptions.MethodNotAllowed()
+            return [None] * len(objs)
+
+        post = mock.MagicMock(return_value='http://api.foo.com/api/v1/journals/9/')
+        fake_httpbroker = self.make_fake_httpbroker(post=post, patch_list=patch_list)
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            results = conn.post_many('journals', [{'id': i} for i in range(5)],
+                                     bulk=True, chunk_size=2)
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(sorted(c[0][1]['id'] for c in post.call_args_list), [2, 3])
+        self.assertEqual(results, [None, None,
+                                   'http://api.foo.com/api/v1/journals/9/',
+                                   'http://api.foo.com/api/v1/journals/9/',
+                                   None])
+
+    def test_failed_chunks_are_not_posted_again(self):
+        error = exceptions.InternalServerError()
+
+        def patch_list(url, objs, **kwargs):
+            if objs[0]['id'] == 2:
+                raise error
+            return [None] * len(objs)
+
+        post = mock.MagicMock()
+        fake_httpbroker = self.make_fake_httpbroker(post=post, patch_list=patch_list)
+        with mock.patch.dict('forest.core.__dict__', httpbroker=fake_httpbroker):
+            conn = core.Connector('http://api.foo.com/api/v1/')
+            results = conn.post_many('journals', [{'id': i} for i in range(5)],
+                                     bulk=True, chunk_size=2)
+
+        self.assertFalse(post.called)
+        self.assertEqual(results, [None, None, error, error, None])
+
+    def test_missing_locations_are_returned_in_place(self):
+        transport = transports.FakeTransport(lambda request: (201, ''))
+        conn = core.Connector('http://api.foo.com/api/v1/', transport=transport)
+        results = conn.post_many('journals', [{'id': 1}])
+
+        self.assertIsInstance(results[0], exceptions.APIError)
+
+
+class PagedConnector(core.Connector):
+    """Connector whose pages are lists of documents followed by
+    the resumption page number.
+    """
+    def __init__(self, pages, *args, **kwargs):
+        super(PagedConnector, self).__init__('http://api.foo.com/api/v1/',
+                                             *args, **kwargs)
+        self.pages = pages
+        self.fetched = []
+
+    def fetch_data(self, resource_path=None, params=None):
+        page_no = (params or {}).get('page', 0)
+        self.fetched.append(page_no)
+        return {'page': page_no, 'objects': self.pages[page_no]}
+
+    def __get_docs__(self, data):
+        return data['objects']
+
+    def __resumption_resource_path__(self, data):
+        if data['page'] + 1 >= len(self.pages):
+            raise ValueError()
+        return 'journals', {'page': data['page'] + 1}
+
+
+class PageParamsTests(unittest.TestCase):
+
+    def test_items_per_request_is_set(self):
+        conn = core.Connector('http://api.foo.com/api/v1/', items_per_request=20)
+        self.assertEqual(conn.page_params(None), {'limit': 20})
+
+    def test_explicit_limit_is_kept(self):
+        conn = core.Connector('http://api.foo.com/api/v1/', items_per_request=20)
+        self.assertEqual(conn.page_params({'limit': 5, 'a': 1}), {'limit': 5, 'a': 1})
+
+    def test_explicit_limit_is_overridden(self):
+        conn = core.Connector('http://api.foo.com/api/v1/', items_per_request=20)
+        self.assertEqual(conn.page_params({'limit': ['5']}, override=True),
+                         {'limit': 20})
+
+    def test_list_of_pairs(self):
+        conn = core.Connector('http://api.foo.com/api/v1/', items_per_request=20)
+        self.assertEqual(conn.page_params([('a', 1)]), [('a', 1), ('limit', 20)])
+        self.assertEqual(conn.page_params([('limit', 5)], override=True),
+                         [('limit', 20)])
+
+    def test_params_are_not_mutated(self):
+        conn = core.Connector('http://api.foo.com/api/v1/')
+        params = {'a': 1}
+        conn.page_params(params)
+
+        self.assertEqual(params, {'a': 1})
+
+    def test_page_sizer_takes_precedence(self):
+        conn = core.Connector('http://api.foo.com/api/v1/', items_per_request=20,
+                              page_sizer=paging.AdaptivePageSize(initial=30))
+        self.assertEqual(conn.page_params(None), {'limit': 30})
+
+
+class IterDocsTests(unittest.TestCase):
+    pages = [[1, 2], [3, 4], [5]]
+
+    def test_serial(self):
+        conn = PagedConnector(self.pages)
+        self.assertEqual(list(conn.iter_docs('journals')), [1, 2, 3, 4, 5])
+
+    def test_prefetch(self):
+        conn = PagedConnector(self.pages)
+        self.assertEqual(list(conn.iter_docs('journals', prefetch=2)),
+                         [1, 2, 3, 4, 5])
+        self.assertEqual(conn.fetched, [0, 1, 2])
+
+    def test_pages_and_docs_are_counted(self):
+        conn = PagedConnector(self.pages, metrics=metrics.Metrics())
+        list(conn.iter_docs('journals'))
+
+        self.assertEqual(conn.stats()['pages'], 3)
+        self.assertEqual(conn.stats()['docs'], 5)
+
+    def test_client_side_projection(self):
+        conn = PagedConnector([[{'id': 1, 'title': 'foo', 'issues': []}]])
+        self.assertEqual(list(conn.iter_docs('journals', fields=['id'])),
+                         [{'id': 1}])
+
+    def test_filters_become_params(self):
+        conn = PagedConnector(self.pages)
+        conn.fetch_data = mock.MagicMock(wraps=conn.fetch_data)
+        list(conn.iter_docs('journals', filters={'title__startswith': 'A'}))
+
+        self.assertEqual(conn.fetch_data.call_args_list[0],
+                         mock.call('journals', {'limit': 50,
+                                                'title__startswith': 'A'}))
+
+    def test_projection_pushdown(self):
+        conn = PagedConnector([[{'id': 1, 'title': 'foo'}]])
+        conn.fields_param = 'fields'
+        conn.fetch_data = mock.MagicMock(wraps=conn.fetch_data)
+
+        docs = list(conn.iter_docs('journals', fields=['id', 'title']))
+
+        # the server is trusted to project the documents.
+        self.assertEqual(docs, [{'id': 1, 'title': 'foo'}])
+        self.assertEqual(conn.fetch_data.call_args_list[0],
+                         mock.call('journals', {'limit': 50, 'fields': 'id,title'}))
+
+    def test_first_page_has_items_per_request(self):
+        conn = PagedConnector(self.pages, items_per_request=2)
+        conn.fetch_data = mock.MagicMock(wraps=conn.fetch_data)
+        list(conn.iter_docs('journals'))
+
+        self.assertEqual(conn.fetch_data.call_args_list[0],
+                         mock.call('journals', {'limit': 2}))
+        self.assertEqual(conn.fetch_data.call_args_list[1],
+                         mock.call('journals', {'page': 1}))
+
+    def test_adaptive_page_size(self):
+        conn = PagedConnector(self.pages,
+                              page_sizer=paging.AdaptivePageSize(initial=10))
+        fetch_data = conn.fetch_data
+
+        def observed_fetch_data(resource_path=None, params=None, observer=None):
+            observer(httpbroker.ResponseInfo('GET', resource_path, 200, 0.01, 100))
+            return fetch_data(resource_path, params)
+
+        conn.fetch_data = mock.MagicMock(side_effect=observed_fetch_data)
+        list(conn.iter_docs('journals'))
+
+        limits = [call[0][1]['limit'] for call in conn.fetch_data.call_args_list]
+        self.assertEqual(limits, [10, 20, 40])
+
+    def test_checkpoint_resumes_interrupted_harvest(self):
+        import shutil
+        import tempfile
+        from forest import checkpoint
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cp = checkpoint.FileCheckpoint(os.path.join(directory, 'journals.json'))
+
+        conn = PagedConnector(self.pages)
+        fetch_data = conn.fetch_data
+
+        def failing_fetch_data(resource_path=None, params=None):
+            if (params or {}).get('page') == 2:
+                raise exceptions.ServiceUnavailable()
+            return fetch_data(resource_path, params)
+
+        conn.fetch_data = failing_fetch_data
+        docs = []
+        try:
+            for doc in conn.iter_docs('journals', checkpoint=cp):
+                docs.append(doc)
+        except exceptions.ServiceUnavailable:
+            pass
+
+        self.assertEqual(docs, [1, 2, 3, 4])
+
+        conn = PagedConnector(self.pages)
+        self.assertEqual(list(conn.iter_docs('journals', checkpoint=cp)), [5])
+        self.assertEqual(conn.fetched, [2])
+        self.assertFalse(os.path.exists(cp.path))
+
+    def test_iter_pages(self):
+        conn = PagedConnector(self.pages)
+        self.assertEqual([page['objects'] for page in conn.iter_pages('journals')],
+                         self.pages)
+
+
+class ReadAheadTests(unittest.TestCase):
+
+    def test_yields_every_item_in_order(self):
+        self.assertEqual(list(core.read_ahead(iter(range(50)), 3)),
+                         list(range(50)))
+
+    def test_production_is_bounded(self):
+        produced = []
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        reader = core.read_ahead(items(), 2)
+        self.assertEqual(next(reader), 0)
+        # give the producer time to fill up the queue
+        time.sleep(0.3)
+
+        # 1 yielded, 2 queued and 1 waiting to be queued.
+        self.assertTrue(len(produced) <= 4)
+        reader.close()
+
+    def test_errors_are_reraised(self):
+        def items():
+            yield 1
+            raise exceptions.NotFound()
+
+        reader = core.read_ahead(items(), 2)
+        self.assertEqual(next(reader), 1)
+        self.assertRaises(exceptions.NotFound, lambda: next(reader))
+
+    def test_producer_stops_when_reader_is_closed(self):
+        before = threading.active_count()
+
+        def items():
+            i = 0
+            while True:
+                yield i
+                i += 1
+
+        reader = core.read_ahead(items(), 1)
+        next(reader)
+        reader.close()
+        time.sleep(0.5)
 
+        self.assertEqual(threading.active_count(), before)
@@ -0,0 +1,113 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from forest import connectors, exceptions, harvest
+
+
+class InMemoryConnector(connectors.TastyPieConnector):
+    """Serves `total_count` documents from memory, the way Tastypie does.
+    """
+    total_count = 23
+    max_limit = None
+
+    def fetch_data(self, resource_path=None, params=None):
+        limit = int(params['limit'])
+        if self.max_limit is not None:
+            limit = min(limit, self.max_limit)
+        offset = int(params.get('offset', 0))
+        return {'meta': {'limit': limit, 'offset': offset, 'next': None,
+                         'total_count': self.total_count},
+                'objects': [{'id': i, 'path': resource_path}
+                            for i in range(offset, min(offset + limit,
+                                                       self.total_count))]}
+
+
+class CappedConnector(InMemoryConnector):
+    """Caps `limit`, as Tastypie does with `max_limit`.
+    """
+    max_limit = 3
+
+
+class ShrinkingConnector(InMemoryConnector):
+    """Reports more documents than it serves, as if some were deleted.
+    """
+    def fetch_data(self, resource_path=None, params=None):
+        data = super(ShrinkingConnector, self).fetch_data(resource_path, params)
+        data['objects'] = [obj for obj in data['objects'] if obj['id'] < 15]
+        return data
+
+
+class ShardsTests(unittest.TestCase):
+
+    def test_shards_are_aligned_to_pages(self):
+        runner = harvest.ShardedHarvest(InMemoryConnector, 'http://foo.org/api/v1/',
+                                        processes=2, shards_per_process=2)
+        self.assertEqual(runner.shards(23, 5),
+                         [(0, 5), (5, 10), (10, 15), (15, 23)])
+
+    def test_fewer_pages_than_shards(self):
+        runner = harvest.ShardedHarvest(InMemoryConnector, 'http://foo.org/api/v1/',
+                                        processes=4)
+        self.assertEqual(runner.shards(7, 5), [(0, 5), (5, 7)])
+
+    def test_empty_endpoint(self):
+        runner = harvest.ShardedHarvest(InMemoryConnector, 'http://foo.org/api/v1/')
+        self.assertEqual(runner.shards(0, 5), [])
+
+
+class ShardedHarvestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'journals.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_documents_are_merged_in_order(self):
+        runner = harvest.ShardedHarvest(InMemoryConnector, 'http://foo.org/api/v1/',
+                                        connector_kwargs={'items_per_request': 4},
+                                        processes=2)
+        count = runner.run('journals', self.output, params={'collection': 'scl'})
+
+        with open(self.output) as f:
+            docs = [json.loads(line) for line in f]
+
+        self.assertEqual(count, 23)
+        self.assertEqual([doc['id'] for doc in docs], list(range(23)))
+        self.assertEqual(os.listdir(self.tmpdir), ['journals.jsonl'])
+
+    def test_gzip_output(self):
+        output = self.output + '.gz'
+        runner = harvest.ShardedHarvest(InMemoryConnector, 'http://foo.org/api/v1/',
+                                        connector_kwargs={'items_per_request': 4},
+                                        processes=2)
+        runner.run('journals', output)
+
+        with gzip.open(output, 'rb') as f:
+            docs = [json.loads(line.decode('utf-8')) for line in f]
+
+        self.assertEqual([doc['id'] for doc in docs], list(range(23)))
+
+    def test_limit_capped_by_the_api(self):
+        runner = harvest.ShardedHarvest(CappedConnector, 'http://foo.org/api/v1/',
+                                        connector_kwargs={'items_per_request': 10},
+                                        processes=2)
+        count = runner.run('journals', self.output)
+
+        with open(self.output) as f:
+            docs = [json.loads(line) for line in f]
+
+        self.assertEqual(count, 23)
+        self.assertEqual([doc['id'] for doc in docs], list(range(23)))
+
+    def test_missing_documents_raise(self):
+        runner = harvest.ShardedHarvest(ShrinkingConnector, 'http://foo.org/api/v1/',
+                                        connector_kwargs={'items_per_request': 4},
+                                        processes=2)
+        self.assertRaises(exceptions.APIError, runner.run, 'journals', self.output)
+        self.assertEqual(os.listdir(self.tmpdir), [])
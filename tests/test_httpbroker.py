@@ -1,3 +1,4 @@
+import json
 import unittest
 try:
     from unittest import mock
@@ -5,8 +6,9 @@ except ImportError: # PY2
     import mock
 
 import requests
+import urllib3
 
-from forest import httpbroker, exceptions
+from forest import auth, httpbroker, exceptions
 from . import doubles
 
 
@@ -54,6 +56,38 @@ class CheckHttpStatusTests(unittest.TestCase):
         self.assertRaises(exceptions.NotAcceptable,
             lambda: httpbroker.check_http_status(response))
 
+    def test_429_raises_TooManyRequests(self):
+        response = doubles.RequestsResponseStub()
+        response.status_code = 429
+
+        self.assertRaises(exceptions.TooManyRequests,
+            lambda: httpbroker.check_http_status(response))
+
+    def test_retry_after_seconds(self):
+        response = doubles.RequestsResponseStub()
+        response.status_code = 503
+        response.headers = {'Retry-After': '120'}
+
+        try:
+            httpbroker.check_http_status(response)
+        except exceptions.ServiceUnavailable as e:
+            self.assertEqual(e.retry_after, 120.0)
+        else:
+            self.fail('ServiceUnavailable not raised')
+
+    def test_retry_after_http_date(self):
+        response = doubles.RequestsResponseStub()
+        response.headers = {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+        with mock.patch.object(httpbroker.time, 'time', return_value=1445412470):
+            self.assertEqual(httpbroker.parse_retry_after(response), 10)
+
+    def test_invalid_retry_after_is_ignored(self):
+        response = doubles.RequestsResponseStub()
+        response.headers = {'Retry-After': 'soon'}
+
+        self.assertIsNone(httpbroker.parse_retry_after(response))
+
     def test_500_raises_InternalServerError(self):
         response = doubles.RequestsResponseStub()
         response.status_code = 500
@@ -145,6 +179,46 @@ class TranslateExceptionsTests(unittest.TestCase):
             lambda: foo())
 
 
+class TranslateUrllib3ExceptionsTests(unittest.TestCase):
+
+    def assertTranslated(self, error, expected):
+        @httpbroker.translate_exceptions
+        def foo():
+            raise error
+
+        self.assertRaises(expected, foo)
+
+    def test_from_NewConnectionError_to_ConnectionError(self):
+        self.assertTranslated(
+            urllib3.exceptions.NewConnectionError(None, 'refused'),
+            exceptions.ConnectionError)
+
+    def test_from_ProtocolError_to_ConnectionError(self):
+        self.assertTranslated(urllib3.exceptions.ProtocolError('reset'),
+                              exceptions.ConnectionError)
+
+    def test_from_ReadTimeoutError_to_Timeout(self):
+        self.assertTranslated(
+            urllib3.exceptions.ReadTimeoutError(None, '/', 'timed out'),
+            exceptions.Timeout)
+
+    def test_MaxRetryError_is_translated_by_its_reason(self):
+        self.assertTranslated(
+            urllib3.exceptions.MaxRetryError(
+                None, '/', urllib3.exceptions.ConnectTimeoutError('timed out')),
+            exceptions.Timeout)
+
+    def test_from_too_many_redirects_to_HTTPError(self):
+        self.assertTranslated(
+            urllib3.exceptions.MaxRetryError(
+                None, '/', urllib3.exceptions.ResponseError('too many redirects')),
+            exceptions.HTTPError)
+
+    def test_from_other_errors_to_HTTPError(self):
+        self.assertTranslated(urllib3.exceptions.DecodeError(),
+                              exceptions.HTTPError)
+
+
 class PrepareParamsFunctionTests(unittest.TestCase):
 
     def test_sort_dict_by_key(self):
@@ -200,6 +274,117 @@ class GetFunctionTests(unittest.TestCase):
                                        params=None,
                                        verify=False))
 
+    def test_requests_go_through_transport(self):
+        mock_requests = mock.MagicMock()
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+
+        with mock.patch.dict('forest.httpbroker.__dict__', requests=mock_requests):
+            httpbroker.get('http://manager.scielo.org/api/v1/journals/70/',
+                           user_agent='scielo.forest',
+                           transport=transport)
+
+            self.assertFalse(mock_requests.get.called)
+            self.assertEqual(transport.get.call_args,
+                             mock.call('http://manager.scielo.org/api/v1/journals/70/',
+                                       headers={'User-Agent': 'scielo.forest'},
+                                       params=None))
+
+    def test_observer_receives_response_info(self):
+        transport = mock.MagicMock()
+        response = doubles.RequestsResponseStub()
+        response.content = b'{"foo": "bar"}'
+        transport.get.return_value = response
+        observer = mock.MagicMock()
+
+        httpbroker.get('http://manager.scielo.org/api/v1/journals/70/',
+                       transport=transport, observer=observer)
+
+        info = observer.call_args[0][0]
+        self.assertEqual(info.method, 'GET')
+        self.assertEqual(info.url, 'http://manager.scielo.org/api/v1/journals/70/')
+        self.assertEqual(info.status_code, 200)
+        self.assertEqual(info.nbytes, 14)
+        self.assertTrue(info.elapsed >= 0)
+
+    def test_stream_key_decodes_incrementally(self):
+        transport = mock.MagicMock()
+        response = doubles.RequestsResponseStub()
+        response.iter_content = lambda chunk_size: iter([b'{"meta": {}, "objects"',
+                                                         b': [1, 2]}'])
+        response.close = mock.MagicMock()
+        transport.get.return_value = response
+
+        data = httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                              transport=transport, stream_key='objects')
+
+        self.assertEqual(transport.get.call_args[1]['stream'], True)
+        self.assertEqual(data['meta'], {})
+        self.assertFalse(response.close.called)
+        self.assertEqual(list(data['objects']), [1, 2])
+        self.assertTrue(response.close.called)
+
+    def test_stream_errors_are_translated(self):
+        def iter_content(chunk_size):
+            yield b'{"objects": ['
+            raise requests.exceptions.ConnectionError()
+
+        transport = mock.MagicMock()
+        response = doubles.RequestsResponseStub()
+        response.iter_content = iter_content
+        response.close = mock.MagicMock()
+        transport.get.return_value = response
+
+        data = httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                              transport=transport, stream_key='objects')
+
+        self.assertRaises(exceptions.ConnectionError, lambda: list(data['objects']))
+        self.assertTrue(response.close.called)
+
+    def test_observer_receives_decode_time(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        observer = mock.MagicMock()
+
+        httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                       transport=transport, observer=observer)
+
+        info = observer.call_args[0][0]
+        self.assertIsNotNone(info.decode_secs)
+
+    def test_observer_receives_error_responses(self):
+        transport = mock.MagicMock()
+        response = doubles.RequestsResponseStub()
+        response.status_code = 500
+        transport.get.return_value = response
+        observer = mock.MagicMock()
+
+        self.assertRaises(exceptions.InternalServerError,
+            lambda: httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                                   transport=transport, observer=observer))
+
+        info = observer.call_args[0][0]
+        self.assertEqual(info.status_code, 500)
+        self.assertIsNone(info.decode_secs)
+
+    def test_requests_go_through_rate_limiter(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        limiter = mock.MagicMock()
+
+        httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                       transport=transport, rate_limiter=limiter)
+
+        self.assertEqual(limiter.acquire.call_count, 1)
+
+    def test_stream_and_cache_are_mutually_exclusive(self):
+        self.assertRaises(ValueError,
+            lambda: httpbroker.get('http://manager.scielo.org/api/v1/journals/',
+                                   transport=mock.MagicMock(),
+                                   cache=mock.MagicMock(),
+                                   stream_key='objects'))
+
+
 class PostFunctionTests(unittest.TestCase):
 
     def test_user_agent_and_content_type_are_properly_set(self):
@@ -252,6 +437,183 @@ class PostFunctionTests(unittest.TestCase):
                                 data='{"title": "foo"}',
                                 user_agent='scielo.forest'))
 
+    def test_missing_location_header_raises_APIError(self):
+        mock_requests = mock.MagicMock()
+        mock_response = doubles.RequestsResponseStub()
+        mock_response.status_code = 201
+        mock_requests.post.return_value = mock_response
+
+        with mock.patch.dict('forest.httpbroker.__dict__', requests=mock_requests):
+            self.assertRaises(
+                exceptions.APIError,
+                lambda: httpbroker.post('http://manager.scielo.org/api/v1/journals/',
+                                        data='{"title": "foo"}'))
+
+
+    def test_requests_go_through_transport(self):
+        mock_requests = mock.MagicMock()
+        transport = mock.MagicMock()
+        mock_response = doubles.RequestsResponseStub()
+        mock_response.status_code = 201
+        mock_response.headers = {'location': 'http://manager.scielo.org/api/v1/journals/4/'}
+        transport.post.return_value = mock_response
+
+        with mock.patch.dict('forest.httpbroker.__dict__', requests=mock_requests):
+            httpbroker.post('http://manager.scielo.org/api/v1/journals/',
+                            data='{"title": "foo"}',
+                            user_agent='scielo.forest',
+                            transport=transport)
+
+            self.assertFalse(mock_requests.post.called)
+            self.assertTrue(transport.post.called)
+
+
+class PatchListFunctionTests(unittest.TestCase):
+
+    def make_transport(self, status_code=202, content=b''):
+        transport = mock.MagicMock()
+        mock_response = doubles.RequestsResponseStub()
+        mock_response.status_code = status_code
+        mock_response.content = content
+        transport.patch.return_value = mock_response
+        return transport
+
+    def test_objects_are_sent_at_once(self):
+        transport = self.make_transport()
+
+        httpbroker.patch_list('http://manager.scielo.org/api/v1/journals/',
+                              [{'title': 'foo'}, {'title': 'bar'}],
+                              user_agent='scielo.forest',
+                              transport=transport)
+
+        self.assertEqual(transport.patch.call_count, 1)
+        args, kwargs = transport.patch.call_args
+        self.assertEqual(args, ('http://manager.scielo.org/api/v1/journals/',))
+        self.assertEqual(kwargs['headers'],
+                         {'Content-Type': 'application/json',
+                          'User-Agent': 'scielo.forest'})
+        self.assertEqual(json.loads(kwargs['data']),
+                         {'objects': [{'title': 'foo'}, {'title': 'bar'}]})
+
+    def test_empty_response_returns_list_of_None(self):
+        transport = self.make_transport()
+
+        self.assertEqual(
+            httpbroker.patch_list('http://manager.scielo.org/api/v1/journals/',
+                                  [{'title': 'foo'}, {'title': 'bar'}],
+                                  transport=transport),
+            [None, None])
+
+    def test_created_resource_uris_are_returned(self):
+        transport = self.make_transport(
+            status_code=200,
+            content=b'{"objects": [{"resource_uri": "/api/v1/journals/4/"},'
+                    b' {"resource_uri": "/api/v1/journals/5/"}]}')
+
+        self.assertEqual(
+            httpbroker.patch_list('http://manager.scielo.org/api/v1/journals/',
+                                  [{'title': 'foo'}, {'title': 'bar'}],
+                                  transport=transport),
+            ['/api/v1/journals/4/', '/api/v1/journals/5/'])
+
+    def test_unexpected_status_code_raises_APIError(self):
+        transport = self.make_transport(status_code=201)
+
+        self.assertRaises(
+            exceptions.APIError,
+            lambda: httpbroker.patch_list('http://manager.scielo.org/api/v1/journals/',
+                                          [{'title': 'foo'}],
+                                          transport=transport))
+
+
+class PooledTransportTests(unittest.TestCase):
+
+    def test_sessions_are_thread_local(self):
+        import threading
+        transport = httpbroker.PooledTransport()
+        sessions = []
+
+        def grab():
+            sessions.append(transport.session)
+
+        thread = threading.Thread(target=grab)
+        thread.start()
+        thread.join()
+
+        self.assertIs(transport.session, transport.session)
+        self.assertIsNot(transport.session, sessions[0])
+
+    def test_sessions_share_the_same_adapter(self):
+        import threading
+        transport = httpbroker.PooledTransport()
+        sessions = []
+
+        def grab():
+            sessions.append(transport.session)
+
+        thread = threading.Thread(target=grab)
+        thread.start()
+        thread.join()
+
+        self.assertIs(transport.session.get_adapter('http://foo.org/'),
+                      sessions[0].get_adapter('http://foo.org/'))
+
+    def test_pool_maxsize(self):
+        transport = httpbroker.PooledTransport(pool_maxsize=25)
+        adapter = transport.session.get_adapter('http://foo.org/')
+
+        self.assertEqual(adapter._pool_maxsize, 25)
+
+    def test_prewarm_opens_connections_concurrently(self):
+        transport = httpbroker.PooledTransport()
+        session = mock.MagicMock()
+        transport._local = mock.MagicMock(session=session)
+
+        transport.prewarm('http://foo.org/', connections=3)
+
+        self.assertEqual(session.head.call_count, 3)
+
+    def test_prewarm_is_capped_by_pool_maxsize(self):
+        transport = httpbroker.PooledTransport(pool_maxsize=2)
+        session = mock.MagicMock()
+        transport._local = mock.MagicMock(session=session)
+
+        transport.prewarm('http://foo.org/', connections=10)
+
+        self.assertEqual(session.head.call_count, 2)
+
+    def test_prewarm_sends_auth_and_user_agent(self):
+        transport = httpbroker.PooledTransport()
+        session = mock.MagicMock()
+        transport._local = mock.MagicMock(session=session)
+        api_key = auth.ApiKeyAuth('user', 'key')
+
+        transport.prewarm('http://foo.org/', connections=1, auth=api_key,
+                          user_agent='foo')
+
+        self.assertEqual(session.head.call_args,
+                         mock.call('http://foo.org/', auth=api_key,
+                                   headers={'User-Agent': 'foo'}))
+
+    def test_prewarm_sends_the_default_user_agent(self):
+        transport = httpbroker.PooledTransport()
+        session = mock.MagicMock()
+        transport._local = mock.MagicMock(session=session)
+
+        transport.prewarm('http://foo.org/', connections=1)
+
+        self.assertEqual(session.head.call_args,
+                         mock.call('http://foo.org/', headers={
+                             'User-Agent': httpbroker.DEFAULT_USER_AGENT}))
+
+    def test_prewarm_failures_are_ignored(self):
+        transport = httpbroker.PooledTransport()
+        session = mock.MagicMock()
+        session.head.side_effect = requests.exceptions.ConnectionError()
+        transport._local = mock.MagicMock(session=session)
+
+        transport.prewarm('http://foo.org/', connections=1)
+
 
 class MakeFullUrlFunctionTests(unittest.TestCase):
 
@@ -0,0 +1,65 @@
+# coding: utf-8
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import jsoncodecs, httpbroker
+from .test_core import sample_many
+from . import doubles
+
+
+class CodecsTests(unittest.TestCase):
+
+    def test_every_available_codec_roundtrips(self):
+        for codec in jsoncodecs.available_codecs():
+            encoded = codec.dumps(sample_many)
+            if not isinstance(encoded, bytes):
+                encoded = encoded.encode('utf-8')
+
+            self.assertEqual(codec.loads(encoded), sample_many, codec.name)
+
+    def test_stdlib_is_always_available(self):
+        self.assertEqual(jsoncodecs.available_codecs()[-1].name, 'json')
+
+    def test_default_is_the_fastest_available(self):
+        self.assertEqual(jsoncodecs.get_codec().name,
+                         jsoncodecs.available_codecs()[0].name)
+
+    def test_get_codec_by_name(self):
+        self.assertIsInstance(jsoncodecs.get_codec('json'), jsoncodecs.StdlibCodec)
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, lambda: jsoncodecs.get_codec('foo'))
+
+    def test_stdlib_decodes_utf8_bytes(self):
+        codec = jsoncodecs.StdlibCodec()
+        self.assertEqual(codec.loads(u'{"a": "sanit\xe0"}'.encode('utf-8')),
+                         {'a': u'sanit\xe0'})
+
+
+class HttpbrokerCodecTests(unittest.TestCase):
+
+    def test_get_decodes_content_with_codec(self):
+        transport = mock.MagicMock()
+        transport.get.return_value = doubles.RequestsResponseStub()
+        codec = mock.MagicMock()
+        codec.loads.return_value = sample_many
+
+        self.assertEqual(httpbroker.get('http://foo.org/', transport=transport,
+                                        codec=codec),
+                         sample_many)
+        self.assertEqual(codec.loads.call_args, mock.call(b'{"foo": "bar"}'))
+
+    def test_prepare_data_encodes_with_codec(self):
+        codec = mock.MagicMock()
+        codec.dumps.return_value = b'{}'
+
+        self.assertEqual(httpbroker.prepare_data({}, codec=codec), b'{}')
+
+    def test_prepare_data_keeps_strings(self):
+        codec = mock.MagicMock()
+
+        self.assertEqual(httpbroker.prepare_data('{}', codec=codec), '{}')
+        self.assertFalse(codec.dumps.called)
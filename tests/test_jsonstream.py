@@ -0,0 +1,65 @@
+# coding: utf-8
+import json
+import unittest
+
+from forest import jsonstream
+from .test_core import sample_many
+
+
+def chunked(text, size):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamedObjectTests(unittest.TestCase):
+
+    def test_members_before_stream_are_decoded_eagerly(self):
+        doc = jsonstream.StreamedObject(chunked(json.dumps(sample_many), 7),
+                                        'objects')
+
+        self.assertEqual(doc['meta'], sample_many['meta'])
+        self.assertEqual(list(doc['objects']), sample_many['objects'])
+
+    def test_one_byte_chunks(self):
+        text = json.dumps(sample_many, ensure_ascii=False)
+        doc = jsonstream.StreamedObject(chunked(text, 1), 'objects')
+
+        self.assertEqual(list(doc['objects']), sample_many['objects'])
+
+    def test_members_after_stream_are_decoded_at_the_end(self):
+        text = '{"objects": [1, 2], "meta": {"next": null}}'
+        doc = jsonstream.StreamedObject(chunked(text, 3), 'objects')
+
+        self.assertNotIn('meta', doc)
+        self.assertEqual(list(doc['objects']), [1, 2])
+        self.assertEqual(doc['meta'], {'next': None})
+
+    def test_numbers_split_across_chunks(self):
+        doc = jsonstream.StreamedObject(['{"objects": [12', '34, 5', '6]}'],
+                                        'objects')
+
+        self.assertEqual(list(doc['objects']), [1234, 56])
+
+    def test_elements_are_decoded_lazily(self):
+        chunks = iter(['{"objects": [{"a": 1}, ', 'INVALID'])
+        doc = jsonstream.StreamedObject(chunks, 'objects')
+        objects = doc['objects']
+
+        self.assertEqual(next(objects), {'a': 1})
+        self.assertRaises(ValueError, lambda: next(objects))
+
+    def test_empty_stream(self):
+        doc = jsonstream.StreamedObject(['{"objects": [], "total": 0}'], 'objects')
+
+        self.assertEqual(list(doc['objects']), [])
+        self.assertEqual(doc['total'], 0)
+
+    def test_missing_stream_key(self):
+        doc = jsonstream.StreamedObject(['{"meta": {}}'], 'objects')
+
+        self.assertEqual(doc, {'meta': {}})
+
+    def test_truncated_document(self):
+        doc = jsonstream.StreamedObject(['{"objects": [1, 2'], 'objects')
+
+        self.assertRaises(ValueError, lambda: list(doc['objects']))
@@ -0,0 +1,114 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import connectors, lazy, resolver
+
+
+resources = {
+    '/api/v1/issues/1/': {'resource_uri': '/api/v1/issues/1/', 'number': '1'},
+    '/api/v1/issues/2/': {'resource_uri': '/api/v1/issues/2/', 'number': '2',
+                          'journal': '/api/v1/journals/25/'},
+    '/api/v1/journals/25/': {'resource_uri': '/api/v1/journals/25/', 'title': 'foo'},
+    '/api/v1/uselicenses/1044/': {'resource_uri': '/api/v1/uselicenses/1044/',
+                                  'license_code': 'BY'},
+}
+
+journal = {'resource_uri': '/api/v1/journals/25/',
+           'title': 'foo',
+           'issues': ['/api/v1/issues/1/', '/api/v1/issues/2/', '/api/v1/issues/9/'],
+           'pub_status_history': [{'status': 'current'}],
+           'use_license': {'disclaimer': '<p></p>',
+                           'resource_uri': '/api/v1/uselicenses/1044/'}}
+
+
+def get_many(resource_path, ids, batch_size=100):
+    docs = {}
+    for resource_id in ids:
+        uri = '/api/v1/%s/%s/' % (resource_path, resource_id)
+        if uri in resources:
+            docs[resource_id] = resources[uri]
+    return docs
+
+
+class LazyDocumentTests(unittest.TestCase):
+
+    def make_doc(self, doc=journal):
+        conn = mock.MagicMock(api_uri='http://manager.scielo.org/api/v1/')
+        conn.get_many.side_effect = get_many
+        return lazy.LazyDocument(doc, resolver.Resolver(conn))
+
+    def test_plain_fields(self):
+        doc = self.make_doc()
+        self.assertEqual(doc['title'], 'foo')
+        self.assertEqual(doc['resource_uri'], '/api/v1/journals/25/')
+        self.assertFalse(doc._resolver.connector.get_many.called)
+
+    def test_lists_of_uris_are_resolved_in_a_batch(self):
+        doc = self.make_doc()
+        issues = doc['issues']
+
+        self.assertEqual(issues[0]['number'], '1')
+        self.assertIsNone(issues[2])
+        self.assertEqual(doc._resolver.connector.get_many.call_args_list,
+                         [mock.call('issues', ['1', '2', '9'], batch_size=100)])
+
+    def test_resolved_documents_are_lazy_too(self):
+        doc = self.make_doc()
+        self.assertEqual(doc['issues'][1]['journal']['title'], 'foo')
+
+    def test_resolution_is_memoized(self):
+        doc = self.make_doc()
+        doc['issues']
+        doc['issues']
+        other = lazy.LazyDocument(journal, doc._resolver)
+        other['issues']
+
+        self.assertEqual(doc._resolver.connector.get_many.call_count, 1)
+
+    def test_partially_embedded_objects_are_fetched_on_missing_fields(self):
+        doc = self.make_doc()
+        license = doc['use_license']
+
+        self.assertEqual(license['disclaimer'], '<p></p>')
+        self.assertFalse(doc._resolver.connector.get_many.called)
+
+        self.assertEqual(license['license_code'], 'BY')
+        self.assertEqual(doc._resolver.connector.get_many.call_args,
+                         mock.call('uselicenses', ['1044'], batch_size=100))
+
+    def test_missing_fields_of_complete_documents(self):
+        doc = self.make_doc()
+        self.assertRaises(KeyError, lambda: doc['acronym'])
+        self.assertIsNone(doc.get('acronym'))
+
+    def test_nested_lists_of_objects(self):
+        doc = self.make_doc()
+        self.assertEqual(doc['pub_status_history'][0]['status'], 'current')
+
+    def test_mapping_interface_does_not_resolve(self):
+        doc = self.make_doc()
+
+        self.assertEqual(sorted(doc), sorted(journal))
+        self.assertEqual(len(doc), len(journal))
+        self.assertTrue('issues' in doc)
+        self.assertEqual(doc, journal)
+        self.assertFalse(doc._resolver.connector.get_many.called)
+
+
+class TastyPieConnectorLazyTests(unittest.TestCase):
+
+    def test_iter_docs_yields_lazy_documents(self):
+        conn = connectors.TastyPieConnector('http://manager.scielo.org/api/v1/')
+        conn.fetch_data = mock.MagicMock(return_value={
+            'meta': {'next': None, 'limit': 50, 'offset': 0, 'total_count': 1},
+            'objects': [journal]})
+        conn.get_many = mock.MagicMock(side_effect=get_many)
+
+        docs = list(conn.iter_docs('journals', lazy=True))
+
+        self.assertIsInstance(docs[0], lazy.LazyDocument)
+        self.assertEqual(docs[0]['issues'][0]['number'], '1')
+        self.assertIs(conn.resolver, conn.resolver)
@@ -0,0 +1,76 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import metrics
+from forest.httpbroker import ResponseInfo
+
+
+class MetricsTests(unittest.TestCase):
+
+    def make_metrics(self):
+        stats = metrics.Metrics()
+        for i in range(1, 11):
+            stats(ResponseInfo('GET', 'http://foo.org/', 200, i / 10.0, 100,
+                               decode_secs=0.01))
+        stats(ResponseInfo('GET', 'http://foo.org/', 503, 0.05, 0))
+        return stats
+
+    def test_responses_are_aggregated(self):
+        snapshot = self.make_metrics().snapshot()
+
+        self.assertEqual(snapshot['requests'], 11)
+        self.assertEqual(snapshot['bytes'], 1000)
+        self.assertEqual(snapshot['statuses'], {200: 10, 503: 1})
+        self.assertAlmostEqual(snapshot['decode_secs'], 0.1)
+
+    def test_percentiles(self):
+        stats = self.make_metrics()
+
+        self.assertEqual(stats.percentile(50), 0.5)
+        self.assertEqual(stats.percentile(99), 1.0)
+        self.assertEqual(stats.snapshot()['latency_p90'], 0.9)
+
+    def test_percentiles_without_samples(self):
+        self.assertIsNone(metrics.Metrics().percentile(50))
+
+    def test_samples_are_bounded(self):
+        stats = metrics.Metrics(max_samples=2)
+        for elapsed in [10, 1, 2]:
+            stats(ResponseInfo('GET', 'http://foo.org/', 200, elapsed, 1))
+
+        self.assertEqual(stats.percentile(100), 2)
+
+    def test_throughput(self):
+        with mock.patch.object(metrics.time, 'time', return_value=100):
+            stats = metrics.Metrics()
+        stats.record_page(50)
+        stats.record_page(30)
+
+        with mock.patch.object(metrics.time, 'time', return_value=102):
+            snapshot = stats.snapshot()
+
+        self.assertEqual(snapshot['pages_per_sec'], 1)
+        self.assertEqual(snapshot['docs_per_sec'], 40)
+
+    def test_count(self):
+        stats = metrics.Metrics()
+        self.assertEqual(list(stats.count(iter([1, 2, 3]))), [1, 2, 3])
+        self.assertEqual((stats.pages, stats.docs), (1, 3))
+
+    def test_reset(self):
+        stats = self.make_metrics()
+        stats.reset()
+        self.assertEqual(stats.snapshot()['requests'], 0)
+
+    def test_render(self):
+        stats = self.make_metrics()
+        stats.record_retry()
+        text = stats.render()
+
+        self.assertIn('forest_requests 11\n', text)
+        self.assertIn('forest_retries 1\n', text)
+        self.assertIn('forest_responses{status="503"} 1\n', text)
+        self.assertIn('forest_latency_secs{quantile="0.50"} 0.5\n', text)
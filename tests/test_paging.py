@@ -0,0 +1,51 @@
+import unittest
+
+from forest import paging
+
+
+class AdaptivePageSizeTests(unittest.TestCase):
+
+    def test_initial_size(self):
+        self.assertEqual(paging.AdaptivePageSize(initial=30).size, 30)
+
+    def test_initial_size_is_clamped(self):
+        self.assertEqual(paging.AdaptivePageSize(initial=5, min_size=10).size, 10)
+
+    def test_grows_when_server_is_fast(self):
+        sizer = paging.AdaptivePageSize(initial=50, target_secs=1.0)
+        sizer.observe(50, 0.1, 5000)
+
+        self.assertEqual(sizer.size, 100)
+
+    def test_shrinks_when_server_is_slow(self):
+        sizer = paging.AdaptivePageSize(initial=100, target_secs=1.0)
+        sizer.observe(100, 4.0, 5000)
+
+        self.assertEqual(sizer.size, 50)
+
+    def test_converges_to_target(self):
+        sizer = paging.AdaptivePageSize(initial=50, target_secs=1.0)
+        for _ in range(10):
+            # 10ms per item
+            sizer.observe(sizer.size, sizer.size * 0.01, 1000)
+
+        self.assertEqual(sizer.size, 100)
+
+    def test_bounded_by_max_size(self):
+        sizer = paging.AdaptivePageSize(initial=50, max_size=60)
+        sizer.observe(50, 0.01, 5000)
+
+        self.assertEqual(sizer.size, 60)
+
+    def test_bounded_by_max_bytes(self):
+        sizer = paging.AdaptivePageSize(initial=50, max_bytes=40000)
+        # 1KB per item
+        sizer.observe(50, 0.01, 50000)
+
+        self.assertEqual(sizer.size, 40)
+
+    def test_empty_pages_are_ignored(self):
+        sizer = paging.AdaptivePageSize(initial=50)
+        sizer.observe(0, 0.01, 100)
+
+        self.assertEqual(sizer.size, 50)
@@ -0,0 +1,69 @@
+# coding: utf-8
+import unittest
+
+from forest import query
+
+
+class FilterParamsTests(unittest.TestCase):
+
+    def test_dict(self):
+        self.assertEqual(query.filter_params({'title__startswith': 'A',
+                                              'acronym': 'aiss'}),
+                         [('acronym', 'aiss'), ('title__startswith', 'A')])
+
+    def test_sequences_are_joined(self):
+        self.assertEqual(query.filter_params({'id__in': [1, 2, 3]}),
+                         [('id__in', '1,2,3')])
+
+    def test_booleans(self):
+        self.assertEqual(query.filter_params([('is_trashed', False)]),
+                         [('is_trashed', 'false')])
+
+
+class MergeParamsTests(unittest.TestCase):
+
+    def test_None(self):
+        self.assertEqual(query.merge_params(None, [('a', 1)]), {'a': 1})
+
+    def test_nothing_to_merge(self):
+        params = {'a': 1}
+        self.assertIs(query.merge_params(params, []), params)
+
+    def test_dict_is_copied(self):
+        params = {'a': 1}
+        self.assertEqual(query.merge_params(params, [('b', 2)]), {'a': 1, 'b': 2})
+        self.assertEqual(params, {'a': 1})
+
+    def test_list_of_pairs(self):
+        self.assertEqual(query.merge_params([('a', 1)], [('b', 2)]),
+                         [('a', 1), ('b', 2)])
+
+
+class ProjectionTests(unittest.TestCase):
+    doc = {'id': 1, 'title': 'foo', 'issues': ['/api/v1/issues/1/'],
+           'use_license': {'disclaimer': '<p></p>', 'resource_uri': '/u/1/'},
+           'history': [{'date': '2010', 'status': 'current'},
+                       {'date': '2011', 'status': 'deceased'}]}
+
+    def test_top_level_fields(self):
+        project = query.Projection(['id', 'title'])
+        self.assertEqual(project(self.doc), {'id': 1, 'title': 'foo'})
+
+    def test_missing_fields_are_omitted(self):
+        project = query.Projection(['id', 'acronym'])
+        self.assertEqual(project(self.doc), {'id': 1})
+
+    def test_nested_fields(self):
+        project = query.Projection(['use_license.disclaimer'])
+        self.assertEqual(project(self.doc), {'use_license': {'disclaimer': '<p></p>'}})
+
+    def test_nested_fields_of_lists(self):
+        project = query.Projection(['history.status'])
+        self.assertEqual(project(self.doc),
+                         {'history': [{'status': 'current'}, {'status': 'deceased'}]})
+
+    def test_whole_parent_wins(self):
+        for fields in [['use_license', 'use_license.disclaimer'],
+                       ['use_license.disclaimer', 'use_license']]:
+            project = query.Projection(fields)
+            self.assertEqual(project(self.doc), {'use_license': self.doc['use_license']})
@@ -0,0 +1,70 @@
+import threading
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import ratelimit
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def make_bucket(self, rate, burst=1, now=100.0):
+        with mock.patch.object(ratelimit.time, 'time', return_value=now):
+            return ratelimit.TokenBucket(rate, burst=burst)
+
+    def reserve(self, bucket, now):
+        with mock.patch.object(ratelimit.time, 'time', return_value=now):
+            return bucket.reserve()
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, lambda: ratelimit.TokenBucket(0))
+        self.assertRaises(ValueError, lambda: ratelimit.TokenBucket(1, burst=0))
+
+    def test_burst_is_served_without_waiting(self):
+        bucket = self.make_bucket(rate=1, burst=3)
+        self.assertEqual([self.reserve(bucket, 100.0) for _ in range(3)],
+                         [0.0, 0.0, 0.0])
+
+    def test_waiting_callers_are_queued(self):
+        bucket = self.make_bucket(rate=2, burst=1)
+        self.assertEqual([self.reserve(bucket, 100.0) for _ in range(3)],
+                         [0.0, 0.5, 1.0])
+
+    def test_tokens_are_refilled_over_time(self):
+        bucket = self.make_bucket(rate=2, burst=1)
+        self.reserve(bucket, 100.0)
+        self.assertEqual(self.reserve(bucket, 100.5), 0.0)
+
+    def test_refill_is_capped_by_burst(self):
+        bucket = self.make_bucket(rate=1, burst=2)
+        self.assertEqual([self.reserve(bucket, 1000.0) for _ in range(3)],
+                         [0.0, 0.0, 1.0])
+
+    def test_acquire_sleeps(self):
+        bucket = self.make_bucket(rate=4, burst=1, now=100.0)
+        with mock.patch.object(ratelimit.time, 'time', return_value=100.0), \
+                mock.patch.object(ratelimit.time, 'sleep') as mock_sleep:
+            bucket.acquire()
+            bucket.acquire()
+
+        self.assertEqual(mock_sleep.call_args_list, [mock.call(0.25)])
+
+    def test_stats(self):
+        bucket = self.make_bucket(rate=2, burst=1)
+        for _ in range(3):
+            self.reserve(bucket, 100.0)
+
+        self.assertEqual(bucket.stats(), {'acquired': 3, 'throttled': 2,
+                                          'waited': 1.5, 'avg_wait': 0.5})
+
+    def test_shared_by_threads(self):
+        bucket = ratelimit.TokenBucket(rate=1000, burst=1000)
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(bucket.stats()['acquired'], 20)
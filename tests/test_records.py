@@ -0,0 +1,88 @@
+import pickle
+import unittest
+
+from forest import compat, records
+
+
+class RecordTests(unittest.TestCase):
+
+    def make_record(self):
+        cls = records.record_class(('id', 'title', 'acronym'))
+        return cls([1, 'foo', records.MISSING])
+
+    def test_mapping_interface(self):
+        record = self.make_record()
+
+        self.assertEqual(record['title'], 'foo')
+        self.assertEqual(record.get('acronym', 'x'), 'x')
+        self.assertTrue('id' in record)
+        self.assertFalse('acronym' in record)
+        self.assertEqual(list(record), ['id', 'title'])
+        self.assertEqual(len(record), 2)
+        self.assertEqual(record.items(), [('id', 1), ('title', 'foo')])
+        self.assertIsInstance(record, compat.Mapping)
+        self.assertRaises(KeyError, lambda: record['acronym'])
+
+    def test_attribute_access(self):
+        record = self.make_record()
+        self.assertEqual(record.title, 'foo')
+        self.assertRaises(AttributeError, lambda: record.acronym)
+
+    def test_equality_with_dicts(self):
+        record = self.make_record()
+        self.assertEqual(record, {'id': 1, 'title': 'foo'})
+        self.assertNotEqual(record, {'id': 1})
+
+    def test_classes_are_shared_by_schema(self):
+        self.assertIs(records.record_class(('a', 'b')),
+                      records.record_class(('a', 'b')))
+
+    def test_pickle(self):
+        record = self.make_record()
+        self.assertEqual(pickle.loads(pickle.dumps(record, 2)), record)
+
+
+class CompactorTests(unittest.TestCase):
+
+    docs = [{'id': 1, 'status': 'current', 'issues': ['/api/v1/issues/1/'],
+             'use_license': {'code': 'BY', 'resource_uri': '/api/v1/uselicenses/1/'},
+             'history': [{'status': 'current'}]},
+            {'id': 2, 'status': 'current', 'acronym': 'foo', 'issues': []}]
+
+    def test_schema_is_inferred_from_the_page(self):
+        first, second = records.Compactor().compact_page(self.docs)
+
+        self.assertIs(type(first), type(second))
+        self.assertFalse('acronym' in first)
+        self.assertEqual(second['acronym'], 'foo')
+
+    def test_schema_is_extended(self):
+        compactor = records.Compactor()
+        first = compactor.compact({'id': 1})
+        second = compactor.compact({'id': 2, 'title': 'foo'})
+
+        self.assertEqual(first, {'id': 1})
+        self.assertEqual(second, {'id': 2, 'title': 'foo'})
+
+    def test_nested_values(self):
+        record = list(records.Compactor().compact_page(self.docs))[0]
+
+        self.assertEqual(record['issues'], ('/api/v1/issues/1/',))
+        self.assertEqual(record['use_license'].code, 'BY')
+        self.assertEqual(record['history'][0]['status'], 'current')
+
+    def test_to_dict_roundtrip(self):
+        compacted = list(records.Compactor().compact_page(self.docs))
+        self.assertEqual([record.to_dict() for record in compacted], self.docs)
+
+    def test_repeated_strings_are_interned(self):
+        docs = [{'status': ''.join(['curr', 'ent'])} for _ in range(2)]
+        first, second = records.Compactor().compact_page(docs)
+
+        self.assertIs(first['status'], second['status'])
+
+    def test_long_strings_are_not_interned(self):
+        docs = [{'title': ''.join(['x' * 10, 'y'])} for _ in range(2)]
+        first, second = records.Compactor(intern_max_length=5).compact_page(docs)
+
+        self.assertIsNot(first['title'], second['title'])
@@ -0,0 +1,85 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import resolver
+
+
+def make_get_many(missing=()):
+    def get_many(resource_path, ids, batch_size=100):
+        return dict((i, {'resource_uri': '/api/v1/%s/%s/' % (resource_path, i)})
+                    for i in ids if i not in missing)
+    return get_many
+
+
+class ResolverTests(unittest.TestCase):
+
+    def make_resolver(self, missing=()):
+        conn = mock.MagicMock()
+        conn.get_many.side_effect = make_get_many(missing)
+        return resolver.Resolver(conn, batch_size=10)
+
+    def test_uris_are_grouped_by_endpoint_and_deduplicated(self):
+        res = self.make_resolver()
+        resolved = res.resolve(['/api/v1/issues/1/', '/api/v1/issues/2/',
+                                '/api/v1/sections/7/', '/api/v1/issues/1/'])
+
+        self.assertEqual(resolved['/api/v1/sections/7/'],
+                         {'resource_uri': '/api/v1/sections/7/'})
+        self.assertEqual(res.connector.get_many.call_args_list,
+                         [mock.call('issues', ['1', '2'], batch_size=10),
+                          mock.call('sections', ['7'], batch_size=10)])
+
+    def test_results_are_memoized(self):
+        res = self.make_resolver(missing=['3'])
+        res.resolve(['/api/v1/issues/1/', '/api/v1/issues/3/'])
+        resolved = res.resolve(['/api/v1/issues/1/', '/api/v1/issues/3/',
+                                '/api/v1/issues/4/'])
+
+        self.assertIsNone(resolved['/api/v1/issues/3/'])
+        self.assertEqual(res.connector.get_many.call_args_list[1],
+                         mock.call('issues', ['4'], batch_size=10))
+        self.assertEqual(len(res), 3)
+
+    def test_expand(self):
+        res = self.make_resolver()
+        docs = [{'id': 1, 'issues': ['/api/v1/issues/1/'],
+                 'use_license': '/api/v1/uselicenses/5/'},
+                {'id': 2, 'issues': ['/api/v1/issues/2/', '/api/v1/issues/1/']}]
+
+        expanded = res.expand(docs, ['issues', 'use_license'])
+
+        self.assertEqual(expanded[1]['issues'],
+                         [{'resource_uri': '/api/v1/issues/2/'},
+                          {'resource_uri': '/api/v1/issues/1/'}])
+        self.assertEqual(expanded[0]['use_license'],
+                         {'resource_uri': '/api/v1/uselicenses/5/'})
+        self.assertEqual(docs[0]['issues'], ['/api/v1/issues/1/'])
+        self.assertEqual(res.connector.get_many.call_count, 2)
+
+    def test_iter_expanded_resolves_each_window_at_once(self):
+        res = self.make_resolver()
+        docs = [{'issues': ['/api/v1/issues/%s/' % i]} for i in range(5)]
+
+        expanded = list(res.iter_expanded(iter(docs), ['issues'], window=2))
+
+        self.assertEqual(len(expanded), 5)
+        self.assertEqual(res.connector.get_many.call_count, 3)
+
+
+class SplitResourceUriTests(unittest.TestCase):
+
+    def test_relative_uri(self):
+        self.assertEqual(resolver.split_resource_uri('/api/v1/issues/1420/'),
+                         ('issues', '1420'))
+
+    def test_absolute_uri(self):
+        self.assertEqual(
+            resolver.split_resource_uri('http://foo.org/api/v1/issues/1420/'),
+            ('issues', '1420'))
+
+    def test_invalid_uri(self):
+        self.assertRaises(ValueError,
+                          lambda: resolver.split_resource_uri('/issues/'))
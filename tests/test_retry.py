@@ -0,0 +1,151 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import retry, exceptions
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def test_linear_backoff_by_default(self):
+        policy = retry.RetryPolicy(backoff_factor=0.5)
+        self.assertEqual([policy.backoff(i) for i in range(4)],
+                         [0.0, 0.5, 1.0, 1.5])
+
+    def test_exponential_backoff(self):
+        policy = retry.RetryPolicy(backoff_factor=0.5, exponential=True)
+        self.assertEqual([policy.backoff(i) for i in range(4)],
+                         [0.5, 1.0, 2.0, 4.0])
+
+    def test_backoff_is_capped(self):
+        policy = retry.RetryPolicy(backoff_factor=1, exponential=True,
+                                   max_backoff=3)
+        self.assertEqual(policy.backoff(10), 3)
+
+    def test_jitter_stays_within_backoff(self):
+        policy = retry.RetryPolicy(backoff_factor=1, exponential=True,
+                                   jitter=True)
+        waits = [policy.backoff(3) for _ in range(100)]
+
+        self.assertTrue(all(0 <= wait <= 8 for wait in waits))
+        self.assertTrue(len(set(waits)) > 1)
+
+    def test_retry_after_is_honored(self):
+        policy = retry.RetryPolicy(backoff_factor=1)
+        error = exceptions.ServiceUnavailable()
+        error.retry_after = 7.0
+
+        self.assertEqual(policy.backoff(1, error), 7.0)
+
+    def test_retry_after_is_capped(self):
+        policy = retry.RetryPolicy(max_backoff=10)
+        error = exceptions.TooManyRequests()
+        error.retry_after = 3600.0
+
+        self.assertEqual(policy.backoff(1, error), 10)
+
+    def test_retry_after_can_be_ignored(self):
+        policy = retry.RetryPolicy(backoff_factor=1, respect_retry_after=False)
+        error = exceptions.ServiceUnavailable()
+        error.retry_after = 7.0
+
+        self.assertEqual(policy.backoff(1, error), 1)
+
+    def test_retryable_errors(self):
+        policy = retry.RetryPolicy()
+        for error in [exceptions.ConnectionError(), exceptions.Timeout(),
+                      exceptions.BadGateway(), exceptions.ServiceUnavailable(),
+                      exceptions.TooManyRequests()]:
+            self.assertTrue(policy.should_retry(0, error))
+
+    def test_non_retryable_errors(self):
+        policy = retry.RetryPolicy()
+        for error in [exceptions.NotFound(), exceptions.BadRequest(),
+                      exceptions.CircuitOpen()]:
+            self.assertFalse(policy.should_retry(0, error))
+
+    def test_max_retries(self):
+        policy = retry.RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry(1, exceptions.Timeout()))
+        self.assertFalse(policy.should_retry(2, exceptions.Timeout()))
+
+    def test_budget_limits_retries(self):
+        budget = retry.RetryBudget(ratio=0.5, min_retries=1)
+        policy = retry.RetryPolicy(budget=budget)
+
+        self.assertTrue(policy.should_retry(0, exceptions.Timeout()))
+        self.assertFalse(policy.should_retry(0, exceptions.Timeout()))
+
+        policy.on_request()
+        policy.on_request()
+        self.assertTrue(policy.should_retry(0, exceptions.Timeout()))
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def test_closed_by_default(self):
+        breaker = retry.CircuitBreaker()
+        breaker.before_request('http://foo.org/api/')
+        self.assertEqual(breaker.state('http://foo.org/api/'), 'closed')
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = retry.CircuitBreaker(failure_threshold=2)
+        breaker.record_failure('http://foo.org/api/a/')
+        breaker.record_failure('http://foo.org/api/b/')
+
+        self.assertEqual(breaker.state('http://foo.org/'), 'open')
+        self.assertRaises(exceptions.CircuitOpen,
+                          lambda: breaker.before_request('http://foo.org/api/'))
+
+    def test_circuits_are_per_host(self):
+        breaker = retry.CircuitBreaker(failure_threshold=1)
+        breaker.record_failure('http://foo.org/api/')
+
+        breaker.before_request('http://bar.org/api/')
+
+    def test_success_resets_failures(self):
+        breaker = retry.CircuitBreaker(failure_threshold=2)
+        breaker.record_failure('http://foo.org/api/')
+        breaker.record_success('http://foo.org/api/')
+        breaker.record_failure('http://foo.org/api/')
+
+        self.assertEqual(breaker.state('http://foo.org/api/'), 'closed')
+
+    def test_half_open_lets_a_single_trial_through(self):
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        with mock.patch.object(retry.time, 'time', return_value=100):
+            breaker.record_failure('http://foo.org/api/')
+
+        with mock.patch.object(retry.time, 'time', return_value=111):
+            self.assertEqual(breaker.state('http://foo.org/api/'), 'half-open')
+            breaker.before_request('http://foo.org/api/')
+            self.assertRaises(exceptions.CircuitOpen,
+                              lambda: breaker.before_request('http://foo.org/api/'))
+
+            breaker.record_success('http://foo.org/api/')
+            self.assertEqual(breaker.state('http://foo.org/api/'), 'closed')
+
+    def test_failed_trial_opens_again(self):
+        breaker = retry.CircuitBreaker(failure_threshold=3, reset_timeout=10)
+        with mock.patch.object(retry.time, 'time', return_value=100):
+            for _ in range(3):
+                breaker.record_failure('http://foo.org/api/')
+
+        with mock.patch.object(retry.time, 'time', return_value=111):
+            breaker.before_request('http://foo.org/api/')
+            breaker.record_failure('http://foo.org/api/')
+            self.assertEqual(breaker.state('http://foo.org/api/'), 'open')
+
+    def test_released_trial_lets_another_one_through(self):
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        with mock.patch.object(retry.time, 'time', return_value=100):
+            breaker.record_failure('http://foo.org/api/')
+
+        with mock.patch.object(retry.time, 'time', return_value=111):
+            self.assertTrue(breaker.before_request('http://foo.org/api/'))
+            breaker.release('http://foo.org/api/')
+
+            self.assertEqual(breaker.state('http://foo.org/api/'), 'half-open')
+            self.assertTrue(breaker.before_request('http://foo.org/api/'))
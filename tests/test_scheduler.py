@@ -0,0 +1,168 @@
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError: # PY2
+    import mock
+
+from forest import connectors, core, exceptions, scheduler
+from .test_connectors import make_keyset_pages, make_pages
+
+
+def make_connector(total_count, limit, delay=0):
+    conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                        items_per_request=limit)
+    fetch = make_pages(total_count, limit)
+
+    def fake_fetch_data(resource_path=None, params=None):
+        time.sleep(delay)
+        return fetch(resource_path, params)
+
+    conn.fetch_data = mock.MagicMock(side_effect=fake_fetch_data)
+    return conn
+
+
+class FollowingConnector(core.Connector):
+    """Follows `next` offsets, one page at a time.
+    """
+    def __get_docs__(self, data):
+        return data['objects']
+
+    def __resumption_resource_path__(self, data):
+        if data['meta']['next'] is None:
+            raise ValueError('Missing resumption resource path')
+        return 'journals', {'offset': [str(data['meta']['offset'] +
+                                           data['meta']['limit'])]}
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def test_documents_of_each_job_are_in_order(self):
+        journals = scheduler.Job(make_connector(7, 2), 'journals')
+        articles = scheduler.Job(make_connector(23, 3), 'articles')
+
+        docs = {}
+        jobs = scheduler.Scheduler([journals, articles], max_concurrency=3).run(
+            lambda job, doc: docs.setdefault(job.name, []).append(doc['id']))
+
+        self.assertEqual(docs, {'journals': list(range(7)),
+                                'articles': list(range(23))})
+        self.assertTrue(all(job.done for job in jobs))
+        self.assertEqual(articles.total_count, 23)
+        self.assertEqual(articles.pages, 8)
+        self.assertEqual(articles.progress(), 1.0)
+
+    def test_job_is_done_when_its_last_page_filled_the_last_slot(self):
+        journals = scheduler.Job(make_connector(4, 2), 'journals')
+        scheduler.Scheduler([journals], max_concurrency=1).run()
+
+        self.assertTrue(journals.done)
+        self.assertEqual(journals.docs, 4)
+
+    def test_small_jobs_do_not_wait_for_large_ones(self):
+        articles = scheduler.Job(make_connector(1000, 10, delay=0.001), 'articles')
+        journals = scheduler.Job(make_connector(4, 2, delay=0.001), 'journals')
+
+        order = [job.name for job, _ in
+                 scheduler.Scheduler([articles, journals], max_concurrency=2).iter_docs()]
+
+        self.assertEqual(order.count('journals'), 4)
+        last_journal = len(order) - order[::-1].index('journals')
+        self.assertLess(last_journal, 100)
+
+    def test_concurrency_is_capped(self):
+        lock = threading.Lock()
+        state = {'current': 0, 'max': 0}
+
+        def make_counting(total_count, limit):
+            conn = make_connector(total_count, limit)
+            fetch = conn.fetch_data.side_effect
+
+            def counting(*args):
+                with lock:
+                    state['current'] += 1
+                    state['max'] = max(state['max'], state['current'])
+                time.sleep(0.002)
+                try:
+                    return fetch(*args)
+                finally:
+                    with lock:
+                        state['current'] -= 1
+
+            conn.fetch_data.side_effect = counting
+            return conn
+
+        jobs = [scheduler.Job(make_counting(50, 2), name) for name in 'abc']
+        scheduler.Scheduler(jobs, max_concurrency=3).run()
+
+        self.assertLessEqual(state['max'], 3)
+        self.assertEqual([job.docs for job in jobs], [50, 50, 50])
+
+    def test_connectors_without_page_offsets_follow_next(self):
+        conn = FollowingConnector('http://api.foo.com/api/v1/', items_per_request=2)
+        conn.fetch_data = mock.MagicMock(side_effect=make_pages(5, 2))
+        job = scheduler.Job(conn, 'journals')
+
+        docs = [doc['id'] for _, doc in scheduler.Scheduler([job]).iter_docs()]
+
+        self.assertEqual(docs, list(range(5)))
+        self.assertEqual(job.total_count, 5)
+
+    def test_keyset_pagination_follows_next(self):
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            items_per_request=2,
+                                            pagination='keyset')
+        conn.fetch_data = mock.MagicMock(side_effect=make_keyset_pages([2, 4, 6, 8, 10], 2))
+        job = scheduler.Job(conn, 'journals')
+
+        docs = [doc['id'] for _, doc in scheduler.Scheduler([job]).iter_docs()]
+
+        self.assertEqual(docs, [2, 4, 6, 8, 10])
+        self.assertEqual(conn.fetch_data.call_count, 3)
+
+    def test_failed_jobs_do_not_stop_the_others(self):
+        failing = make_connector(10, 2)
+        failing.fetch_data.side_effect = exceptions.ServiceUnavailable()
+        broken = scheduler.Job(failing, 'broken')
+        journals = scheduler.Job(make_connector(7, 2), 'journals')
+
+        docs = []
+        with self.assertRaises(exceptions.ServiceUnavailable):
+            for job, doc in scheduler.Scheduler([broken, journals]).iter_docs():
+                docs.append(doc['id'])
+
+        self.assertEqual(docs, list(range(7)))
+        self.assertFalse(broken.done)
+        self.assertTrue(journals.done)
+
+    def test_progress_is_reported(self):
+        reported = []
+        job = scheduler.Job(make_connector(6, 2), 'journals')
+        sched = scheduler.Scheduler([job], on_progress=lambda job: reported.append(job.docs))
+        sched.run()
+
+        self.assertEqual(reported, [2, 4, 6])
+        self.assertEqual(sched.progress(), {'journals': {
+            'docs': 6, 'pages': 3, 'total_count': 6, 'progress': 1.0, 'done': True}})
+
+    def test_fields_and_filters_are_passed_on(self):
+        conn = make_connector(2, 2)
+        job = scheduler.Job(conn, 'journals', fields=['id'],
+                            filters={'collection': 'scl'})
+        scheduler.Scheduler([job]).run()
+
+        conn.fetch_data.assert_called_once_with(
+            'journals', {'collection': 'scl', 'limit': 2})
+
+
+class JobTests(unittest.TestCase):
+
+    def test_progress_is_unknown_without_total_count(self):
+        job = scheduler.Job(mock.Mock(), 'journals')
+        self.assertIsNone(job.progress())
+
+    def test_progress(self):
+        job = scheduler.Job(mock.Mock(), 'journals')
+        job.total_count, job.docs = 8, 2
+        self.assertEqual(job.progress(), 0.25)
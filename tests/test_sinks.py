@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from forest import jsoncodecs, records, sinks
+from forest.lazy import LazyDocument
+
+
+class JsonLinesSinkTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'journals.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_lines(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+    def test_writes_one_document_per_line(self):
+        docs = [{'id': i} for i in range(10)]
+        with sinks.JsonLinesSink(self.path, buffer_size=16) as sink:
+            self.assertEqual(sink.consume(docs), 10)
+
+        self.assertEqual(self.read_lines(self.path), docs)
+
+    def test_path_is_only_replaced_on_close(self):
+        with open(self.path, 'w') as f:
+            f.write('previous\n')
+
+        sink = sinks.JsonLinesSink(self.path)
+        sink.open()
+        sink.write({'id': 1})
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'previous\n')
+
+        self.assertEqual(sink.close(), 1)
+        self.assertEqual(self.read_lines(self.path), [{'id': 1}])
+        self.assertEqual(os.listdir(self.tmpdir), ['journals.jsonl'])
+
+    def test_exceptions_discard_the_temporary_file(self):
+        def docs():
+            yield {'id': 1}
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            with sinks.JsonLinesSink(self.path) as sink:
+                sink.consume(docs())
+
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_gzip_is_inferred_from_path(self):
+        path = self.path + '.gz'
+        sinks.export([{'id': 1}, {'id': 2}], path)
+
+        self.assertEqual(self.read_lines(path), [{'id': 1}, {'id': 2}])
+
+    def test_stdlib_codec(self):
+        sinks.export([{'title': 'Annali'}], self.path,
+                     codec=jsoncodecs.StdlibCodec())
+
+        self.assertEqual(self.read_lines(self.path), [{'title': 'Annali'}])
+
+    def test_records_and_lazy_documents_are_written_as_documents(self):
+        compactor = records.Compactor()
+        record = compactor.compact({'id': 1, 'issues': ['/api/v1/issues/1/']})
+        lazy = LazyDocument({'id': 2, 'issue': '/api/v1/issues/1/'}, mock.Mock())
+
+        sinks.export([record, lazy], self.path)
+
+        self.assertEqual(self.read_lines(self.path),
+                         [{'id': 1, 'issues': ['/api/v1/issues/1/']},
+                          {'id': 2, 'issue': '/api/v1/issues/1/'}])
+
+    def test_write_errors_are_raised_to_the_producer(self):
+        sink = sinks.JsonLinesSink(self.path, buffer_size=1)
+        sink.open()
+        sink._file = mock.Mock(**{'write.side_effect': IOError('disk full')})
+
+        with self.assertRaises(IOError):
+            for i in range(100):
+                sink.write({'id': i})
+            sink.close()
+
+        sink.abort()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_close_after_a_write_error_cleans_up(self):
+        sink = sinks.JsonLinesSink(self.path, buffer_size=1)
+        sink.open()
+        sink._file = mock.Mock(**{'write.side_effect': IOError('disk full')})
+        sink.write({'id': 1})
+        while sink._error is None:
+            time.sleep(0.001)
+
+        self.assertRaises(IOError, sink.close)
+        self.assertIsNone(sink._thread)
+        self.assertTrue(sink._raw.closed)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_backpressure_blocks_the_producer(self):
+        unblock = threading.Event()
+        sink = sinks.JsonLinesSink(self.path, buffer_size=1, max_pending=2)
+        sink.open()
+        sink._file = mock.Mock(**{'write.side_effect': lambda chunk: unblock.wait()})
+
+        producer = threading.Thread(
+            target=sink.consume, args=([{'id': i} for i in range(10)],))
+        producer.start()
+        producer.join(0.2)
+
+        # one batch being written, two pending and one waiting to be queued.
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(sink.count, 4)
+
+        unblock.set()
+        producer.join()
+        self.assertEqual(sink.count, 10)
+        sink.abort()
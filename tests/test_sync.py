@@ -0,0 +1,204 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from urllib.parse import urlencode
+except ImportError: # PY2
+    from urllib import urlencode
+from forest import connectors, sync, transports
+
+
+class FileWatermarkStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'watermarks.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_file(self):
+        self.assertIsNone(sync.FileWatermarkStore(self.path).get('journals'))
+
+    def test_set_and_get(self):
+        store = sync.FileWatermarkStore(self.path)
+        store.set('journals', '2014-01-01T00:00:00')
+        store.set('issues', '2014-02-01T00:00:00')
+
+        store = sync.FileWatermarkStore(self.path)
+        self.assertEqual(store.get('journals'), '2014-01-01T00:00:00')
+        self.assertEqual(store.get('issues'), '2014-02-01T00:00:00')
+
+
+class FakeStore(object):
+    def __init__(self, marks=None):
+        self.marks = marks or {}
+
+    def get(self, name):
+        return self.marks.get(name)
+
+    def set(self, name, value):
+        self.marks[name] = value
+
+
+class FakeResource(object):
+    """Tastypie resource over `docs`, that understands `order_by`, `limit`,
+    `offset` and the `exact`, `gt` and `gte` filters. Other params are
+    ignored.
+    """
+    def __init__(self, docs):
+        self.docs = docs
+        self.on_page = None
+
+    def matches(self, doc, key, value):
+        field, _, lookup = key.partition('__')
+        if field not in doc:
+            return True
+        expected = type(doc[field])(value)
+        if lookup == 'gt':
+            return doc[field] > expected
+        if lookup == 'gte':
+            return doc[field] >= expected
+        return doc[field] == expected
+
+    def __call__(self, request):
+        limit, offset, order_by, filters = 2, 0, [], []
+        for key, value in request.params:
+            values = value if isinstance(value, list) else [value]
+            if key == 'limit':
+                limit = int(values[0])
+            elif key == 'offset':
+                offset = int(values[0])
+            elif key == 'order_by':
+                order_by.extend(values)
+            else:
+                filters.append((key, values[0]))
+
+        docs = [doc for doc in self.docs
+                if all(self.matches(doc, key, value) for key, value in filters)]
+        docs.sort(key=lambda doc: [doc[field] for field in order_by])
+        page = [dict(doc) for doc in docs[offset:offset + limit]]
+        uri_next = None
+        if offset + limit < len(docs):
+            query = [(key, value) for key, value in request.params
+                     if key != 'offset'] + [('offset', offset + limit)]
+            uri_next = '/api/v1/journals/?' + urlencode(query, doseq=True)
+
+        if self.on_page is not None:
+            self.on_page(page)
+        return 200, {'meta': {'limit': limit, 'offset': offset, 'next': uri_next,
+                              'total_count': len(docs)},
+                     'objects': page}
+
+
+class DeltaSyncTests(unittest.TestCase):
+
+    def setUp(self):
+        self.resource = FakeResource([
+            {'id': 1, 'updated': '2014-01-03T00:00:00'},
+            {'id': 2, 'updated': '2014-01-05T00:00:00'},
+            {'id': 3, 'updated': '2014-01-04T00:00:00'}])
+        self.transport = transports.FakeTransport(self.resource)
+        self.conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                                 items_per_request=2,
+                                                 transport=self.transport)
+
+    def ids(self, docs):
+        return [doc['id'] for doc in docs]
+
+    def test_first_run_fetches_everything(self):
+        delta = sync.DeltaSync(self.conn, FakeStore())
+
+        self.assertEqual(self.ids(delta.iter_changes('journals', {'collection': 'scl'})),
+                         [1, 3, 2])
+        self.assertEqual(self.transport.requests[0].params,
+                         [('collection', 'scl'), ('limit', 2),
+                          ('order_by', ['updated', 'id'])])
+
+    def test_watermark_is_stored_at_the_end(self):
+        store = FakeStore()
+        delta = sync.DeltaSync(self.conn, store)
+        name = delta.watermark_name('journals', {'collection': 'scl'})
+
+        changes = delta.iter_changes('journals', {'collection': 'scl'})
+        next(changes)
+        self.assertIsNone(store.get(name))
+
+        list(changes)
+        self.assertEqual(store.get(name), '2014-01-05T00:00:00')
+
+    def test_watermark_becomes_a_filter(self):
+        delta = sync.DeltaSync(self.conn, FakeStore())
+        name = delta.watermark_name('journals', {'collection': 'scl'})
+        delta.store.set(name, '2014-01-04T00:00:00')
+
+        self.assertEqual(self.ids(delta.iter_changes('journals', {'collection': 'scl'})),
+                         [2])
+        self.assertEqual(self.transport.requests[0].params,
+                         [('collection', 'scl'), ('limit', 2),
+                          ('order_by', ['updated', 'id']),
+                          ('updated__gt', '2014-01-04T00:00:00')])
+        self.assertEqual(delta.store.get(name), '2014-01-05T00:00:00')
+
+    def test_watermark_field_is_always_retrieved(self):
+        self.conn.fields_param = 'fields'
+        delta = sync.DeltaSync(self.conn, FakeStore())
+        list(delta.iter_changes('journals', fields=['title']))
+
+        self.assertIn(('fields', 'title,updated,id'), self.transport.requests[0].params)
+
+    def test_custom_field_and_lookup(self):
+        for doc in self.resource.docs:
+            doc['modified'] = doc['id'] * 10
+        delta = sync.DeltaSync(self.conn, FakeStore(), field='modified', lookup='gte')
+        delta.store.set(delta.watermark_name('journals', [('collection', 'scl')]), 20)
+
+        self.assertEqual(self.ids(delta.iter_changes('journals', [('collection', 'scl')])),
+                         [2, 3])
+        self.assertEqual(self.transport.requests[0].params,
+                         [('collection', 'scl'), ('limit', 2),
+                          ('modified__gte', 20),
+                          ('order_by', ['modified', 'id'])])
+
+    def test_caller_ordering_is_replaced(self):
+        delta = sync.DeltaSync(self.conn, FakeStore())
+        list(delta.iter_changes('journals', [('order_by', 'title')]))
+
+        self.assertNotIn(('order_by', 'title'), self.transport.requests[0].params)
+
+    def test_doc_moved_across_a_page_boundary_is_not_skipped(self):
+        self.resource.docs = [{'id': i, 'updated': '2014-01-0%sT00:00:00' % i}
+                              for i in range(1, 7)]
+        pages = []
+
+        def on_page(page):
+            # the first document is changed once the first page is served,
+            # which would shift the following offsets back by one.
+            pages.append(page)
+            if len(pages) == 1:
+                self.resource.docs[0]['updated'] = '2014-01-09T00:00:00'
+        self.resource.on_page = on_page
+
+        store = FakeStore()
+        delta = sync.DeltaSync(self.conn, store)
+        ids = self.ids(delta.iter_changes('journals'))
+
+        self.assertEqual(ids, [1, 2, 3, 4, 5, 6, 1])
+        self.assertEqual(store.get(delta.watermark_name('journals')),
+                         '2014-01-09T00:00:00')
+
+    def test_ties_across_page_boundaries(self):
+        self.resource.docs = [{'id': i, 'updated': '2014-01-0%sT00:00:00' % (i // 4)}
+                              for i in range(1, 10)]
+        delta = sync.DeltaSync(self.conn, FakeStore())
+
+        self.assertEqual(self.ids(delta.iter_changes('journals')), list(range(1, 10)))
+
+    def test_watermarks_are_per_endpoint_and_params(self):
+        delta = sync.DeltaSync(self.conn, FakeStore())
+
+        self.assertNotEqual(delta.watermark_name('journals', {'collection': 'scl'}),
+                            delta.watermark_name('journals', {'collection': 'arg'}))
+        self.assertEqual(delta.watermark_name('journals', {'a': 1, 'b': 2}),
+                         delta.watermark_name('journals', [('b', 2), ('a', 1)]))
@@ -0,0 +1,220 @@
+import json
+import threading
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError: # PY2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+from forest import auth, connectors, exceptions, httpbroker, transports
+from .test_connectors import make_pages
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Answers with the request, or with the status code in `?status=`.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.dumps({
+            'method': self.command,
+            'path': self.path,
+            'authorization': self.headers.get('Authorization'),
+            'data': self.rfile.read(length).decode('utf-8'),
+        }).encode('utf-8')
+
+        status = 200
+        if 'status=' in self.path:
+            status = int(self.path.rsplit('status=', 1)[1])
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', '7')
+        self.send_header('Location', 'http://localhost/api/v1/journals/1/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = respond
+
+
+def refused_url():
+    """URL of a port nothing listens on.
+    """
+    server = HTTPServer(('127.0.0.1', 0), EchoHandler)
+    url = 'http://127.0.0.1:%s/api/v1/journals/' % server.server_address[1]
+    server.server_close()
+    return url
+
+
+class Urllib3TransportTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), EchoHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:%s/api/v1/journals/' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.transport = transports.Urllib3Transport()
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_params_are_encoded_like_requests(self):
+        resp = self.transport.get(self.url, params=[('collection', 'scl'),
+                                                    ('id__in', ['1', '2']),
+                                                    ('limit', 50)])
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.content.decode('utf-8'))['path'],
+                         '/api/v1/journals/?collection=scl&id__in=1&id__in=2&limit=50')
+
+    def test_auth_is_applied(self):
+        resp = self.transport.get(self.url, auth=auth.ApiKeyAuth('user', 'key'))
+
+        self.assertEqual(json.loads(resp.content.decode('utf-8'))['authorization'],
+                         'ApiKey user:key')
+
+    def test_headers_are_case_insensitive(self):
+        resp = self.transport.get(self.url)
+
+        self.assertEqual(resp.headers['retry-after'], '7')
+        self.assertEqual(resp.headers.get('RETRY-AFTER'), '7')
+
+    def test_stream(self):
+        resp = self.transport.get(self.url, stream=True)
+        body = b''.join(resp.iter_content(4))
+        resp.close()
+
+        self.assertEqual(json.loads(body.decode('utf-8'))['method'], 'GET')
+
+    def test_httpbroker_get(self):
+        data = httpbroker.get(self.url, params={'limit': 1},
+                              transport=self.transport)
+
+        self.assertEqual(data['path'], '/api/v1/journals/?limit=1')
+
+    def test_httpbroker_checks_status(self):
+        with self.assertRaises(exceptions.ServiceUnavailable) as ctx:
+            httpbroker.get(self.url, params={'status': 503},
+                           transport=self.transport)
+
+        self.assertEqual(ctx.exception.retry_after, 7.0)
+
+    def test_httpbroker_post(self):
+        location = httpbroker.post(self.url + '?status=201', {'title': 'Annali'},
+                                   transport=self.transport)
+
+        self.assertEqual(location, 'http://localhost/api/v1/journals/1/')
+
+    def test_connection_errors_are_translated(self):
+        self.assertRaises(exceptions.ConnectionError, httpbroker.get,
+                          refused_url(), transport=self.transport)
+
+    def test_post_connection_errors_are_translated(self):
+        self.assertRaises(exceptions.ConnectionError, httpbroker.post,
+                          refused_url(), {'title': 'Annali'},
+                          transport=self.transport)
+
+
+class PooledTransportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = httpbroker.PooledTransport()
+
+    def test_connection_errors_are_translated(self):
+        self.assertRaises(exceptions.ConnectionError, httpbroker.get,
+                          refused_url(), transport=self.transport)
+
+    def test_post_connection_errors_are_translated(self):
+        self.assertRaises(exceptions.ConnectionError, httpbroker.post,
+                          refused_url(), {'title': 'Annali'},
+                          transport=self.transport)
+
+
+class FakeTransportTests(unittest.TestCase):
+
+    def test_tuples_become_responses(self):
+        transport = transports.FakeTransport(
+            lambda request: (404, {'error': 'nope'}, {'X-Foo': 'bar'}))
+        resp = transport.get('http://api.foo.com/api/v1/journals/')
+
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.json(), {'error': 'nope'})
+        self.assertEqual(resp.headers['x-foo'], 'bar')
+
+    def test_requests_are_recorded(self):
+        transport = transports.FakeTransport(lambda request: (201, b''))
+        transport.post('http://api.foo.com/api/v1/journals/', data='{}',
+                       headers={'Content-Type': 'application/json'},
+                       auth=auth.ApiKeyAuth('user', 'key'))
+
+        request = transport.requests[0]
+        self.assertEqual(request.method, 'POST')
+        self.assertEqual(request.data, '{}')
+        self.assertEqual(request.headers['Authorization'], ' ApiKey user:key')
+
+    def test_prewarm_sends_auth_and_user_agent(self):
+        transport = transports.FakeTransport(lambda request: (200, b''))
+        transport.prewarm('http://api.foo.com/api/v1/', connections=2,
+                          auth=auth.ApiKeyAuth('user', 'key'), user_agent='foo')
+
+        self.assertEqual(len(transport.requests), 2)
+        for request in transport.requests:
+            self.assertEqual(request.method, 'HEAD')
+            self.assertEqual(request.headers['Authorization'],
+                             ' ApiKey user:key')
+            self.assertEqual(request.headers['User-Agent'], 'foo')
+
+    def test_status_is_checked_by_httpbroker(self):
+        transport = transports.FakeTransport(
+            lambda request: (429, '{}', {'retry-after': '3'}))
+
+        with self.assertRaises(exceptions.TooManyRequests) as ctx:
+            httpbroker.get('http://api.foo.com/api/v1/journals/',
+                           transport=transport)
+        self.assertEqual(ctx.exception.retry_after, 3.0)
+
+    def test_raised_exceptions_are_translated(self):
+        def handler(request):
+            raise requests.exceptions.ConnectionError()
+
+        self.assertRaises(exceptions.ConnectionError, httpbroker.get,
+                          'http://api.foo.com/api/v1/journals/',
+                          transport=transports.FakeTransport(handler))
+
+    def test_raised_exceptions_are_translated_on_post(self):
+        def handler(request):
+            raise requests.exceptions.Timeout()
+
+        self.assertRaises(exceptions.Timeout, httpbroker.post,
+                          'http://api.foo.com/api/v1/journals/', {'title': 'Annali'},
+                          transport=transports.FakeTransport(handler))
+
+    def test_connector_harvest(self):
+        pages = make_pages(5, 2)
+
+        def handler(request):
+            return 200, pages('journals', dict(request.params))
+
+        transport = transports.FakeTransport(handler)
+        conn = connectors.TastyPieConnector('http://api.foo.com/api/v1/',
+                                            items_per_request=2,
+                                            transport=transport)
+
+        self.assertEqual([doc['id'] for doc in conn.iter_docs('journals')],
+                         list(range(5)))
+        self.assertEqual(len(transport.requests), 3)